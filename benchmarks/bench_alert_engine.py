@@ -0,0 +1,63 @@
+# benchmarks/bench_alert_engine.py
+"""
+Per-tick cost of PriceAlertEngine against a naive scan of every active alert.
+
+    python -m benchmarks.bench_alert_engine
+"""
+import random
+import time
+
+from server.alerts import PriceAlertEngine
+
+COINS = 100
+TICKS = 2000
+
+
+def naive_tick(alerts, cid, price, band):
+    return [(asid, uid) for asid, uid, alert_cid, threshold in alerts
+            if alert_cid == cid and abs(price - threshold) <= band * threshold]
+
+
+def run(total_alerts: int, naive: bool):
+    rng = random.Random(42)
+    prices = {f"coin-{i}": rng.uniform(1, 50_000) for i in range(COINS)}
+    cids = list(prices)
+    alerts = []
+    for asid in range(1, total_alerts + 1):
+        cid = rng.choice(cids)
+        alerts.append((asid, asid % 10_000, cid, prices[cid] * rng.uniform(0.5, 1.5)))
+
+    engine = PriceAlertEngine(band=0.1)
+    started = time.perf_counter()
+    engine.load(alerts)
+    load_seconds = time.perf_counter() - started
+    for cid, price in prices.items():
+        engine.on_tick(cid, price)
+
+    ticks = [(cid, prices[cid] * rng.uniform(0.99, 1.01)) for cid in (rng.choice(cids) for _ in range(TICKS))]
+    fired = 0
+    started = time.perf_counter()
+    for cid, price in ticks:
+        fired += len(engine.on_tick(cid, price))
+    engine_us = (time.perf_counter() - started) / TICKS * 1e6
+
+    naive_us = None
+    if naive:
+        sample = ticks[:50]
+        started = time.perf_counter()
+        for cid, price in sample:
+            naive_tick(alerts, cid, price, 0.1)
+        naive_us = (time.perf_counter() - started) / len(sample) * 1e6
+
+    naive_text = f"{naive_us:12.1f}" if naive_us is not None else f"{'-':>12}"
+    print(f"{total_alerts:>10,} {load_seconds:10.2f} {engine_us:12.1f} {naive_text} {fired / TICKS:10.1f}")
+
+
+def main():
+    print(f"{'alerts':>10} {'load s':>10} {'engine us':>12} {'naive us':>12} {'fired/tick':>10}")
+    for total in (10_000, 100_000, 1_000_000):
+        run(total, naive=total <= 100_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_database.py
+"""
+Read latency while one writer keeps committing price batches, with SQLite's default
+rollback journal against WAL + synchronous=NORMAL as configured in server.database.
+
+    python -m benchmarks.bench_database [seconds] [readers]
+
+With the rollback journal every commit locks readers out of the whole file; with
+WAL they keep reading the last committed snapshot.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import func, insert, select
+
+from server import models
+from server.database import make_engine
+
+SECONDS = 10
+READERS = 4
+WRITE_BATCH = 2_000
+COINS = 500
+CONFIGS = [
+    ("rollback journal", {"journal_mode": "DELETE", "synchronous": "FULL"}),
+    ("WAL + NORMAL", {"journal_mode": "WAL", "synchronous": "NORMAL"}),
+]
+
+
+def price_rows(rng, count):
+    now = datetime.now(timezone.utc)
+    return [
+        {"cid": f"coin-{rng.randrange(COINS)}", "current_price": rng.uniform(1, 50_000), "time_stamp": now}
+        for _ in range(count)
+    ]
+
+
+def writer(engine, stop, counts):
+    rng = random.Random(1)
+    while not stop.is_set():
+        with engine.begin() as conn:
+            conn.execute(insert(models.Price), price_rows(rng, WRITE_BATCH))
+        counts["writes"] += 1
+
+
+def reader(engine, stop, latencies, errors, seed):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        cid = f"coin-{rng.randrange(COINS)}"
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(select(func.max(models.Price.current_price)).where(models.Price.cid == cid)).scalar()
+        except Exception:
+            errors.append(1)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+def run(name, options, seconds, readers):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", pool_size=readers + 1, **options)
+        models.Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(insert(models.Price), price_rows(random.Random(0), 100_000))
+
+        stop = threading.Event()
+        counts = {"writes": 0}
+        latencies, errors = [], []
+        threads = [threading.Thread(target=writer, args=(engine, stop, counts))]
+        threads += [threading.Thread(target=reader, args=(engine, stop, latencies, errors, i)) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    ms = 1000 * np.array(latencies)
+    print(
+        f"{name:>18} {len(ms) / seconds:9.0f} {np.percentile(ms, 50):8.2f} {np.percentile(ms, 99):8.2f} "
+        f"{ms.max():8.1f} {counts['writes'] / seconds:9.1f} {len(errors):7}"
+    )
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else SECONDS
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else READERS
+    print(f"{readers} readers, 1 writer committing {WRITE_BATCH} rows at a time, {seconds:.0f} s each")
+    print(f"{'config':>18} {'reads/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'writes/s':>9} {'errors':>7}")
+    for name, options in CONFIGS:
+        run(name, options, seconds, readers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_export.py
+"""
+Streaming a 5M-row transaction history for one user, against building the whole
+list in memory the way GET /transaction/{uid} used to.
+
+    python -m benchmarks.bench_export [rows]
+
+Peak memory is measured with tracemalloc, which also slows both paths down.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from server import exports, models
+
+ROWS = 5_000_000
+LIST_ROWS = 500_000
+INSERT_CHUNK = 100_000
+UID = 1
+
+
+def populate(session_factory, rows: int):
+    rng = random.Random(42)
+    start = datetime(2020, 1, 1)
+    db = session_factory()
+    for offset in range(0, rows, INSERT_CHUNK):
+        db.execute(insert(models.Transaction), [
+            {
+                "uid": UID, "wid": 1, "cid": f"coin-{rng.randrange(50)}", "cid_target": "usd",
+                "ex_rate": rng.uniform(1, 50_000), "position": rng.uniform(-1, 1), "network": "ethereum",
+                "gas_fee": rng.uniform(0, 5), "success": True, "time_transaction": start + timedelta(seconds=30 * (offset + i)),
+            }
+            for i in range(min(INSERT_CHUNK, rows - offset))
+        ])
+        db.commit()
+    db.close()
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+
+def stream(session_factory, format):
+    written = 0
+    for chunk in exports.iter_transactions(UID, format, session_factory=session_factory):
+        written += len(chunk)
+    return written
+
+
+def build_list(session_factory, limit):
+    db = session_factory()
+    try:
+        rows = db.query(models.Transaction).filter(models.Transaction.uid == UID).limit(limit).all()
+        body = json.dumps([
+            {name: getattr(row, name) for name in exports.EXPORT_COLUMNS} for row in rows
+        ], default=str)
+        return len(body)
+    finally:
+        db.close()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        started = time.perf_counter()
+        populate(session_factory, rows)
+        print(f"populated {rows:,} rows in {time.perf_counter() - started:.1f} s")
+
+        print(f"{'path':>22} {'rows':>10} {'seconds':>9} {'rows/s':>10} {'MB out':>8} {'peak MB':>8}")
+        for format in ("ndjson", "csv"):
+            written, seconds, peak = measure(lambda: stream(session_factory, format))
+            print(f"{'stream ' + format:>22} {rows:>10,} {seconds:9.1f} {rows / seconds:10,.0f} {written / 2**20:8.0f} {peak:8.1f}")
+        list_rows = min(rows, LIST_ROWS)
+        written, seconds, peak = measure(lambda: build_list(session_factory, list_rows))
+        print(f"{'list + json.dumps':>22} {list_rows:>10,} {seconds:9.1f} {list_rows / seconds:10,.0f} {written / 2**20:8.0f} {peak:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_indicators.py
+"""
+Vectorized indicators over a 10M-point series, and the per-tick cost of
+IndicatorState against recomputing a chart-sized series on every tick.
+
+    python -m benchmarks.bench_indicators
+"""
+import time
+
+import numpy as np
+
+from server import indicators
+
+POINTS = 10_000_000
+LOOP_POINTS = 200_000
+CHART_POINTS = 5_000
+TICKS = 2_000
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def python_ema(values, span):
+    alpha = 2.0 / (span + 1)
+    out = [values[0]]
+    for value in values[1:]:
+        out.append(out[-1] + alpha * (value - out[-1]))
+    return out
+
+
+def python_sma(values, window):
+    total, out = 0.0, []
+    for i, value in enumerate(values):
+        total += value
+        if i >= window:
+            total -= values[i - window]
+        out.append(total / window if i >= window - 1 else None)
+    return out
+
+
+def main():
+    rng = np.random.default_rng(42)
+    close = 30_000 + np.cumsum(rng.normal(0, 25, POINTS))
+    high = close + rng.uniform(0, 50, POINTS)
+    low = close - rng.uniform(0, 50, POINTS)
+
+    print(f"{POINTS:,} points")
+    print(f"{'indicator':>12} {'seconds':>10} {'Mpoints/s':>10}")
+    for name, fn in (
+        ("sma", lambda: indicators.sma(close, 20)),
+        ("ema", lambda: indicators.ema(close, 20)),
+        ("rsi", lambda: indicators.rsi(close, 14)),
+        ("macd", lambda: indicators.macd(close)),
+        ("bollinger", lambda: indicators.bollinger(close)),
+        ("atr", lambda: indicators.atr(high, low, close)),
+        ("all", lambda: indicators.compute(high, low, close)),
+    ):
+        seconds = timed(fn)
+        print(f"{name:>12} {seconds:10.3f} {POINTS / seconds / 1e6:10.1f}")
+
+    sample = close[:LOOP_POINTS].tolist()
+    for name, fn in (("python sma", lambda: python_sma(sample, 20)), ("python ema", lambda: python_ema(sample, 20))):
+        seconds = timed(fn) * POINTS / LOOP_POINTS
+        print(f"{name:>12} {seconds:10.3f} {POINTS / seconds / 1e6:10.1f}  (extrapolated from {LOOP_POINTS:,})")
+
+    chart = slice(0, CHART_POINTS)
+    state = indicators.IndicatorState.from_series(high[chart], low[chart], close[chart])
+    ticks = close[CHART_POINTS:CHART_POINTS + TICKS].tolist()
+    started = time.perf_counter()
+    for price in ticks:
+        state.update(price)
+    incremental_us = (time.perf_counter() - started) / TICKS * 1e6
+
+    window = close[:CHART_POINTS].copy()
+    started = time.perf_counter()
+    for price in ticks[:200]:
+        window = np.append(window[1:], price)
+        indicators.compute(window, window, window)
+    recompute_us = (time.perf_counter() - started) / 200 * 1e6
+    print(f"\nper tick over {CHART_POINTS:,} bars: incremental {incremental_us:.1f} us, recompute {recompute_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_login.py
+"""
+Login throughput and event loop responsiveness during a burst of logins: verifying
+inline on the event loop, against the password hasher's thread and process pools.
+
+    python -m benchmarks.bench_login [logins] [bcrypt rounds]
+
+Loop lag is the worst delay seen by a task that wakes up every 10 ms, i.e. how
+long an unrelated price request would have been stalled.
+"""
+import asyncio
+import sys
+import time
+
+from server import passwords
+
+LOGINS = 64
+ROUNDS = 12
+PROBE_INTERVAL = 0.01
+
+
+async def probe(stop: asyncio.Event) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        worst = max(worst, time.perf_counter() - started - PROBE_INTERVAL)
+    return worst
+
+
+async def burst(verify, hashed_password: str, logins: int):
+    stop = asyncio.Event()
+    lag = asyncio.create_task(probe(stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verify("correct horse", hashed_password) for _ in range(logins)))
+    seconds = time.perf_counter() - started
+    stop.set()
+    assert all(valid for valid, _ in results)
+    return seconds, await lag
+
+
+async def run(logins: int, rounds: int):
+    # set before the pools start so forked process workers inherit it
+    passwords.pwd_context = passwords.make_context(scheme="bcrypt", bcrypt_rounds=rounds)
+    hashed_password = passwords.pwd_context.hash("correct horse")
+
+    async def inline(password, hashed):
+        return passwords._verify_and_update(password, hashed)
+
+    paths = [("inline on event loop", inline)]
+    hashers = []
+    for kind in ("thread", "process"):
+        hasher = passwords.PasswordHasher(executor=kind, max_pending=logins)
+        hasher.start()
+        hashers.append(hasher)
+        paths.append((f"{kind} pool x{hasher.workers}", hasher.verify_and_update))
+
+    print(f"{logins} logins, bcrypt rounds={rounds}")
+    print(f"{'path':>22} {'seconds':>8} {'logins/s':>9} {'max loop lag ms':>16}")
+    for name, verify in paths:
+        seconds, lag = await burst(verify, hashed_password, logins)
+        print(f"{name:>22} {seconds:8.2f} {logins / seconds:9.1f} {1000 * lag:16.1f}")
+    for hasher in hashers:
+        hasher.close()
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else LOGINS
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else ROUNDS
+    asyncio.run(run(logins, rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# benchmarks/bench_messages.py
+"""
+Message write throughput: per-message create_message against chunked create_messages.
+
+    python -m benchmarks.bench_messages [count]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from server import crud, models
+
+
+def _session(path):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)(), engine
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    messages = [
+        {"uid": i % 500, "asid": i, "message_type": "Price Alert", "body": f"The price of coin-{i % 50} moved."}
+        for i in range(count)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        db, engine = _session(os.path.join(tmp, "single.db"))
+        started = time.perf_counter()
+        for message in messages:
+            crud.create_message(db, **message)
+        single = time.perf_counter() - started
+        db.close()
+        engine.dispose()
+
+        db, engine = _session(os.path.join(tmp, "bulk.db"))
+        started = time.perf_counter()
+        written = crud.create_messages(db, messages)
+        bulk = time.perf_counter() - started
+        db.close()
+        engine.dispose()
+
+    print(f"{'path':<16} {'messages':>10} {'seconds':>10} {'msg/s':>12}")
+    print(f"{'create_message':<16} {count:>10,} {single:>10.3f} {count / single:>12,.0f}")
+    print(f"{'create_messages':<16} {written:>10,} {bulk:>10.3f} {written / bulk:>12,.0f}")
+    print(f"speedup: {single / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_price_hub.py
+"""
+Fanning price ticks out to 10k streaming clients from one PriceHub, with a share
+of slow consumers whose pending ticks coalesce instead of queueing.
+
+    python -m benchmarks.bench_price_hub [clients] [rounds]
+
+Polling is off; ticks are published directly as the ingestion listener would.
+Memory is measured with tracemalloc, which also slows everything down.
+"""
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from server.streaming import PriceHub
+
+CLIENTS = 10_000
+ROUNDS = 20
+COINS = 500
+IDS_PER_CLIENT = 10
+SLOW_SHARE = 0.1
+SLOW_DELAY = 0.5
+
+
+async def consume(subscription, delay, received):
+    while not subscription.closed:
+        message = await subscription.next_message(1.0)
+        if message is not None:
+            received[0] += 1
+            received[1] += len(message)
+            if delay:
+                await asyncio.sleep(delay)
+
+
+async def run(clients: int, rounds: int):
+    rng = random.Random(42)
+    cids = [f"coin-{i}" for i in range(COINS)]
+    hub = PriceHub(max_clients=clients, poll_seconds=0)
+    tracemalloc.start()
+    received = [0, 0]
+    subscriptions = [hub.subscribe(set(rng.sample(cids, IDS_PER_CLIENT))) for _ in range(clients)]
+    consumers = [
+        asyncio.create_task(consume(subscription, SLOW_DELAY if rng.random() < SLOW_SHARE else 0, received))
+        for subscription in subscriptions
+    ]
+    await asyncio.sleep(0.1)
+
+    start = datetime(2024, 1, 1)
+    publish_seconds = 0.0
+    started = time.perf_counter()
+    for round in range(rounds):
+        rows = [
+            {"cid": cid, "current_price": rng.uniform(1, 50_000), "time_stamp": start + timedelta(seconds=round)}
+            for cid in cids
+        ]
+        began = time.perf_counter()
+        hub.publish(rows)
+        publish_seconds += time.perf_counter() - began
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(SLOW_DELAY * 2)
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    for subscription in subscriptions:
+        hub.unsubscribe(subscription)
+    await asyncio.gather(*consumers)
+
+    stats = hub.stats()
+    print(f"{clients:,} clients x {IDS_PER_CLIENT} coins, {rounds} rounds of {COINS} ticks, {SLOW_SHARE:.0%} slow consumers")
+    print(f"  publish: {1000 * publish_seconds / rounds:.1f} ms per round, {stats['delivered'] / publish_seconds:,.0f} deliveries/s")
+    print(f"  delivered {stats['delivered']:,} ticks in {received[0]:,} messages ({received[1] / 2**20:.1f} MB), "
+          f"{stats['coalesced']:,} coalesced for slow consumers")
+    print(f"  wall {seconds:.1f} s, peak traced memory {peak / 2**20:.1f} MB")
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else CLIENTS
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else ROUNDS
+    asyncio.run(run(clients, rounds))
+
+
+if __name__ == "__main__":
+    main()
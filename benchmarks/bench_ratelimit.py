@@ -0,0 +1,79 @@
+# benchmarks/bench_ratelimit.py
+"""
+How the upstream budget is split when interactive lookups, the ingestion loop and
+a candle backfill all want it at once, with the per-class reserves of
+ratelimit.PRIORITIES against every caller drawing as one class.
+
+    python -m benchmarks.bench_ratelimit [minutes]
+
+Runs on a simulated clock against a real SharedTokenBucket file, so it takes
+seconds, not minutes. Backfill always has a request waiting; interactive and
+ingestion requests arrive at random at the rates below.
+"""
+import os
+import random
+import sys
+import tempfile
+
+import numpy as np
+
+from server.ratelimit import PRIORITIES, SharedTokenBucket
+
+MINUTES = 10
+RATE_PER_MINUTE = 30
+BURST = 10
+STEP = 0.1
+ARRIVALS_PER_MINUTE = {"interactive": 6, "ingestion": 12}
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def run(path: str, minutes: float, reserves: bool) -> dict:
+    rng = random.Random(42)
+    clock = SimulatedClock()
+    bucket = SharedTokenBucket("bench", RATE_PER_MINUTE, BURST, path=path, clock=clock)
+    queues = {priority: [] for priority in PRIORITIES}
+    waits = {priority: [] for priority in PRIORITIES}
+    try:
+        while clock.now < minutes * 60:
+            for priority, per_minute in ARRIVALS_PER_MINUTE.items():
+                if rng.random() < per_minute / 60 * STEP:
+                    queues[priority].append(clock.now)
+            if not queues["backfill"]:
+                queues["backfill"].append(clock.now)
+
+            # callers race for tokens in no particular order
+            order = list(PRIORITIES)
+            rng.shuffle(order)
+            for priority in order:
+                queue = queues[priority]
+                if queue and bucket.try_acquire(priority if reserves else "interactive") == 0.0:
+                    waits[priority].append(clock.now - queue.pop(0))
+            clock.now += STEP
+    finally:
+        bucket.close()
+    return waits
+
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else MINUTES
+    print(f"{RATE_PER_MINUTE}/min, burst {BURST}, {minutes:.0f} simulated minutes")
+    print(f"{'mode':>10} {'class':>12} {'granted':>8} {'p50 wait s':>11} {'p99 wait s':>11} {'max wait s':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for reserves in (False, True):
+            mode = "reserves" if reserves else "one class"
+            waits = run(os.path.join(tmp, f"{mode}.db"), minutes, reserves)
+            for priority, values in waits.items():
+                values = np.array(values) if values else np.zeros(1)
+                print(f"{mode:>10} {priority:>12} {len(waits[priority]):>8} {np.percentile(values, 50):11.1f} "
+                      f"{np.percentile(values, 99):11.1f} {values.max():11.1f}")
+
+
+if __name__ == "__main__":
+    main()
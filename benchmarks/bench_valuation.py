@@ -0,0 +1,74 @@
+# benchmarks/bench_valuation.py
+"""
+Revaluing 100k portfolios with one join and array pass, against a per-user
+query loop like the one the portfolio page did.
+
+    python -m benchmarks.bench_valuation
+"""
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from server import crud, models, valuation
+
+USERS = 100_000
+POSITIONS_PER_USER = 5
+COINS = 1_000
+LOOP_USERS = 2_000
+
+
+def populate(db):
+    rng = random.Random(42)
+    cids = [f"coin-{i}" for i in range(COINS)]
+    db.execute(insert(models.LatestPrice), [
+        {"cid": cid, "current_price": rng.uniform(0.01, 50_000)} for cid in cids[:-10]  # a few unpriced coins
+    ])
+    rows = []
+    for uid in range(1, USERS + 1):
+        for cid in rng.sample(cids, POSITIONS_PER_USER):
+            rows.append({"uid": uid, "cid": cid, "quantity": rng.uniform(0, 100)})
+    db.execute(insert(models.Portfolio), rows)
+    db.commit()
+
+
+def per_user_totals(db, uids):
+    totals = {}
+    for uid in uids:
+        total = 0.0
+        for position in crud.get_portfolio_by_uid(db, uid):
+            price = crud.get_price_by_cid(db, position.cid)
+            if price is not None and position.quantity:
+                total += position.quantity * price.current_price
+        totals[uid] = total
+    return totals
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        populate(db)
+
+        started = time.perf_counter()
+        result = valuation.value_portfolios(db)
+        batch_seconds = time.perf_counter() - started
+
+        sample = list(range(1, LOOP_USERS + 1))
+        started = time.perf_counter()
+        totals = per_user_totals(db, sample)
+        loop_seconds = (time.perf_counter() - started) * USERS / LOOP_USERS
+        db.close()
+
+    mismatches = sum(abs(result.for_user(uid)["total_value"] - totals[uid]) > 1e-6 * max(totals[uid], 1) for uid in sample)
+    print(f"{USERS:,} users, {USERS * POSITIONS_PER_USER:,} positions, {COINS:,} coins")
+    print(f"batch valuation   {batch_seconds:8.2f} s")
+    print(f"per-user queries  {loop_seconds:8.2f} s  (extrapolated from {LOOP_USERS:,} users, {mismatches} mismatches)")
+
+
+if __name__ == "__main__":
+    main()
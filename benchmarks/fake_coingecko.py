@@ -0,0 +1,103 @@
+# benchmarks/fake_coingecko.py
+"""
+Local stand-in for the CoinGecko endpoints the tracker uses.
+
+    FAKE_COINS=5000 uvicorn benchmarks.fake_coingecko:app --port 9000
+    UPSTREAM_RATE_PER_MINUTE=0 python -m server.ingestion --base-url http://localhost:9000 --once --max-pages 0
+
+Prices oscillate deterministically per coin so repeated polls see movement.
+"""
+import asyncio
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, HTTPException, Query
+
+FAKE_COINS = int(os.getenv("FAKE_COINS", "1000"))
+FAKE_LATENCY = float(os.getenv("FAKE_LATENCY", "0"))
+
+app = FastAPI()
+
+COIN_IDS = [f"coin-{i}" for i in range(FAKE_COINS)]
+_RANKS = {cid: i + 1 for i, cid in enumerate(COIN_IDS)}
+_BASE_PRICES = {cid: 10 ** random.Random(cid).uniform(-3, 5) for cid in COIN_IDS}
+
+
+def _price(cid: str, at: float = None) -> float:
+    at = time.time() if at is None else at
+    base = _BASE_PRICES[cid]
+    phase = random.Random(cid).uniform(0, 2 * math.pi)
+    return base * (1 + 0.05 * math.sin(at / 3600 + phase) + 0.01 * math.sin(at / 60 + phase))
+
+
+def _market_entry(rank: int, cid: str) -> dict:
+    price = _price(cid)
+    return {
+        "id": cid,
+        "symbol": cid.replace("-", ""),
+        "name": cid.title(),
+        "current_price": price,
+        "market_cap": int(price * 1_000_000),
+        "market_cap_rank": rank,
+        "total_volume": int(price * 50_000),
+        "high_24h": price * 1.03,
+        "low_24h": price * 0.97,
+        "price_change_24h": price * 0.01,
+        "price_change_percentage_24h": 1.0,
+        "market_cap_change_24h": price * 10_000,
+        "last_updated": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def _delay():
+    if FAKE_LATENCY:
+        await asyncio.sleep(FAKE_LATENCY)
+
+
+@app.get("/coins/markets")
+async def coins_markets(vs_currency: str = "usd", page: int = 1, per_page: int = 100, ids: str = None):
+    await _delay()
+    if ids:
+        wanted = [cid for cid in ids.split(",") if cid in _BASE_PRICES]
+        return [_market_entry(_RANKS[cid], cid) for cid in wanted]
+    start = (page - 1) * per_page
+    return [_market_entry(start + i + 1, cid) for i, cid in enumerate(COIN_IDS[start:start + per_page])]
+
+
+@app.get("/coins/{coin_id}")
+async def coin(coin_id: str):
+    await _delay()
+    if coin_id not in _BASE_PRICES:
+        raise HTTPException(status_code=404, detail="coin not found")
+    entry = _market_entry(_RANKS[coin_id], coin_id)
+    return {
+        "id": coin_id,
+        "symbol": entry["symbol"],
+        "name": entry["name"],
+        "market_cap_rank": entry["market_cap_rank"],
+        "market_data": {
+            key: {"usd": entry[key]}
+            for key in ("current_price", "market_cap", "total_volume", "high_24h", "low_24h")
+        },
+    }
+
+
+@app.get("/coins/{coin_id}/market_chart")
+async def market_chart(coin_id: str, vs_currency: str = "usd", days: str = "14"):
+    await _delay()
+    if coin_id not in _BASE_PRICES:
+        raise HTTPException(status_code=404, detail="coin not found")
+    now = time.time()
+    span = 365 * 86400 if days == "max" else float(days) * 86400
+    step = 3600 if span <= 90 * 86400 else 86400
+    points = int(span // step)
+    return {"prices": [[(now - (points - i) * step) * 1000, _price(coin_id, now - (points - i) * step)] for i in range(points)]}
+
+
+@app.get("/simple/price")
+async def simple_price(ids: str = Query(...), vs_currencies: str = "usd"):
+    await _delay()
+    return {cid: {"usd": _price(cid)} for cid in ids.split(",") if cid in _BASE_PRICES}
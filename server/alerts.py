@@ -0,0 +1,557 @@
+# server/alerts.py
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select, union_all
+from sqlalchemy.orm import Session
+
+from . import models, utils
+
+logger = logging.getLogger(__name__)
+
+ALERT_BAND = float(os.getenv("ALERT_BAND", "0.1"))
+ALERT_WINDOW_CAPACITY = int(os.getenv("ALERT_WINDOW_CAPACITY", "4096"))
+DEFAULT_ALERT_WINDOW = 3600
+ALERT_COOLDOWN_SECONDS = float(os.getenv("ALERT_COOLDOWN_SECONDS", "3600"))
+# Hysteresis for re-arming a fired alert, as a fraction of the level it fired at: a target
+# alert re-arms once the price is more than band * (1 + ALERT_REARM_BAND) away from its
+# threshold, a percentage alert once the move is below percentage * (1 - ALERT_REARM_BAND)
+ALERT_REARM_BAND = float(os.getenv("ALERT_REARM_BAND", "0.5"))
+# Changes are re-read this far behind the newest one seen, so a subscription whose
+# transaction committed after a later one is still picked up
+ALERT_SYNC_OVERLAP_SECONDS = float(os.getenv("ALERT_SYNC_OVERLAP_SECONDS", "60"))
+
+
+def to_epoch(value) -> float:
+    """
+    Seconds since the epoch for a tick time; naive datetimes are stored as UTC.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+class _ThresholdBook:
+    """
+    Active thresholds for one coin, sorted ascending, with the owning asid at the same index.
+    """
+
+    __slots__ = ("thresholds", "asids")
+
+    def __init__(self):
+        self.thresholds = []
+        self.asids = []
+
+    def insert(self, threshold: float, asid: int):
+        i = bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(i, threshold)
+        self.asids.insert(i, asid)
+
+    def remove(self, threshold: float, asid: int) -> bool:
+        i = bisect_left(self.thresholds, threshold)
+        while i < len(self.thresholds) and self.thresholds[i] == threshold:
+            if self.asids[i] == asid:
+                del self.thresholds[i]
+                del self.asids[i]
+                return True
+            i += 1
+        return False
+
+    def __len__(self):
+        return len(self.thresholds)
+
+
+def _slice_difference(new, old) -> list:
+    """
+    Index ranges inside the `new` (lo, hi) slice but outside the `old` one.
+    """
+    lo, hi = new
+    old_lo, old_hi = old
+    ranges = []
+    if lo < old_lo:
+        ranges.append(range(lo, min(hi, old_lo)))
+    if hi > old_hi:
+        ranges.append(range(max(lo, old_hi), hi))
+    return ranges
+
+
+class TriggerStates:
+    """
+    Armed flag and last firing per alert, held in memory and persisted in bulk.
+
+    An alert fires only while armed and out of its cooldown, is disarmed when it fires
+    and re-armed by the engine once the price has moved back beyond the re-arm band.
+    Alerts without a row are armed, so only alerts that have fired take up space.
+    """
+
+    def __init__(self, kind: str, cooldown: float = ALERT_COOLDOWN_SECONDS):
+        self.kind = kind
+        self.cooldown = cooldown
+        self._states = {}  # asid -> [armed, last_fired_price, last_fired_at epoch]
+        self._dirty = set()
+        self._forgotten = set()  # asids whose rows go on the next flush
+        self.loaded = False
+
+    def load(self, db: Session):
+        rows = db.query(
+            models.AlertTriggerState.asid,
+            models.AlertTriggerState.armed,
+            models.AlertTriggerState.last_fired_price,
+            models.AlertTriggerState.last_fired_at,
+        ).filter(models.AlertTriggerState.alert_kind == self.kind)
+        for asid, armed, price, fired_at in rows:
+            self._states[asid] = [bool(armed), price, to_epoch(fired_at) if fired_at else None]
+        self.loaded = True
+
+    def is_armed(self, asid: int) -> bool:
+        state = self._states.get(asid)
+        return state is None or state[0]
+
+    def try_fire(self, asid: int, price: float, at: float) -> bool:
+        state = self._states.get(asid)
+        if state is not None:
+            if not state[0] or (state[2] is not None and at - state[2] < self.cooldown):
+                return False
+        self._states[asid] = [False, price, at]
+        self._dirty.add(asid)
+        return True
+
+    def rearm(self, asid: int):
+        state = self._states.get(asid)
+        if state is not None and not state[0]:
+            state[0] = True
+            self._dirty.add(asid)
+
+    def forget(self, asid: int):
+        """
+        Drop the state of a removed or changed alert, so it starts armed when it comes back.
+        """
+        self._states.pop(asid, None)
+        self._dirty.discard(asid)
+        self._forgotten.add(asid)
+
+    def flush(self, db: Session) -> int:
+        """
+        Delete the forgotten states and upsert those changed since the last flush, without committing.
+        """
+        deleted = 0
+        if self._forgotten:
+            db.execute(delete(models.AlertTriggerState).where(
+                models.AlertTriggerState.alert_kind == self.kind,
+                models.AlertTriggerState.asid.in_(self._forgotten),
+            ))
+            deleted = len(self._forgotten)
+            self._forgotten.clear()
+        if not self._dirty:
+            return deleted
+        rows = []
+        for asid in self._dirty:
+            state = self._states.get(asid)
+            if state is None:
+                continue
+            armed, price, fired_at = state
+            rows.append({
+                "asid": asid,
+                "alert_kind": self.kind,
+                "armed": armed,
+                "last_fired_price": price,
+                "last_fired_at": datetime.fromtimestamp(fired_at, timezone.utc) if fired_at is not None else None,
+            })
+        self._dirty.clear()
+        return deleted + utils.upsert(db, models.AlertTriggerState, rows, ["asid", "alert_kind"])
+
+    def __len__(self):
+        return len(self._states)
+
+
+class SubscriptionChanges:
+    """
+    Incremental reader of the alert subscription tables for one engine.
+
+    The first sync bulk-loads every active alert. Later syncs read only the rows whose
+    `updated_at` on either table is within `overlap` seconds of the newest change seen,
+    through the `updated_at` indexes, and add, replace or remove those alerts. Re-read
+    rows that did not change are skipped by the engines.
+    """
+
+    def __init__(self, overlap: float = ALERT_SYNC_OVERLAP_SECONDS):
+        self.overlap = timedelta(seconds=overlap)
+        self.since = None  # newest updated_at seen; None until the first sync
+
+    def sync(self, db: Session, engine, *detail_columns):
+        """
+        Apply the changes since the previous sync to `engine` through its load, add and remove.
+        """
+        alert, detail = models.AlertSubscription, models.PriceAlertSubscription
+        query = select(
+            alert.asid, alert.uid, alert.cid, alert.subscription_active, *detail_columns,
+            alert.updated_at.label("alert_updated_at"), detail.updated_at.label("detail_updated_at"),
+        ).join(detail, detail.asid == alert.asid)
+
+        if self.since is None:
+            # take the watermark first: anything committed while loading is re-read next time
+            latest = [db.execute(select(func.max(table.updated_at))).scalar() for table in (alert, detail)]
+            since = max((value for value in latest if value is not None), default=datetime.min)
+            rows = db.execute(query.where(alert.subscription_active == True)).all()
+            engine.load((*row[:3], *row[4:-2]) for row in rows)
+            self.since = since
+            return
+
+        cutoff = self.since - self.overlap
+        rows = db.execute(union_all(
+            query.where(alert.updated_at >= cutoff), query.where(detail.updated_at >= cutoff)
+        )).all()
+        for row in rows:
+            asid, uid, cid, active, *values = row[:-2]
+            if active:
+                engine.add(asid, uid, cid, *values)
+            else:
+                engine.remove(asid)
+            for updated_at in row[-2:]:
+                if updated_at is not None and updated_at > self.since:
+                    self.since = updated_at
+
+
+class PriceAlertEngine:
+    """
+    Incremental evaluation of "price within `band` of my target" alerts.
+
+    A price p is within the band of threshold t when t lies in [p / (1 + band), p / (1 - band)],
+    so the alerts in band form one contiguous slice of a coin's sorted thresholds. For each
+    tick only the slice entered since the previous tick is considered: O(log n + k) per tick.
+    A fired alert re-arms once the price leaves the wider `band * (1 + rearm_band)` slice.
+    """
+
+    def __init__(self, band: float = ALERT_BAND, rearm_band: float = ALERT_REARM_BAND,
+                 cooldown: float = ALERT_COOLDOWN_SECONDS):
+        self.band = band
+        self.rearm_band = rearm_band
+        self.states = TriggerStates("price", cooldown)
+        self.changes = SubscriptionChanges()
+        self._books = {}  # cid -> _ThresholdBook
+        self._alerts = {}  # asid -> (cid, threshold, uid)
+        self._pending = {}  # cid -> asids added since the last tick for that coin
+        self._last_price = {}  # cid -> last evaluated price
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def add(self, asid: int, uid: int, cid: str, threshold: float):
+        """
+        Add or replace an alert; one without a positive threshold is removed.
+        """
+        if self._alerts.get(asid) == (cid, threshold, uid):
+            return
+        self.remove(asid)
+        if threshold is None or threshold <= 0:
+            return
+        self._books.setdefault(cid, _ThresholdBook()).insert(threshold, asid)
+        self._alerts[asid] = (cid, threshold, uid)
+        self._pending.setdefault(cid, []).append(asid)
+
+    def remove(self, asid: int) -> bool:
+        alert = self._alerts.pop(asid, None)
+        if alert is None:
+            return False
+        cid, threshold, _ = alert
+        book = self._books[cid]
+        book.remove(threshold, asid)
+        if not book:
+            del self._books[cid]
+        self.states.forget(asid)
+        return True
+
+    def load(self, alerts):
+        """
+        Bulk-load (asid, uid, cid, threshold) tuples, sorting each coin's book once.
+        """
+        by_cid = {}
+        for asid, uid, cid, threshold in alerts:
+            if threshold is None or threshold <= 0 or asid in self._alerts:
+                continue
+            self._alerts[asid] = (cid, threshold, uid)
+            by_cid.setdefault(cid, []).append((threshold, asid))
+        for cid, entries in by_cid.items():
+            self._pending.setdefault(cid, []).extend(asid for _, asid in entries)
+            book = self._books.setdefault(cid, _ThresholdBook())
+            entries.extend(zip(book.thresholds, book.asids))
+            entries.sort()
+            book.thresholds = [threshold for threshold, _ in entries]
+            book.asids = [asid for _, asid in entries]
+
+    def sync(self, db: Session):
+        """
+        Apply alerts created, changed, deactivated or reactivated since the last sync.
+        """
+        if not self.states.loaded:
+            self.states.load(db)
+        self.changes.sync(db, self, models.PriceAlertSubscription.threshold)
+
+    @staticmethod
+    def _band_slice(book: _ThresholdBook, price: float, band: float):
+        lo = bisect_left(book.thresholds, price / (1 + band))
+        hi = bisect_right(book.thresholds, price / (1 - band)) if band < 1 else len(book)
+        return lo, hi
+
+    def _in_band(self, threshold: float, price: float) -> bool:
+        return abs(price - threshold) <= self.band * threshold
+
+    def on_tick(self, cid: str, price: float, at=None) -> list:
+        """
+        Record a new price for `cid` and return (asid, uid) for every armed alert whose
+        band the price has entered since the previous tick.
+        """
+        if price is None:
+            return []
+        at = time.time() if at is None else to_epoch(at)
+        previous = self._last_price.get(cid)
+        self._last_price[cid] = price
+        pending = self._pending.pop(cid, ())
+        book = self._books.get(cid)
+        if book is None:
+            return []
+
+        inner = self._band_slice(book, price, self.band)
+        rearm_band = self.band * (1 + self.rearm_band)
+        outer = self._band_slice(book, price, rearm_band)
+        if previous is None:
+            entered = [range(*inner)]
+            # state may predate this process: re-arm anything already outside the re-arm band
+            left = [range(0, outer[0]), range(outer[1], len(book))]
+        else:
+            entered = _slice_difference(inner, self._band_slice(book, previous, self.band))
+            left = _slice_difference(self._band_slice(book, previous, rearm_band), outer)
+
+        for indices in left:
+            for i in indices:
+                self.states.rearm(book.asids[i])
+
+        candidates = [book.asids[i] for indices in entered for i in indices]
+        if previous is not None and pending:
+            # alerts added since the last tick were never inside the previous band slice
+            seen = set(candidates)
+            candidates.extend(
+                asid for asid in pending
+                if asid in self._alerts and asid not in seen
+                and self._alerts[asid][0] == cid
+                and self._in_band(self._alerts[asid][1], price)
+            )
+        return [
+            (asid, self._alerts[asid][2]) for asid in candidates
+            if self.states.try_fire(asid, price, at)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "alerts": len(self._alerts),
+            "coins": len(self._books),
+            "band": self.band,
+        }
+
+
+class TickWindow:
+    """
+    Preallocated ring buffer of (time, price) ticks covering the last `window` seconds,
+    with monotonic deques of sequence numbers giving the rolling min and max in O(1).
+    """
+
+    __slots__ = ("window", "capacity", "times", "prices", "head", "tail", "min_q", "max_q")
+
+    def __init__(self, window: float, capacity: int = ALERT_WINDOW_CAPACITY):
+        self.window = window
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.prices = array("d", bytes(8 * capacity))
+        self.head = 0  # sequence number of the oldest live tick
+        self.tail = 0  # sequence number the next tick will get
+        self.min_q = deque()
+        self.max_q = deque()
+
+    def _evict_before(self, seq: int):
+        self.head = max(self.head, seq)
+        while self.min_q and self.min_q[0] < self.head:
+            self.min_q.popleft()
+        while self.max_q and self.max_q[0] < self.head:
+            self.max_q.popleft()
+
+    def push(self, at: float, price: float):
+        if self.tail - self.head == self.capacity:
+            # full: the slot about to be reused must leave both deques first
+            self._evict_before(self.head + 1)
+        slot = self.tail % self.capacity
+        self.times[slot] = at
+        self.prices[slot] = price
+        while self.min_q and self.prices[self.min_q[-1] % self.capacity] >= price:
+            self.min_q.pop()
+        self.min_q.append(self.tail)
+        while self.max_q and self.prices[self.max_q[-1] % self.capacity] <= price:
+            self.max_q.pop()
+        self.max_q.append(self.tail)
+        self.tail += 1
+
+        head = self.head
+        cutoff = at - self.window
+        while head < self.tail - 1 and self.times[head % self.capacity] < cutoff:
+            head += 1
+        self._evict_before(head)
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def low(self) -> float:
+        return self.prices[self.min_q[0] % self.capacity]
+
+    def high(self) -> float:
+        return self.prices[self.max_q[0] % self.capacity]
+
+    def move(self, price: float) -> float:
+        """
+        Largest percentage move of `price` away from the window's low or high.
+        """
+        low, high = self.low(), self.high()
+        up = (price - low) / low * 100 if low > 0 else 0.0
+        down = (high - price) / high * 100 if high > 0 else 0.0
+        return up if up >= down else -down
+
+
+class PercentMoveAlertEngine:
+    """
+    "Price moved by at least X% within the last N seconds" alerts.
+
+    Every (coin, window) pair owns one TickWindow shared by all its subscribers, whose
+    percentages are kept sorted so a tick only touches the alerts the move has newly
+    reached: O(1) amortized for the window plus O(log n + k) for the subscribers.
+    A fired alert re-arms once the move falls below `percentage * (1 - rearm_band)`.
+    """
+
+    def __init__(self, capacity: int = ALERT_WINDOW_CAPACITY, rearm_band: float = ALERT_REARM_BAND,
+                 cooldown: float = ALERT_COOLDOWN_SECONDS):
+        self.capacity = capacity
+        self.rearm_band = rearm_band
+        self.states = TriggerStates("percent", cooldown)
+        self.changes = SubscriptionChanges()
+        self._windows = {}  # (cid, window) -> TickWindow
+        self._books = {}  # (cid, window) -> _ThresholdBook of percentages
+        self._last_move = {}  # (cid, window) -> absolute move at the previous tick
+        self._windows_by_cid = {}  # cid -> set of windows with subscribers
+        self._alerts = {}  # asid -> (cid, window, percentage, uid)
+        self._pending = {}  # (cid, window) -> asids added since the last tick
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def add(self, asid: int, uid: int, cid: str, percentage: float, window: int = DEFAULT_ALERT_WINDOW):
+        """
+        Add or replace an alert; one without a positive percentage is removed.
+        """
+        window = window or DEFAULT_ALERT_WINDOW
+        if self._alerts.get(asid) == (cid, window, percentage, uid):
+            return
+        self.remove(asid)
+        if percentage is None or percentage <= 0:
+            return
+        key = (cid, window)
+        if key not in self._books:
+            self._books[key] = _ThresholdBook()
+            self._windows.setdefault(key, TickWindow(window, self.capacity))
+            self._windows_by_cid.setdefault(cid, set()).add(window)
+        self._books[key].insert(percentage, asid)
+        self._alerts[asid] = (cid, window, percentage, uid)
+        self._pending.setdefault(key, []).append(asid)
+
+    def remove(self, asid: int) -> bool:
+        alert = self._alerts.pop(asid, None)
+        if alert is None:
+            return False
+        cid, window, percentage, _ = alert
+        key = (cid, window)
+        book = self._books[key]
+        book.remove(percentage, asid)
+        if not book:
+            del self._books[key]
+            self._windows.pop(key, None)
+            self._last_move.pop(key, None)
+            self._windows_by_cid[cid].discard(window)
+            if not self._windows_by_cid[cid]:
+                del self._windows_by_cid[cid]
+        self.states.forget(asid)
+        return True
+
+    def load(self, alerts):
+        """
+        Load (asid, uid, cid, percentage, window) tuples.
+        """
+        for asid, uid, cid, percentage, window in alerts:
+            self.add(asid, uid, cid, percentage, window)
+
+    def sync(self, db: Session):
+        """
+        Apply percentage alerts created, changed, deactivated or reactivated since the last sync.
+        """
+        if not self.states.loaded:
+            self.states.load(db)
+        self.changes.sync(
+            db, self, models.PriceAlertSubscription.threshold_percentage, models.PriceAlertSubscription.window_seconds
+        )
+
+    def on_tick(self, cid: str, price: float, at) -> list:
+        """
+        Push a tick into every window of `cid` and return (asid, uid, move) for the armed
+        alerts whose percentage the move has reached since the previous tick.
+        """
+        windows = self._windows_by_cid.get(cid)
+        if price is None or not windows:
+            return []
+        at = to_epoch(at)
+        fired = []
+        for window in windows:
+            key = (cid, window)
+            ticks = self._windows[key]
+            ticks.push(at, price)
+            move = ticks.move(price)
+            size = abs(move)
+            first = key not in self._last_move
+            previous = self._last_move.get(key, 0.0)
+            self._last_move[key] = size
+            book = self._books[key]
+
+            # re-arm alerts the move has fallen back below percentage * (1 - rearm_band) of
+            rearm_from = bisect_right(book.thresholds, size / (1 - self.rearm_band))
+            rearm_to = len(book) if first else bisect_right(book.thresholds, previous / (1 - self.rearm_band))
+            for i in range(rearm_from, rearm_to):
+                self.states.rearm(book.asids[i])
+
+            candidates = []
+            if size > previous:
+                candidates = book.asids[bisect_right(book.thresholds, previous):bisect_right(book.thresholds, size)]
+            pending = self._pending.pop(key, ())
+            if pending:
+                seen = set(candidates)
+                candidates = candidates + [
+                    asid for asid in pending
+                    if asid in self._alerts and asid not in seen and self._alerts[asid][2] <= size
+                ]
+            fired.extend(
+                (asid, self._alerts[asid][3], move) for asid in candidates
+                if self.states.try_fire(asid, price, at)
+            )
+        return fired
+
+    def stats(self) -> dict:
+        return {
+            "alerts": len(self._alerts),
+            "windows": len(self._windows),
+            "capacity": self.capacity,
+        }
+
+
+# Process-wide engines fed by ingestion ticks and check_price_targets
+price_alert_engine = PriceAlertEngine()
+percent_alert_engine = PercentMoveAlertEngine()
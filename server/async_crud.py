@@ -0,0 +1,48 @@
+# server/async_crud.py
+# AsyncSession reads behind the paginated list routes, for routes that should not hold a
+# threadpool thread per in-flight request
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page_async
+
+# ---- Portfolio Functions ----
+
+async def get_portfolio_page(db: AsyncSession, uid: int, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    """
+    One page of a user's portfolio ordered by cid, and the cursor of the next page.
+    """
+    statement = select(models.Portfolio).where(models.Portfolio.uid == uid)
+    return await keyset_page_async(db, statement, [models.Portfolio.cid], cursor, limit)
+
+# ---- Wallet Functions ----
+
+async def get_wallets_page(db: AsyncSession, uid: int, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    """
+    One page of a user's wallets ordered by address, and the cursor of the next page.
+    """
+    statement = select(models.Wallet).where(models.Wallet.uid == uid)
+    return await keyset_page_async(db, statement, [models.Wallet.address], cursor, limit)
+
+# ---- Transaction Functions ----
+
+async def get_transactions_page(db: AsyncSession, uid: int, cid: str = None, start: datetime = None,
+                                end: datetime = None, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                                descending: bool = False):
+    """
+    One page of a user's transactions ordered by time, optionally for one cid and a time range,
+    and the cursor of the next page.
+    """
+    statement = select(models.Transaction).where(models.Transaction.uid == uid)
+    if cid is not None:
+        statement = statement.where(models.Transaction.cid == cid)
+    if start is not None:
+        statement = statement.where(models.Transaction.time_transaction >= start)
+    if end is not None:
+        statement = statement.where(models.Transaction.time_transaction < end)
+    return await keyset_page_async(
+        db, statement, [models.Transaction.time_transaction, models.Transaction.tid], cursor, limit, descending
+    )
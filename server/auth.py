@@ -2,10 +2,14 @@ import os
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
 from . import schemas, models, utils
+from .cache import UserContextCache
 from .database import get_db
+from .passwords import password_hasher
 
 # Secret key to encode and decode JWT tokens
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")  # Use a fallback if environment variable is not set
@@ -14,6 +18,13 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Authenticated users by token subject, so hot paths skip the users lookup
+user_cache = UserContextCache(
+    maxsize=int(os.getenv("USER_CACHE_MAXSIZE", "4096")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+)
+USER_CACHE_FIELDS = ["uid", "email", "username", "role", "deactivated", "time_registered", "time_last_active"]
+
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """
@@ -47,6 +58,28 @@ def authenticate_user(db: Session, email: str, password: str):
     return user
 
 
+def _store_rehash(db: Session, user: models.User, hashed_password: str):
+    user.hashed_password = hashed_password
+    db.commit()
+
+
+async def authenticate_user_async(db: Session, email: str, password: str):
+    """
+    authenticate_user for async routes: the lookup runs on the threadpool and the
+    verification on the password hasher's executor. A hash made with an outdated
+    scheme or work factor is replaced with a fresh one.
+    """
+    user = await run_in_threadpool(get_user, db, email)
+    if not user:
+        return False
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return False
+    if new_hash:
+        await run_in_threadpool(_store_rehash, db, user, new_hash)
+    return user
+
+
 def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     """
     Get the currently authenticated user based on the JWT token.
@@ -64,12 +97,55 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
         token_data = schemas.TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = get_user(db, email=token_data.email)
+    user = user_cache.get(token_data.email)
     if user is None:
-        raise credentials_exception
+        user = get_user(db, email=token_data.email)
+        if user is None:
+            raise credentials_exception
+        user = _snapshot(user)
+        user_cache.set(token_data.email, user)
     return user
 
 
+def _snapshot(user: models.User) -> models.User:
+    """
+    A transient copy of the user without the password hash, safe to share between
+    requests and sessions because it never expires or lazy-loads.
+    """
+    return models.User(**{field: getattr(user, field) for field in USER_CACHE_FIELDS})
+
+
+def invalidate_user(email: str):
+    """
+    Drop a cached user. Updates and deletes through the ORM do this on their own;
+    call it after bulk `query.update()` / `delete()` on users.
+    """
+    user_cache.invalidate(email)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target):
+    emails = {target.email, *inspect(target).attrs.email.history.deleted}
+    for email in emails:
+        user_cache.invalidate(email)
+    # and again once committed, in case a concurrent request re-cached the old row meanwhile
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_user_emails", set()).update(emails)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for email in session.info.pop("changed_user_emails", ()):
+        user_cache.invalidate(email)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back_users(session, previous_transaction):
+    session.info.pop("changed_user_emails", None)
+
+
 def get_current_active_user(current_user: schemas.UserOut = Depends(get_current_user)):
     """
     Ensure the current user is active.
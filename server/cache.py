@@ -0,0 +1,194 @@
+# server/cache.py
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class MarketDataCache:
+    """
+    Async cache for upstream market data.
+
+    Entries are fresh for `ttl` seconds and may then be served stale for a further
+    `stale_ttl` seconds while a single background refresh runs. Concurrent misses
+    for the same key share one in-flight loader call.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0, stale_ttl: float = 300.0, ttl_overrides: dict = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.ttl_overrides = dict(ttl_overrides or {})
+        self._entries = OrderedDict()  # key -> (value, fresh_until, stale_until)
+        self._inflight = {}  # key -> asyncio.Task
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.refresh_errors = 0
+
+    def ttl_for(self, key) -> float:
+        return self.ttl_overrides.get(key, self.ttl)
+
+    async def get(self, key, loader):
+        """
+        Return the cached value for `key`, calling `loader()` (a coroutine function)
+        at most once per key at a time when the value is missing or expired.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if now < stale_until:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self._start_load(key, loader)
+                return value
+
+        self.misses += 1
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._start_load(key, loader)
+        else:
+            self.coalesced += 1
+        # shield so a cancelled caller does not cancel the load shared by the others
+        return await asyncio.shield(future)
+
+    def _start_load(self, key, loader):
+        task = asyncio.ensure_future(self._load(key, loader))
+        task.add_done_callback(self._load_done)
+        self._inflight[key] = task
+        return task
+
+    async def _load(self, key, loader):
+        try:
+            value = await loader()
+        except Exception as e:
+            if key in self._entries:
+                self.refresh_errors += 1
+                logger.warning(f"Refresh failed for {key}, serving stale value: {e}")
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.set(key, value)
+        return value
+
+    @staticmethod
+    def _load_done(task):
+        # mark the error retrieved so background refreshes with no waiter do not warn
+        if not task.cancelled():
+            task.exception()
+
+    def set(self, key, value):
+        now = time.monotonic()
+        fresh_until = now + self.ttl_for(key)
+        self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "evictions": self.evictions,
+            "refresh_errors": self.refresh_errors,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+
+class UserContextCache:
+    """
+    Thread-safe TTL cache of authenticated users keyed by token subject.
+
+    Sync routes resolve their dependencies on the threadpool, so lookups take a
+    lock. Values should be detached snapshots that are safe to share between
+    requests. `invalidate` drops an entry at once in this process; other worker
+    processes see the change when their own entry expires.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now < entry[1]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,10 +1,14 @@
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from . import models, schemas, utils
+from . import alerts, ledger, models, nav, schemas, utils
 from datetime import datetime, timezone
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = utils.get_password_hash(user.password)
+MESSAGE_CHUNK_SIZE = 1000
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str = None):
+    if hashed_password is None:
+        hashed_password = utils.get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -20,6 +24,31 @@ def create_user(db: Session, user: schemas.UserCreate):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
+def update_user(db: Session, uid: int, user: schemas.UserUpdate):
+    """
+    Update a user's profile. The cached auth context is invalidated on commit.
+    """
+    db_user = db.get(models.User, uid)
+    if db_user is None:
+        return None
+    for field, value in user.model_dump(exclude_unset=True).items():
+        setattr(db_user, field, value)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+def deactivate_user(db: Session, uid: int):
+    """
+    Deactivate a user. The cached auth context is invalidated on commit.
+    """
+    db_user = db.get(models.User, uid)
+    if db_user is None:
+        return None
+    db_user.deactivated = True
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
 def get_alerts_by_uid(db: Session, uid: int):
     return db.query(models.AlertSubscription).filter(models.AlertSubscription.uid == uid).all()
 
@@ -55,32 +84,34 @@ def get_portfolio_by_uid_and_cid(db: Session, uid: int, cid: str):
         models.Portfolio.cid == cid
     ).first()
 
-def update_portfolio(db: Session, uid: int, cid: str, quantity_change: float):
+def update_portfolio(db: Session, uid: int, cid: str, quantity_change: float, commit: bool = True):
     portfolio_entry = db.query(models.Portfolio).filter(models.Portfolio.uid == uid, models.Portfolio.cid == cid).first()
     
     if portfolio_entry:
         # Update existing portfolio quantity
-        portfolio_entry.amount += quantity_change
+        portfolio_entry.quantity = (portfolio_entry.quantity or 0) + quantity_change
         
         # If the resulting quantity is zero or negative, consider removing the entry (optional)
-        if portfolio_entry.amount <= 0:
-            delete_portfolio_entry(db, uid, cid)
-        else:
+        if portfolio_entry.quantity <= 0:
+            delete_portfolio_entry(db, uid, cid, commit=commit)
+        elif commit:
             db.commit()
     else:
         # If no entry exists, create a new one (only for positive quantities)
         if quantity_change > 0:
-            new_portfolio = models.Portfolio(uid=uid, cid=cid, amount=quantity_change, time_added=datetime.now(timezone.utc))
+            new_portfolio = models.Portfolio(uid=uid, cid=cid, quantity=quantity_change, time_created=datetime.now(timezone.utc))
             db.add(new_portfolio)
-            db.commit()
-            db.refresh(new_portfolio)
+            if commit:
+                db.commit()
+                db.refresh(new_portfolio)
             return new_portfolio
 
-def delete_portfolio_entry(db: Session, uid: int, cid: str):
+def delete_portfolio_entry(db: Session, uid: int, cid: str, commit: bool = True):
     portfolio_entry = db.query(models.Portfolio).filter(models.Portfolio.uid == uid, models.Portfolio.cid == cid).first()
     if portfolio_entry:
         db.delete(portfolio_entry)
-        db.commit()
+        if commit:
+            db.commit()
         return True
     return False
 # ---- Price Alert Management Functions ----
@@ -94,17 +125,18 @@ def create_alert_subscription(db: Session, alert: schemas.AlertCreate):
         subscription_active=True
     )
     db.add(db_alert)
-    db.commit()
-    db.refresh(db_alert)
+    db.flush()
 
+    # one commit, so the alert engines never see the subscription without its thresholds
     db_price_alert = models.PriceAlertSubscription(
         asid=db_alert.asid,
         threshold=alert.price_target,
-        threshold_percentage=alert.threshold_percentage
+        threshold_percentage=alert.threshold_percentage,
+        window_seconds=alert.window_seconds,
     )
     db.add(db_price_alert)
     db.commit()
-    db.refresh(db_price_alert)
+    db.refresh(db_alert)
     return db_alert
 
 def get_alerts_by_uid(db: Session, uid: int):
@@ -122,34 +154,57 @@ def deactivate_alert(db: Session, asid: int):
         db_alert.subscription_active = False
         db.commit()
         db.refresh(db_alert)
+        alerts.price_alert_engine.remove(asid)
+        alerts.percent_alert_engine.remove(asid)
         return db_alert
     return None
 
-def check_price_targets(db: Session):
-    """
-    Check if any cryptocurrency price is within 10% of the user's alert threshold.
-    If so, create a notification message for the user.
-    """
-    alerts = db.query(models.PriceAlertSubscription, models.AlertSubscription, models.Price).join(
-        models.AlertSubscription, models.PriceAlertSubscription.asid == models.AlertSubscription.asid
-    ).join(
-        models.Price, models.AlertSubscription.cid == models.Price.cid
-    ).filter(models.AlertSubscription.subscription_active == True).all()
-
-    for alert in alerts:
-        threshold = float(alert.PriceAlertSubscription.threshold)
-        current_price = float(alert.Price.current_price)
-        
-        # Check if price is within 10% of the target threshold
-        if abs(current_price - threshold) / threshold <= 0.1:
-            # Create a message to notify the user
-            create_message(
-                db=db,
-                uid=alert.AlertSubscription.uid,
-                asid=alert.AlertSubscription.asid,
-                message_type="Price Alert",
-                body=f"The price of {alert.AlertSubscription.cid} is within 10% of your target price.",
-            )
+def check_price_targets(db: Session, prices=None, engine: alerts.PriceAlertEngine = None,
+                        percent_engine: alerts.PercentMoveAlertEngine = None):
+    """
+    Evaluate price ticks against the active alerts and create a notification message
+    for every alert that fires.
+
+    `prices` is an iterable of (cid, price, time_stamp) ticks and defaults to the latest
+    stored price of every coin. A target alert fires when the price crosses into the
+    engine's band around its threshold, a percentage alert when the move within its
+    window reaches its percentage. Either fires once per crossing: it is then disarmed
+    until the price moves back past the re-arm band (see alerts.ALERT_REARM_BAND), and
+    does not fire again within the cooldown of its last firing. Messages and trigger
+    states are committed together.
+    """
+    if engine is None:
+        engine = alerts.price_alert_engine
+    if percent_engine is None:
+        percent_engine = alerts.percent_alert_engine
+    engine.sync(db)
+    percent_engine.sync(db)
+    if prices is None:
+        prices = [(price.cid, price.current_price, price.time_stamp) for price in get_latest_prices(db)]
+
+    messages = []
+    for cid, price, time_stamp in prices:
+        for asid, uid in engine.on_tick(cid, price, time_stamp):
+            # Queue a message to notify the user
+            messages.append({
+                "uid": uid,
+                "asid": asid,
+                "message_type": "Price Alert",
+                "body": f"The price of {cid} is within {engine.band:.0%} of your target price.",
+            })
+        for asid, uid, move in percent_engine.on_tick(cid, price, time_stamp):
+            messages.append({
+                "uid": uid,
+                "asid": asid,
+                "message_type": "Price Alert",
+                "body": f"The price of {cid} moved {move:+.2f}% within your alert window.",
+            })
+    notified = create_messages(db, messages, commit=False)
+    # persist armed/cooldown changes in the same transaction; steady-state runs write nothing
+    state_changes = engine.states.flush(db) + percent_engine.states.flush(db)
+    if notified or state_changes:
+        db.commit()
+    return notified
 
 #TODO: Implement message
 def create_message(db: Session, uid: int, asid: int, message_type: str, body: str):
@@ -169,6 +224,21 @@ def create_message(db: Session, uid: int, asid: int, message_type: str, body: st
     db.refresh(db_message)
     return db_message
 
+def create_messages(db: Session, messages: list, chunk_size: int = MESSAGE_CHUNK_SIZE, commit: bool = True) -> int:
+    """
+    Insert many messages with one executemany INSERT per chunk and return how many were written.
+    Each message is a dict with uid, asid, message_type and body.
+    """
+    if not messages:
+        return 0
+    time_sent = datetime.now(timezone.utc)
+    rows = [{**message, "time_sent": time_sent, "read": False} for message in messages]
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(models.Message), rows[start:start + chunk_size])
+    if commit:
+        db.commit()
+    return len(rows)
+
 # ---- Cryptocurrency Management Functions ----
 
 def get_all_cryptocurrencies(db: Session):
@@ -179,9 +249,18 @@ def get_all_cryptocurrencies(db: Session):
 
 def get_price_by_cid(db: Session, cid: str):
     """
-    根据加密货币的 cid 查询价格数据。
+    根据加密货币的 cid 查询最新价格数据。
+    """
+    return db.get(models.LatestPrice, cid)
+
+def get_latest_prices(db: Session, cids: list = None):
+    """
+    Retrieve the latest price row for the given cryptocurrencies, or for all of them.
     """
-    return db.query(models.Price).filter(models.Price.cid == cid).first()
+    query = db.query(models.LatestPrice)
+    if cids is not None:
+        query = query.filter(models.LatestPrice.cid.in_(cids))
+    return query.all()
 
 # ---- Transaction Management Functions ----
 
@@ -193,7 +272,7 @@ def create_transaction(db: Session, transaction: schemas.TransactionCreate):
     quantity_change = transaction.position if transaction.success else 0
 
     # Create the transaction record
-    db_transaction = schemas.TransactionCreate(
+    db_transaction = models.Transaction(
         uid=transaction.uid,
         wid=transaction.wid,
         cid=transaction.cid,
@@ -206,22 +285,26 @@ def create_transaction(db: Session, transaction: schemas.TransactionCreate):
         time_transaction=datetime.now(timezone.utc)
     )
     db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
+    db.flush()
+    # NAV snapshots from the transaction's day on no longer hold, rebuild them in the same commit
+    nav.invalidate(db, transaction.uid, db_transaction.time_transaction)
+    ledger.apply_transaction(db, db_transaction)
+    nav.replay(db, transaction.uid)
 
     # Update the portfolio and wallet balances if the transaction was successful
     if transaction.success:
         # Update the portfolio balance
-        update_portfolio(db, transaction.uid, transaction.cid, quantity_change)
+        update_portfolio(db, transaction.uid, transaction.cid, quantity_change, commit=False)
         # Send alert message
-        create_message(
-            db=db,
-            uid=transaction.uid,
-            asid=db_transaction.tid,  # Assuming tid is the transaction ID
-            message_type="Transaction Alert",
-            body=f"Transaction for {transaction.cid} has been processed successfully."
-        )
-
+        create_messages(db, [{
+            "uid": transaction.uid,
+            "asid": db_transaction.tid,  # Assuming tid is the transaction ID
+            "message_type": "Transaction Alert",
+            "body": f"Transaction for {transaction.cid} has been processed successfully.",
+        }], commit=False)
+
+    # the transaction, ledger, NAV, portfolio and message land together or not at all
+    db.commit()
     return db_transaction
 
 def get_transactions_by_uid(db: Session, uid: int):
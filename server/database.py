@@ -13,13 +13,131 @@
 #         yield db
 #     finally:
 #         db.close()
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+import os
 
-# 使用 SQLite 数据库
-engine = create_engine("sqlite:///./test.db")
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+# 使用 SQLite 数据库 unless SQLALCHEMY_DATABASE_URL points elsewhere
+DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL", "sqlite:///./test.db")
+# Optional read-only replica for read-heavy routes; defaults to the primary database
+READ_DATABASE_URL = os.getenv("SQLALCHEMY_READ_DATABASE_URL") or DATABASE_URL
+# Async routes reach the same databases through an async driver
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# WAL lets readers run alongside the single writer; NORMAL only syncs at checkpoints,
+# which is durable across application crashes and safe with WAL
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def _sqlite_pragmas(journal_mode: str, synchronous: str, busy_timeout_ms: int, query_only: bool):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+            if journal_mode:
+                cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+            if synchronous:
+                cursor.execute(f"PRAGMA synchronous = {synchronous}")
+            if query_only:
+                cursor.execute("PRAGMA query_only = ON")
+        finally:
+            cursor.close()
+
+    return set_pragmas
+
+
+def _engine_options(url, read_only: bool, pool_size: int, max_overflow: int, pool_timeout: float,
+                    pool_recycle: int, journal_mode: str, synchronous: str, busy_timeout_ms: int):
+    """
+    (create_engine kwargs, SQLite connect listener or None) shared by the sync and async engines.
+    """
+    kwargs = {"pool_pre_ping": True}
+    sqlite = url.get_backend_name() == "sqlite"
+    in_memory = sqlite and url.database in (None, "", ":memory:")
+    if not in_memory:
+        # in-memory SQLite uses a per-thread pool that takes no sizing
+        kwargs.update(
+            pool_size=DB_POOL_SIZE if pool_size is None else pool_size,
+            max_overflow=DB_MAX_OVERFLOW if max_overflow is None else max_overflow,
+            pool_timeout=DB_POOL_TIMEOUT if pool_timeout is None else pool_timeout,
+            pool_recycle=DB_POOL_RECYCLE if pool_recycle is None else pool_recycle,
+        )
+    if read_only and url.get_backend_name() == "postgresql":
+        kwargs["execution_options"] = {"postgresql_readonly": True}
+    if not sqlite:
+        return kwargs, None
+    return kwargs, _sqlite_pragmas(
+        None if in_memory else SQLITE_JOURNAL_MODE if journal_mode is None else journal_mode,
+        SQLITE_SYNCHRONOUS if synchronous is None else synchronous,
+        SQLITE_BUSY_TIMEOUT_MS if busy_timeout_ms is None else busy_timeout_ms,
+        read_only,
+    )
+
+
+def make_engine(url: str = None, read_only: bool = False, pool_size: int = None, max_overflow: int = None,
+                pool_timeout: float = None, pool_recycle: int = None, journal_mode: str = None,
+                synchronous: str = None, busy_timeout_ms: int = None):
+    """
+    An engine for `url` with the configured pool, and for SQLite the journal,
+    sync and busy-timeout pragmas applied to every new connection.
+    """
+    url = make_url(url or DATABASE_URL)
+    kwargs, set_pragmas = _engine_options(url, read_only, pool_size, max_overflow, pool_timeout, pool_recycle,
+                                          journal_mode, synchronous, busy_timeout_ms)
+    engine = create_engine(url, **kwargs)
+    if set_pragmas is not None:
+        event.listen(engine, "connect", set_pragmas)
+    return engine
+
+
+def async_url(url: str):
+    """
+    `url` with its driver swapped for the async one: aiosqlite for SQLite, asyncpg for PostgreSQL.
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r} databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def make_async_engine(url: str = None, read_only: bool = False, pool_size: int = None, max_overflow: int = None,
+                      pool_timeout: float = None, pool_recycle: int = None, journal_mode: str = None,
+                      synchronous: str = None, busy_timeout_ms: int = None):
+    """
+    make_engine for AsyncSession: the same pool settings and SQLite pragmas on an async driver.
+    """
+    url = async_url(url or DATABASE_URL)
+    kwargs, set_pragmas = _engine_options(url, read_only, pool_size, max_overflow, pool_timeout, pool_recycle,
+                                          journal_mode, synchronous, busy_timeout_ms)
+    if set_pragmas is not None and "pool_size" in kwargs:
+        # aiosqlite defaults to NullPool, reconnecting and re-running the pragmas per checkout
+        kwargs["poolclass"] = AsyncAdaptedQueuePool
+    engine = create_async_engine(url, **kwargs)
+    if set_pragmas is not None:
+        event.listen(engine.sync_engine, "connect", set_pragmas)
+    return engine
+
+
+engine = make_engine(DATABASE_URL)
+# Its own pool even on the primary, so reads never queue for a connection behind writes
+read_engine = make_engine(READ_DATABASE_URL, read_only=True)
+
+# A new session per call: sync routes run in threadpool threads and ingestion in to_thread
+# workers, where a thread-scoped session would be left behind in every thread
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 def get_db():
     db = SessionLocal()
@@ -28,3 +146,33 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """
+    A session on the read replica for routes that only read and can tolerate
+    replication lag, such as market data.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Dispose both on shutdown, as the app lifespan does: each pooled aiosqlite connection keeps a thread
+async_engine = make_async_engine(DATABASE_URL)
+async_read_engine = make_async_engine(READ_DATABASE_URL, read_only=True)
+
+# expire_on_commit=False: attributes of committed objects must not lazy-load under asyncio
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    """
+    get_read_db for async routes.
+    """
+    async with AsyncReadSessionLocal() as db:
+        yield db
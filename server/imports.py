@@ -0,0 +1,270 @@
+# server/imports.py
+import argparse
+import codecs
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from itertools import islice
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from . import ledger, models, nav, rollups, schemas
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# Keep the first few row errors in the report, count the rest
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportReport:
+    """
+    Running totals for one import, logged after every chunk.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.chunks = 0
+        self.errors = []
+        self.positions_rebuilt = False
+        self._started = time.perf_counter()
+
+    def add_error(self, line: int, error: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self._started
+
+    def as_dict(self) -> dict:
+        seconds = self.seconds
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "chunks": self.chunks,
+            "seconds": seconds,
+            "rows_per_sec": self.rows / seconds if seconds else 0.0,
+            "positions_rebuilt": self.positions_rebuilt,
+            "errors": self.errors,
+        }
+
+
+def read_rows(stream, format: str):
+    """
+    Yield (line number, raw dict) from a binary CSV or JSONL stream without reading it whole.
+    """
+    text = codecs.getreader("utf-8-sig")(stream)
+    if format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            # empty cells fall back to the schema defaults
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+    elif format == "jsonl":
+        for line_number, line in enumerate(text, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield line_number, exc
+    else:
+        raise ValueError(f"Unsupported import format {format!r}, expected csv or jsonl")
+
+
+def idempotency_key(row: schemas.TransactionImport) -> str:
+    """
+    The row's own key, or a hash of the trade itself so re-importing a file is a no-op.
+    """
+    if row.idempotency_key:
+        return row.idempotency_key
+    trade = "|".join(str(value) for value in (
+        row.cid, row.cid_target, row.ex_rate, row.position, row.network,
+        rollups.utc_naive(row.time_transaction).isoformat(), row.wid,
+    ))
+    return "sha1:" + hashlib.sha1(trade.encode()).hexdigest()
+
+
+def _update_portfolio(db: Session, uid: int, changes: dict):
+    """
+    Apply net quantity changes per cid to `portfolio`, following crud.update_portfolio.
+    """
+    entries = {
+        entry.cid: entry
+        for entry in db.query(models.Portfolio).filter(models.Portfolio.uid == uid, models.Portfolio.cid.in_(changes))
+    }
+    now = rollups.utcnow()
+    for cid, change in changes.items():
+        entry = entries.get(cid)
+        if entry is not None:
+            entry.quantity = (entry.quantity or 0) + change
+            if entry.quantity <= 0:
+                db.delete(entry)
+        elif change > 0:
+            db.add(models.Portfolio(uid=uid, cid=cid, quantity=change, time_created=now))
+
+
+class TransactionImporter:
+    """
+    Stream a CSV or JSONL transaction history for one user into the database.
+
+    Rows are validated, deduplicated on their idempotency key and inserted a chunk
+    at a time, each chunk in its own database transaction together with its
+    portfolio, NAV and positions ledger updates.
+    """
+
+    def __init__(self, db: Session, uid: int, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.db = db
+        self.uid = uid
+        self.chunk_size = chunk_size
+        self.report = ImportReport()
+        # FIFO lots need trades in time order, so the ledger is only updated in place
+        # while every chunk is newer than what it already holds
+        self.latest_time = db.query(func.max(models.Transaction.time_transaction)).filter(
+            models.Transaction.uid == uid
+        ).scalar()
+
+    def _validate(self, chunk: list) -> dict:
+        rows = {}
+        for line, raw in chunk:
+            self.report.rows += 1
+            if isinstance(raw, Exception):
+                self.report.add_error(line, str(raw))
+                continue
+            try:
+                row = schemas.TransactionImport.model_validate(raw)
+            except ValidationError as exc:
+                self.report.add_error(line, "; ".join(
+                    f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors()
+                ))
+                continue
+            key = idempotency_key(row)
+            if key in rows:
+                self.report.duplicates += 1
+            else:
+                rows[key] = row
+        return rows
+
+    def import_chunk(self, chunk: list) -> int:
+        """
+        Insert one chunk of (line number, raw row) and commit. Returns the rows inserted.
+        """
+        db, uid = self.db, self.uid
+        rows = self._validate(chunk)
+        existing = set()
+        if rows:
+            existing = {key for key, in db.query(models.Transaction.idempotency_key).filter(
+                models.Transaction.uid == uid, models.Transaction.idempotency_key.in_(list(rows))
+            )}
+        self.report.duplicates += len(existing)
+        records = sorted(
+            (
+                {
+                    **row.model_dump(exclude={"idempotency_key"}),
+                    "uid": uid,
+                    "time_transaction": rollups.utc_naive(row.time_transaction),
+                    "idempotency_key": key,
+                }
+                for key, row in rows.items()
+                if key not in existing
+            ),
+            key=lambda record: record["time_transaction"],
+        )
+
+        backdated = False
+        if records:
+            db.execute(insert(models.Transaction), records)
+            nav.invalidate(db, uid, records[0]["time_transaction"])
+            changes = {}
+            for record in records:
+                if record["success"]:
+                    changes[record["cid"]] = changes.get(record["cid"], 0.0) + record["position"]
+            _update_portfolio(db, uid, changes)
+
+            first, last = records[0]["time_transaction"], records[-1]["time_transaction"]
+            backdated = self.report.positions_rebuilt or (self.latest_time is not None and first < self.latest_time)
+            if not backdated:
+                inserted = db.query(models.Transaction).filter(
+                    models.Transaction.uid == uid,
+                    models.Transaction.idempotency_key.in_([record["idempotency_key"] for record in records]),
+                ).order_by(models.Transaction.time_transaction, models.Transaction.tid).all()
+                ledger.apply_transactions(db, inserted)
+            if self.latest_time is None or last > self.latest_time:
+                self.latest_time = last
+        db.commit()
+        if backdated:
+            # from here on the ledger is rebuilt from the full history when the import ends
+            self.report.positions_rebuilt = True
+        self.report.inserted += len(records)
+        self.report.chunks += 1
+        return len(records)
+
+    def run(self, stream, format: str) -> ImportReport:
+        """
+        Import every chunk of `stream`. Chunks committed before a failing one stay
+        imported, and the ledger and NAV are brought in line with them either way.
+        """
+        rows = read_rows(stream, format)
+        report = self.report
+        try:
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                try:
+                    self.import_chunk(chunk)
+                except Exception:
+                    self.db.rollback()
+                    raise
+                logger.info(
+                    f"Import for uid {self.uid}: {report.rows} rows, {report.inserted} inserted, "
+                    f"{report.duplicates} duplicates, {report.invalid} invalid, {report.rows / report.seconds:.0f} rows/s"
+                )
+        finally:
+            if report.positions_rebuilt:
+                # back-dated rows were committed: replay this user's lots from the full history
+                ledger.rebuild_positions(self.db, uid=self.uid)
+            if report.inserted:
+                # chunks only invalidated NAV, replay it once for the whole import
+                nav.replay(self.db, self.uid)
+                self.db.commit()
+        return report
+
+
+def detect_format(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}.get(extension, "csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a CSV or JSONL transaction history for one user.")
+    parser.add_argument("path")
+    parser.add_argument("--uid", type=int, required=True)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None, help="Defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as stream:
+            importer = TransactionImporter(db, args.uid, chunk_size=args.chunk_size)
+            report = importer.run(stream, args.format or detect_format(args.path))
+    finally:
+        db.close()
+    logger.info(f"Import finished: {report.as_dict()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+# server/indicators.py
+import math
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy.orm import Session
+
+from . import rollups
+
+LIVE_INDICATOR_RESOLUTION = int(os.getenv("LIVE_INDICATOR_RESOLUTION", "60"))
+LIVE_INDICATOR_HISTORY = int(os.getenv("LIVE_INDICATOR_HISTORY", "500"))
+LIVE_INDICATOR_MAX_COINS = int(os.getenv("LIVE_INDICATOR_MAX_COINS", "1000"))
+
+# decay ** -block must stay well inside float64 range in the blocked EMA
+_MAX_SCALE_EXPONENT = 230.0
+_MAX_EMA_BLOCK = 1 << 16
+# windows per chunk in rolling_std, bounds the temporary to chunk * window floats
+_STD_CHUNK = 1 << 16
+
+
+def as_buffer(values) -> np.ndarray:
+    """
+    A contiguous float64 view of `values`, copying only when needed.
+    """
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def _ewm(values: np.ndarray, alpha: float, initial: float) -> np.ndarray:
+    """
+    y[t] = alpha * x[t] + (1 - alpha) * y[t - 1] with y[-1] = initial.
+
+    The recurrence is solved a block at a time: inside a block
+    y[k] = decay^k * (decay * y[-1] + alpha * cumsum(x[j] * decay^-j)[k]),
+    so each block is a handful of array operations and only the carry between
+    blocks is sequential.
+    """
+    out = np.empty_like(values)
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[:] = values
+        return out
+    block = int(min(_MAX_EMA_BLOCK, max(1, _MAX_SCALE_EXPONENT / -math.log(decay))))
+    growth = decay ** -np.arange(min(block, len(values)), dtype=np.float64)
+    shrink = 1.0 / growth
+    prev = initial
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        k = len(chunk)
+        acc = np.cumsum(chunk * growth[:k])
+        acc *= alpha
+        acc += decay * prev
+        acc *= shrink[:k]
+        out[start:start + k] = acc
+        prev = acc[-1]
+    return out
+
+
+def sma(values, window: int) -> np.ndarray:
+    """
+    Simple moving average; the first `window - 1` values are NaN.
+    """
+    values = as_buffer(values)
+    out = np.full_like(values, np.nan)
+    if window <= len(values):
+        # offset by the first value to keep the running sum small
+        sums = np.cumsum(values - values[0])
+        sums[window:] -= sums[:-window].copy()
+        out[window - 1:] = sums[window - 1:] / window + values[0]
+    return out
+
+
+def rolling_std(values, window: int) -> np.ndarray:
+    """
+    Population standard deviation over a sliding window; the first `window - 1` values are NaN.
+    """
+    values = as_buffer(values)
+    out = np.full_like(values, np.nan)
+    n = len(values) - window + 1
+    for start in range(0, max(n, 0), _STD_CHUNK):
+        stop = min(start + _STD_CHUNK, n)
+        windows = sliding_window_view(values[start:stop + window - 1], window)
+        out[start + window - 1:stop + window - 1] = windows.std(axis=1)
+    return out
+
+
+def ema(values, span: int) -> np.ndarray:
+    """
+    Exponential moving average with alpha = 2 / (span + 1), seeded with the first value.
+    """
+    values = as_buffer(values)
+    if not len(values):
+        return values.copy()
+    return _ewm(values, 2.0 / (span + 1), values[0])
+
+
+def _wilder(values: np.ndarray, period: int, offset: int = 0) -> np.ndarray:
+    """
+    Wilder's smoothing (alpha = 1 / period) seeded with the mean of the first `period`
+    values. The result is aligned with `values` shifted by `offset`, NaN until seeded.
+    """
+    out = np.full(len(values) + offset, np.nan)
+    if len(values) < period:
+        return out
+    seed = values[:period].mean()
+    out[offset + period - 1] = seed
+    out[offset + period:] = _ewm(values[period:], 1.0 / period, seed)
+    return out
+
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        return np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), 100.0 - 100.0 / (1.0 + rs))
+
+
+def rsi(values, period: int = 14) -> np.ndarray:
+    """
+    Wilder's relative strength index, 0-100; the first `period` values are NaN.
+    """
+    values = as_buffer(values)
+    if len(values) < 2:
+        return np.full_like(values, np.nan)
+    delta = np.diff(values)
+    avg_gain = _wilder(np.maximum(delta, 0.0), period, offset=1)
+    avg_loss = _wilder(np.maximum(-delta, 0.0), period, offset=1)
+    return _rsi_from_averages(avg_gain, avg_loss)
+
+
+def macd(values, fast: int = 12, slow: int = 26, signal: int = 9):
+    """
+    Return (macd, signal, histogram).
+    """
+    line = ema(values, fast) - ema(values, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(values, window: int = 20, width: float = 2.0):
+    """
+    Return (lower, middle, upper) bands `width` standard deviations around the SMA.
+    """
+    middle = sma(values, window)
+    spread = width * rolling_std(values, window)
+    return middle - spread, middle, middle + spread
+
+
+def true_range(high, low, close) -> np.ndarray:
+    high, low, close = as_buffer(high), as_buffer(low), as_buffer(close)
+    ranges = high - low
+    if len(close) > 1:
+        prev_close = close[:-1]
+        ranges[1:] = np.maximum(ranges[1:], np.maximum(np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close)))
+    return ranges
+
+
+def atr(high, low, close, period: int = 14) -> np.ndarray:
+    """
+    Wilder's average true range; the first `period - 1` values are NaN.
+    """
+    return _wilder(true_range(high, low, close), period)
+
+
+class RollingWindow:
+    """
+    The last `window` values in a fixed ring buffer.
+    """
+
+    def __init__(self, window: int, values=()):
+        self.window = window
+        self._buffer = np.zeros(window)
+        self._next = 0
+        self._count = 0
+        for value in as_buffer(values)[-window:]:
+            self.append(value)
+
+    def append(self, value: float):
+        self._buffer[self._next] = value
+        self._next = (self._next + 1) % self.window
+        self._count = min(self._count + 1, self.window)
+
+    def with_value(self, value: float):
+        """
+        The window as it would be after appending `value`, or None while it is still filling.
+        """
+        if self._count + 1 < self.window:
+            return None
+        buffer = self._buffer.copy()
+        buffer[self._next] = value
+        return buffer
+
+
+class EMAState:
+    def __init__(self, alpha: float, value: float = None):
+        self.alpha = alpha
+        self.value = value
+
+    def peek(self, x: float) -> float:
+        return x if self.value is None else self.value + self.alpha * (x - self.value)
+
+    def update(self, x: float) -> float:
+        self.value = self.peek(x)
+        return self.value
+
+
+class WilderState:
+    """
+    Wilder's smoothing, averaging the first `period` inputs before switching to the recurrence.
+    """
+
+    def __init__(self, period: int, value: float = None):
+        self.period = period
+        self.value = value
+        self._seed = []
+
+    def peek(self, x: float) -> float:
+        if self.value is not None:
+            return self.value + (x - self.value) / self.period
+        if len(self._seed) + 1 == self.period:
+            return (sum(self._seed) + x) / self.period
+        return math.nan
+
+    def update(self, x: float) -> float:
+        value = self.peek(x)
+        if math.isnan(value):
+            self._seed.append(x)
+        else:
+            self.value, self._seed = value, []
+        return value
+
+
+class IndicatorState:
+    """
+    Indicator values for one series, advanced one bar at a time.
+
+    `update` commits a closed bar; `peek` gives the values as if the bar still
+    forming closed at the given prices, without changing any state. Build it from
+    history with `from_series` so it starts from the same values the vectorized
+    functions produce.
+    """
+
+    def __init__(self, window: int = 20, ema_span: int = 20, rsi_period: int = 14,
+                 macd_fast: int = 12, macd_slow: int = 26, macd_signal: int = 9,
+                 bollinger_width: float = 2.0, atr_period: int = 14):
+        self.params = dict(
+            window=window, ema_span=ema_span, rsi_period=rsi_period, macd_fast=macd_fast,
+            macd_slow=macd_slow, macd_signal=macd_signal, bollinger_width=bollinger_width, atr_period=atr_period,
+        )
+        self.window = RollingWindow(window)
+        self.bollinger_width = bollinger_width
+        self.ema = EMAState(2.0 / (ema_span + 1))
+        self.macd_fast = EMAState(2.0 / (macd_fast + 1))
+        self.macd_slow = EMAState(2.0 / (macd_slow + 1))
+        self.macd_signal = EMAState(2.0 / (macd_signal + 1))
+        self.avg_gain = WilderState(rsi_period)
+        self.avg_loss = WilderState(rsi_period)
+        self.atr = WilderState(atr_period)
+        self.prev_close = None
+
+    @classmethod
+    def from_series(cls, high, low, close, **params) -> "IndicatorState":
+        """
+        Seed the state from closed bars using the vectorized functions.
+        """
+        state = cls(**params)
+        high, low, close = as_buffer(high), as_buffer(low), as_buffer(close)
+        if not len(close):
+            return state
+        params = state.params
+        state.window = RollingWindow(params["window"], close)
+        state.ema.value = ema(close, params["ema_span"])[-1]
+        fast, slow = ema(close, params["macd_fast"]), ema(close, params["macd_slow"])
+        state.macd_fast.value, state.macd_slow.value = fast[-1], slow[-1]
+        state.macd_signal.value = ema(fast - slow, params["macd_signal"])[-1]
+
+        delta = np.diff(close)
+        for wilder, inputs in (
+            (state.avg_gain, np.maximum(delta, 0.0)),
+            (state.avg_loss, np.maximum(-delta, 0.0)),
+            (state.atr, true_range(high, low, close)),
+        ):
+            if len(inputs) >= wilder.period:
+                wilder.value = _wilder(inputs, wilder.period)[-1]
+            else:
+                wilder._seed = inputs.tolist()
+        state.prev_close = close[-1]
+        return state
+
+    def _step(self, high: float, low: float, close: float) -> dict:
+        values = {"close": close}
+        window = self.window.with_value(close)
+        if window is None:
+            values.update(sma=None, bollinger_lower=None, bollinger_upper=None)
+        else:
+            mean, spread = window.mean(), self.bollinger_width * window.std()
+            values.update(sma=mean, bollinger_lower=mean - spread, bollinger_upper=mean + spread)
+        values["ema"] = self.ema.peek(close)
+        line = self.macd_fast.peek(close) - self.macd_slow.peek(close)
+        signal = self.macd_signal.peek(line)
+        values.update(macd=line, macd_signal=signal, macd_histogram=line - signal)
+
+        if self.prev_close is None:
+            values["rsi"] = None
+            tr = high - low
+        else:
+            delta = close - self.prev_close
+            avg_gain, avg_loss = self.avg_gain.peek(max(delta, 0.0)), self.avg_loss.peek(max(-delta, 0.0))
+            values["rsi"] = None if math.isnan(avg_gain) else float(_rsi_from_averages(avg_gain, avg_loss))
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        atr_value = self.atr.peek(tr)
+        values["atr"] = None if math.isnan(atr_value) else atr_value
+        values["_tr"] = tr
+        return values
+
+    def peek(self, close: float, high: float = None, low: float = None) -> dict:
+        values = self._step(close if high is None else high, close if low is None else low, close)
+        values.pop("_tr")
+        return values
+
+    def update(self, close: float, high: float = None, low: float = None) -> dict:
+        high = close if high is None else high
+        low = close if low is None else low
+        values = self._step(high, low, close)
+        self.window.append(close)
+        self.ema.update(close)
+        line = self.macd_fast.update(close) - self.macd_slow.update(close)
+        self.macd_signal.update(line)
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            self.avg_gain.update(max(delta, 0.0))
+            self.avg_loss.update(max(-delta, 0.0))
+        self.atr.update(values.pop("_tr"))
+        self.prev_close = close
+        return values
+
+
+def compute(high, low, close, window: int = 20, ema_span: int = 20, rsi_period: int = 14,
+            macd_fast: int = 12, macd_slow: int = 26, macd_signal: int = 9,
+            bollinger_width: float = 2.0, atr_period: int = 14) -> dict:
+    """
+    Every indicator over the whole series, as arrays aligned with `close`.
+    """
+    close = as_buffer(close)
+    lower, middle, upper = bollinger(close, window, bollinger_width)
+    line, signal, histogram = macd(close, macd_fast, macd_slow, macd_signal)
+    return {
+        "sma": middle,
+        "ema": ema(close, ema_span),
+        "rsi": rsi(close, rsi_period),
+        "macd": line,
+        "macd_signal": signal,
+        "macd_histogram": histogram,
+        "bollinger_lower": lower,
+        "bollinger_upper": upper,
+        "atr": atr(high, low, close, atr_period),
+    }
+
+
+def to_json_list(values: np.ndarray) -> list:
+    """
+    Floats for JSON, with NaN warm-up values as None.
+    """
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+def warmup_bars(window: int = 20, ema_span: int = 20, rsi_period: int = 14,
+                macd_slow: int = 26, macd_signal: int = 9, atr_period: int = 14, **params) -> int:
+    """
+    Bars of history to read before a range so its first values are settled.
+    """
+    return max(window, 3 * ema_span, 3 * rsi_period, 3 * (macd_slow + macd_signal), 3 * atr_period)
+
+
+class LiveIndicators:
+    """
+    IndicatorState per coin over `resolution`-second bars, advanced by ingestion ticks.
+
+    A coin is seeded from its stored candles the first time it is asked for and then
+    kept current by `update`, so reading its latest values costs one `peek`. When
+    ingestion runs in another process no ticks arrive here, so a coin whose forming
+    bar has fallen behind is seeded again from the candles that process stored.
+    """
+
+    def __init__(self, resolution: int = LIVE_INDICATOR_RESOLUTION, history: int = LIVE_INDICATOR_HISTORY,
+                 max_coins: int = LIVE_INDICATOR_MAX_COINS):
+        self.resolution = resolution
+        self.history = history
+        self.max_coins = max_coins
+        # cid -> [state, forming bucket, high, low, close]
+        self._coins = OrderedDict()
+
+    def __contains__(self, cid: str) -> bool:
+        return cid in self._coins
+
+    def needs_seed(self, cid: str, now: datetime = None) -> bool:
+        """
+        True when the coin was never seeded, had no bars, or its forming bar closed
+        more than one bar ago without a tick reaching this process.
+        """
+        entry = self._coins.get(cid)
+        if entry is None or entry[1] is None:
+            return True
+        bar_end = entry[1] + timedelta(seconds=self.resolution)
+        return ((now or rollups.utcnow()) - bar_end).total_seconds() > self.resolution
+
+    def seed(self, db: Session, cid: str, now: datetime = None):
+        now = now or rollups.utcnow()
+        _, candles = rollups.get_candles(
+            db, cid, now - timedelta(seconds=self.resolution * self.history), now, resolution=self.resolution
+        )
+        # the newest stored bar may still be forming, it is committed once a later tick arrives
+        forming = candles.pop() if candles else None
+        state = IndicatorState.from_series(
+            [candle.high for candle in candles], [candle.low for candle in candles], [candle.close for candle in candles]
+        )
+        if forming is None:
+            self._coins[cid] = [state, None, None, None, None]
+        else:
+            self._coins[cid] = [state, forming.bucket_start, forming.high, forming.low, forming.close]
+        while len(self._coins) > self.max_coins:
+            self._coins.popitem(last=False)
+
+    def update(self, rows: list):
+        """
+        Ingestion listener: fold ticks into the forming bar, committing bars as they close.
+        """
+        for row in sorted(rows, key=lambda row: row["time_stamp"]):
+            entry = self._coins.get(row["cid"])
+            price = row.get("current_price")
+            if entry is None or price is None:
+                continue
+            bucket = rollups.bucket_start(row["time_stamp"], self.resolution)
+            state, forming, high, low, close = entry
+            if forming is None or bucket > forming:
+                if forming is not None:
+                    state.update(close, high, low)
+                entry[1:] = [bucket, price, price, price]
+            elif bucket == forming:
+                entry[2:] = [max(high, price), min(low, price), price]
+
+    def latest(self, cid: str):
+        """
+        (bar start, indicator values) including the forming bar, or None if not seeded or no bars yet.
+        """
+        entry = self._coins.get(cid)
+        if entry is None or entry[1] is None:
+            return None
+        self._coins.move_to_end(cid)
+        state, forming, high, low, close = entry
+        return forming, state.peek(close, high, low)
+
+
+live_indicators = LiveIndicators()
@@ -0,0 +1,333 @@
+# server/ingestion.py
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+
+from . import crud, models, nav, prices, rollups
+from .database import SessionLocal, engine
+from .market_client import MarketDataClient, market_client
+from .migrations import run_migrations
+from .ratelimit import PRIORITIES
+
+logger = logging.getLogger(__name__)
+
+INGESTION_INTERVAL = float(os.getenv("INGESTION_INTERVAL", "60"))
+INGESTION_PER_PAGE = int(os.getenv("INGESTION_PER_PAGE", "250"))
+INGESTION_MAX_PAGES = int(os.getenv("INGESTION_MAX_PAGES", "4"))
+# How often ingestion runs extend every user's NAV to today; 0 disables it
+NAV_REFRESH_INTERVAL = float(os.getenv("NAV_REFRESH_INTERVAL", "3600"))
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return _utc_naive(parsed)
+
+
+def _utc_naive(value: datetime) -> datetime:
+    # TIMESTAMP columns come back naive, so keep tick times naive UTC throughout
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _to_float(value):
+    return None if value is None else float(value)
+
+
+def _to_int(value):
+    return None if value is None else int(value)
+
+
+def normalize_market_row(item: dict, fetched_at: datetime) -> dict:
+    """
+    Map one `/coins/markets` entry onto the columns of the `price` table.
+    """
+    return {
+        "cid": item["id"],
+        "current_price": _to_float(item.get("current_price")),
+        "market_cap": _to_int(item.get("market_cap")),
+        "market_cap_rank": _to_int(item.get("market_cap_rank")),
+        "total_volume": _to_int(item.get("total_volume")),
+        "high_24h": _to_float(item.get("high_24h")),
+        "low_24h": _to_float(item.get("low_24h")),
+        "price_change_24h": _to_float(item.get("price_change_24h")),
+        "price_change_percentage_24h": _to_float(item.get("price_change_percentage_24h")),
+        "market_cap_change_24h": _to_float(item.get("market_cap_change_24h")),
+        "time_stamp": _parse_time(item.get("last_updated")) or _utc_naive(fetched_at),
+    }
+
+
+def _new_ticks(db, rows: list) -> list:
+    """
+    Drop rows already stored: a coin whose upstream `last_updated` has not moved since
+    the previous poll comes back with the time stamp `latest_price` already holds.
+    """
+    stored = dict(db.execute(
+        select(models.LatestPrice.cid, models.LatestPrice.time_stamp)
+        .where(models.LatestPrice.cid.in_({row["cid"] for row in rows}))
+    ).all())
+    seen, fresh = set(), []
+    for row in rows:
+        key = (row["cid"], row["time_stamp"])
+        if key in seen or stored.get(row["cid"]) == row["time_stamp"]:
+            continue
+        seen.add(key)
+        fresh.append(row)
+    return fresh
+
+
+def write_price_rows(rows: list, session_factory=SessionLocal) -> int:
+    """
+    Insert a batch of normalized price rows with one executemany in one transaction,
+    refreshing `latest_price` and the open OHLCV candles for the same coins.
+    Ticks already stored are skipped; returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    db = session_factory()
+    try:
+        rows = _new_ticks(db, rows)
+        if not rows:
+            return 0
+        db.execute(insert(models.Price), rows)
+        prices.upsert_latest_prices(db, rows, prices.next_write_seq(db))
+        rollups.upsert_candles(db, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return len(rows)
+
+
+def prune_candles(session_factory=SessionLocal) -> int:
+    db = session_factory()
+    try:
+        deleted = rollups.prune_candles(db)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+def refresh_nav(session_factory=SessionLocal) -> int:
+    db = session_factory()
+    try:
+        return nav.refresh_all(db)
+    finally:
+        db.close()
+
+
+def check_price_alerts(rows: list, session_factory=SessionLocal) -> int:
+    """
+    Feed a committed batch to the price alert engine and notify the users whose alerts fired.
+    """
+    db = session_factory()
+    try:
+        return crud.check_price_targets(db, prices=[(row["cid"], row["current_price"], row["time_stamp"]) for row in rows])
+    finally:
+        db.close()
+
+
+async def alert_listener(rows: list):
+    notified = await asyncio.to_thread(check_price_alerts, rows)
+    if notified:
+        logger.info(f"Sent {notified} price alert messages")
+
+
+class IngestionStats:
+    """
+    Running totals for the ingestion worker.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+        self.write_seconds = 0.0
+        self.last_batch_latency = 0.0
+        self.max_batch_latency = 0.0
+        self.last_run_seconds = 0.0
+        self.last_run_rows = 0
+
+    def record_batch(self, rows: int, latency: float):
+        self.batches += 1
+        self.rows += rows
+        self.write_seconds += latency
+        self.last_batch_latency = latency
+        self.max_batch_latency = max(self.max_batch_latency, latency)
+
+    def as_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "batches": self.batches,
+            "rows": self.rows,
+            "errors": self.errors,
+            "write_rows_per_sec": self.rows / self.write_seconds if self.write_seconds else 0.0,
+            "avg_batch_latency": self.write_seconds / self.batches if self.batches else 0.0,
+            "last_batch_latency": self.last_batch_latency,
+            "max_batch_latency": self.max_batch_latency,
+            "last_run_rows": self.last_run_rows,
+            "last_run_seconds": self.last_run_seconds,
+            "last_run_rows_per_sec": self.last_run_rows / self.last_run_seconds if self.last_run_seconds else 0.0,
+        }
+
+
+class MarketIngestionWorker:
+    """
+    Page through `/coins/markets` on a schedule and bulk-write each page into `price`.
+
+    Listeners registered with `add_listener` are called with the rows of every
+    committed batch so downstream state can be updated from the same ticks.
+    """
+
+    def __init__(
+        self,
+        client: MarketDataClient = None,
+        session_factory=SessionLocal,
+        vs_currency: str = "usd",
+        per_page: int = INGESTION_PER_PAGE,
+        max_pages: int = INGESTION_MAX_PAGES,
+        interval: float = INGESTION_INTERVAL,
+        priority: str = "ingestion",
+        nav_interval: float = NAV_REFRESH_INTERVAL,
+    ):
+        self.client = client or market_client
+        self.session_factory = session_factory
+        self.vs_currency = vs_currency
+        self.per_page = per_page
+        self.max_pages = max_pages
+        self.interval = interval
+        # rate limiter class for the upstream calls, see ratelimit.PRIORITIES
+        self.priority = priority
+        self.nav_interval = nav_interval
+        self.stats = IngestionStats()
+        self._listeners = []
+        self._task = None
+        self._nav_refreshed_at = None
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    async def ingest_page(self, page: int) -> int:
+        """
+        Fetch and store one page. Returns the number of coins the upstream returned.
+        """
+        items = await self.client.get_markets(
+            vs_currency=self.vs_currency, page=page, per_page=self.per_page, priority=self.priority
+        )
+        fetched_at = datetime.now(timezone.utc)
+        rows = [normalize_market_row(item, fetched_at) for item in items if item.get("id")]
+
+        started = time.perf_counter()
+        written = await asyncio.to_thread(write_price_rows, rows, self.session_factory)
+        latency = time.perf_counter() - started
+        self.stats.record_batch(written, latency)
+        logger.info(f"Ingested page {page}: {written} rows in {latency * 1000:.1f} ms")
+
+        for listener in self._listeners:
+            try:
+                result = listener(rows)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                logger.exception(f"Ingestion listener {listener!r} failed")
+        return len(items)
+
+    async def run_once(self) -> int:
+        """
+        Ingest pages until the upstream returns a short page or `max_pages` is reached.
+        """
+        started = time.perf_counter()
+        rows_before = self.stats.rows
+        page = 1
+        while not self.max_pages or page <= self.max_pages:
+            if await self.ingest_page(page) < self.per_page:
+                break
+            page += 1
+        await asyncio.to_thread(prune_candles, self.session_factory)
+        if self.nav_interval and (
+            self._nav_refreshed_at is None or time.monotonic() - self._nav_refreshed_at >= self.nav_interval
+        ):
+            users = await asyncio.to_thread(refresh_nav, self.session_factory)
+            self._nav_refreshed_at = time.monotonic()
+            logger.info(f"Refreshed NAV for {users} users")
+        self.stats.runs += 1
+        self.stats.last_run_rows = self.stats.rows - rows_before
+        self.stats.last_run_seconds = time.perf_counter() - started
+        logger.info(f"Ingestion run finished: {self.stats.as_dict()}")
+        return self.stats.last_run_rows
+
+    async def run_forever(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats.errors += 1
+                logger.exception("Ingestion run failed")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest CoinGecko market pages into the price table.")
+    parser.add_argument("--base-url", default=None, help="Upstream base URL, e.g. a local fake CoinGecko")
+    parser.add_argument("--interval", type=float, default=INGESTION_INTERVAL)
+    parser.add_argument("--per-page", type=int, default=INGESTION_PER_PAGE)
+    parser.add_argument("--max-pages", type=int, default=INGESTION_MAX_PAGES, help="0 pages through everything")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--priority", choices=list(PRIORITIES), default="ingestion",
+                        help="Rate limiter class; use backfill for one-off full sweeps")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    models.Base.metadata.create_all(bind=engine)
+    # bring an existing database up to the current models, as init_db does
+    migrated = run_migrations(engine)
+    if migrated:
+        logger.info(f"Migrated: {', '.join(migrated)}")
+
+    async def run():
+        async with MarketDataClient(base_url=args.base_url) as client:
+            worker = MarketIngestionWorker(
+                client=client, per_page=args.per_page, max_pages=args.max_pages, interval=args.interval,
+                priority=args.priority,
+            )
+            worker.add_listener(alert_listener)
+            if args.once:
+                await worker.run_once()
+            else:
+                await worker.run_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
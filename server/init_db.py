@@ -17,8 +17,12 @@
 
 # print("Database initialization complete.")
 import os
-from server.database import engine
-from server.models import Base
+from server.database import SessionLocal, engine
+from server.migrations import run_migrations
+from server.ledger import rebuild_positions
+from server.models import Base, Candle, LatestPrice, Position, Price, Transaction
+from server.prices import rebuild_latest_prices
+from server.rollups import backfill_candles
 
 # 如果需要重建表，可以设置环境变量 OVERWRITE_TABLES
 overwrite_tables = os.getenv("OVERWRITE_TABLES", "false").lower() == "true"
@@ -30,4 +34,20 @@ if overwrite_tables:
 print("Creating all tables...")
 Base.metadata.create_all(bind=engine)
 
+print("Migrating existing tables...")
+migrated = run_migrations(engine)
+if migrated:
+    print(f"Migrated: {', '.join(migrated)}")
+
+db = SessionLocal()
+try:
+    if db.query(LatestPrice).first() is None:
+        print(f"Rebuilt latest prices for {rebuild_latest_prices(db)} coins.")
+    if db.query(Candle).first() is None and db.query(Price).first() is not None:
+        print(f"Backfilled {backfill_candles(db)} candles from price history.")
+    if db.query(Position).first() is None and db.query(Transaction).first() is not None:
+        print(f"Rebuilt {rebuild_positions(db)} positions from transaction history.")
+finally:
+    db.close()
+
 print("Database initialization complete.")
@@ -0,0 +1,179 @@
+# server/ledger.py
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Lots and positions smaller than this are closed out, absorbing float dust
+QUANTITY_EPSILON = 1e-12
+
+
+class Book:
+    """
+    One user's holding of one coin as FIFO lots of [lot_id, tid, quantity, unit_cost, time_opened].
+
+    Buys open a lot whose unit cost includes the gas fee. Sells close the oldest lots
+    first and realize proceeds minus fee minus the cost of the lots closed; selling
+    more than is held only closes what is there.
+    """
+
+    def __init__(self, lots=(), quantity: float = 0.0, cost_basis: float = 0.0, realized_pnl: float = 0.0):
+        self.lots = deque(lots)
+        self.quantity = quantity
+        self.cost_basis = cost_basis
+        self.realized_pnl = realized_pnl
+
+    def apply(self, tid: int, position: float, ex_rate: float, gas_fee: float, at: datetime):
+        if position > 0:
+            cost = position * ex_rate + gas_fee
+            self.lots.append([None, tid, position, cost / position, at])
+            self.quantity += position
+            self.cost_basis += cost
+            return
+
+        remaining = -position
+        closed_cost = 0.0
+        while remaining > QUANTITY_EPSILON and self.lots:
+            lot = self.lots[0]
+            take = min(lot[2], remaining)
+            closed_cost += take * lot[3]
+            lot[2] -= take
+            remaining -= take
+            if lot[2] <= QUANTITY_EPSILON:
+                self.lots.popleft()
+        sold = -position - remaining
+        self.quantity -= sold
+        self.cost_basis -= closed_cost
+        self.realized_pnl += sold * ex_rate - gas_fee - closed_cost
+        if self.quantity <= QUANTITY_EPSILON:
+            self.quantity, self.cost_basis = 0.0, 0.0
+
+
+def _trade(transaction):
+    return (
+        transaction.tid,
+        float(transaction.position),
+        float(transaction.ex_rate or 0.0),
+        float(transaction.gas_fee or 0.0),
+        transaction.time_transaction,
+    )
+
+
+def apply_transactions(db: Session, transactions: list) -> int:
+    """
+    Fold recorded transactions, in order, into their positions and open lots, without
+    committing. Each (uid, cid) is loaded and written back once however many of its
+    transactions the batch holds. Cost is the transaction's ex_rate, so positions are
+    in units of its cid_target.
+    """
+    grouped = {}
+    for transaction in transactions:
+        if transaction.success and transaction.position:
+            grouped.setdefault((transaction.uid, transaction.cid), []).append(transaction)
+
+    now = datetime.now(timezone.utc)
+    for (uid, cid), trades in grouped.items():
+        position = db.get(models.Position, (uid, cid))
+        if position is None:
+            position = models.Position(uid=uid, cid=cid, quantity=0.0, cost_basis=0.0, realized_pnl=0.0)
+            db.add(position)
+        open_lots = db.query(models.PositionLot).filter(
+            models.PositionLot.uid == uid, models.PositionLot.cid == cid
+        ).order_by(models.PositionLot.lot_id).all()
+
+        book = Book(
+            [[lot.lot_id, lot.tid, lot.quantity, lot.unit_cost, lot.time_opened] for lot in open_lots],
+            position.quantity or 0.0, position.cost_basis or 0.0, position.realized_pnl or 0.0,
+        )
+        for transaction in trades:
+            book.apply(*_trade(transaction))
+
+        remaining = {lot[0]: lot[2] for lot in book.lots if lot[0] is not None}
+        for lot in open_lots:
+            if lot.lot_id in remaining:
+                lot.quantity = remaining[lot.lot_id]
+            else:
+                db.delete(lot)
+        new_lots = [
+            {"uid": uid, "cid": cid, "tid": tid, "quantity": quantity, "unit_cost": unit_cost, "time_opened": time_opened}
+            for lot_id, tid, quantity, unit_cost, time_opened in book.lots
+            if lot_id is None
+        ]
+        if new_lots:
+            db.execute(insert(models.PositionLot), new_lots)
+        position.quantity = book.quantity
+        position.cost_basis = book.cost_basis
+        position.realized_pnl = book.realized_pnl
+        position.time_updated = now
+    return sum(len(trades) for trades in grouped.values())
+
+
+def apply_transaction(db: Session, transaction: models.Transaction) -> int:
+    return apply_transactions(db, [transaction])
+
+
+def rebuild_positions(db: Session, uid: int = None) -> int:
+    """
+    Rebuild positions and lots from the full transaction history, for one user or everyone,
+    e.g. after back-dated transactions were imported. Commits. Returns the positions written.
+    """
+    for model in (models.Position, models.PositionLot):
+        query = db.query(model)
+        if uid is not None:
+            query = query.filter(model.uid == uid)
+        query.delete(synchronize_session=False)
+
+    query = db.query(models.Transaction).filter(
+        models.Transaction.success.is_(True), models.Transaction.position.isnot(None)
+    )
+    if uid is not None:
+        query = query.filter(models.Transaction.uid == uid)
+    books = {}
+    for transaction in query.order_by(models.Transaction.time_transaction, models.Transaction.tid).yield_per(10000):
+        if transaction.position:
+            books.setdefault((transaction.uid, transaction.cid), Book()).apply(*_trade(transaction))
+
+    now = datetime.now(timezone.utc)
+    positions, lots = [], []
+    for (book_uid, cid), book in books.items():
+        positions.append({
+            "uid": book_uid, "cid": cid, "quantity": book.quantity, "cost_basis": book.cost_basis,
+            "realized_pnl": book.realized_pnl, "time_updated": now,
+        })
+        lots.extend(
+            {"uid": book_uid, "cid": cid, "tid": tid, "quantity": quantity, "unit_cost": unit_cost, "time_opened": time_opened}
+            for _, tid, quantity, unit_cost, time_opened in book.lots
+        )
+    if positions:
+        db.execute(insert(models.Position), positions)
+    if lots:
+        db.execute(insert(models.PositionLot), lots)
+    db.commit()
+    return len(positions)
+
+
+def get_positions(db: Session, uid: int) -> list:
+    """
+    The user's positions with average cost and realized / unrealized PnL at the latest prices.
+    """
+    rows = db.query(models.Position, models.LatestPrice.current_price).outerjoin(
+        models.LatestPrice, models.LatestPrice.cid == models.Position.cid
+    ).filter(models.Position.uid == uid).order_by(models.Position.cid).all()
+    result = []
+    for position, price in rows:
+        quantity = position.quantity or 0.0
+        market_value = None if price is None else quantity * price
+        result.append({
+            "cid": position.cid,
+            "quantity": quantity,
+            "average_cost": position.cost_basis / quantity if quantity else None,
+            "cost_basis": position.cost_basis,
+            "realized_pnl": position.realized_pnl,
+            "price": price,
+            "market_value": market_value,
+            "unrealized_pnl": None if market_value is None else market_value - position.cost_basis,
+        })
+    return result
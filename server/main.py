@@ -1,34 +1,77 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, File, HTTPException, Request, Response, UploadFile, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from server import crud, schemas, auth, database
 from fastapi.security import OAuth2PasswordRequestForm
-from .database import get_db
-import requests
-from datetime import timedelta
-from tenacity import retry, stop_after_attempt, wait_exponential
+from .cache import MarketDataCache
+from .database import ReadSessionLocal, get_async_db, get_async_read_db, get_db, get_read_db
+from .ingestion import MarketIngestionWorker, alert_listener
+from .market_client import market_client
+from .pagination import DEFAULT_PAGE_SIZE, set_next_page_headers
+from .passwords import password_hasher
+from .prices import latest_prices
+from .ratelimit import upstream_limiter
+from .streaming import PRICE_STREAM_KEEPALIVE_SECONDS, parse_ids, price_hub
+from . import async_crud, exports, imports, indicators, ledger, models, nav, rollups, valuation
+from .downsample import lttb
+from datetime import datetime, timedelta, timezone
+
+# Run the market ingestion loop inside the API process. With several gunicorn
+# workers, leave this off and run `python -m server.ingestion` once instead.
+INGESTION_ENABLED = os.getenv("INGESTION_ENABLED", "false").lower() == "true"
+
+ingestion_worker = MarketIngestionWorker(client=market_client)
+ingestion_worker.add_listener(latest_prices.update)
+ingestion_worker.add_listener(alert_listener)
+ingestion_worker.add_listener(indicators.live_indicators.update)
+ingestion_worker.add_listener(price_hub.publish)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await market_client.start()
+    password_hasher.start()
+    if INGESTION_ENABLED:
+        ingestion_worker.start()
+    try:
+        yield
+    finally:
+        await ingestion_worker.stop()
+        await price_hub.stop()
+        await market_client.close()
+        password_hasher.close()
+        await database.async_engine.dispose()
+        await database.async_read_engine.dispose()
 
 # Instantiate FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # User Registration Route
 @app.post("/users/", response_model=schemas.UserOut)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """
-    Register a new user.
+    Register a new user. The password is hashed on the password hasher's executor.
     """
     # Check if user is already registered
-    db_user = crud.get_user_by_email(db, email=user.email)
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     # Create new user if not already registered
-    return crud.create_user(db=db, user=user)
+    hashed_password = await password_hasher.hash(user.password)
+    return await run_in_threadpool(crud.create_user, db=db, user=user, hashed_password=hashed_password)
 
 @app.post("/token", response_model=schemas.Token)
-def login_for_access_token(db: Session = Depends(database.get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(db: Session = Depends(database.get_db), form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Authenticate the user and return an access token.
     """
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+    user = await auth.authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,26 +98,51 @@ def read_admin_data(current_user: schemas.UserOut = Depends(auth.get_current_adm
     """
     return current_user
 
-from requests.exceptions import Timeout, RequestException
+@app.get("/admin/stats")
+def read_cache_stats(current_user: schemas.UserOut = Depends(auth.get_current_admin_user)):
+    """
+    Hit rates and sizes of this worker's in-process caches, password hasher load
+    and upstream rate limiter counters.
+    """
+    return {
+        "user_cache": auth.user_cache.stats(),
+        "market_cache": market_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "upstream_limiter": upstream_limiter.stats(),
+        "price_stream": price_hub.stats(),
+    }
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-def fetch_crypto_data(coin_id: str):
+@app.patch("/admin/users/{uid}", response_model=schemas.UserOut)
+def update_user(uid: int, user: schemas.UserUpdate, db: Session = Depends(get_db),
+                current_user: schemas.UserOut = Depends(auth.get_current_admin_user)):
+    """
+    Change a user's email, username or role. Their cached auth context is dropped on commit.
+    """
+    if user.email is not None:
+        existing = crud.get_user_by_email(db, email=user.email)
+        if existing is not None and existing.uid != uid:
+            raise HTTPException(status_code=400, detail="Email already registered")
+    db_user = crud.update_user(db, uid, user)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
 
-    url = f"https://api.coingecko.com/api/v3/coins/{coin_id}"
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()  # 如果返回错误的 HTTP 状态码则抛出异常
-        return response.json()
-    except Timeout:
-        raise HTTPException(
-            status_code=504,
-            detail=f"Request to CoinGecko timed out for coin_id: {coin_id}",
-        )
-    except RequestException as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to fetch data from CoinGecko for coin_id {coin_id}: {str(e)}",
-        )
+@app.post("/admin/users/{uid}/deactivate", response_model=schemas.UserOut)
+def deactivate_user(uid: int, db: Session = Depends(get_db),
+                    current_user: schemas.UserOut = Depends(auth.get_current_admin_user)):
+    """
+    Deactivate a user. Their cached auth context is dropped on commit.
+    """
+    db_user = crud.deactivate_user(db, uid)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
+
+async def fetch_crypto_data(coin_id: str):
+    """
+    Fetch coin details from CoinGecko through the shared pooled client.
+    """
+    return await market_client.get_coin(coin_id)
 
 
 import logging
@@ -83,12 +151,50 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def _parse_ttl_overrides(value: str) -> dict:
+    """
+    Parse per-coin TTLs given as "bitcoin=10,ethereum=15".
+    """
+    overrides = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        coin_id, _, ttl = item.partition("=")
+        overrides[coin_id.strip()] = float(ttl)
+    return overrides
+
+
+# Shared cache in front of fetch_crypto_data, one per worker process
+market_cache = MarketDataCache(
+    maxsize=int(os.getenv("MARKET_CACHE_MAXSIZE", "1024")),
+    ttl=float(os.getenv("MARKET_CACHE_TTL", "30")),
+    stale_ttl=float(os.getenv("MARKET_CACHE_STALE_TTL", "300")),
+    ttl_overrides=_parse_ttl_overrides(os.getenv("MARKET_CACHE_TTL_OVERRIDES", "")),
+)
+
+# Serve /crypto/{coin_id} from the ingested latest price while it is this recent
+LATEST_PRICE_MAX_AGE = float(os.getenv("LATEST_PRICE_MAX_AGE", "120"))
+
+PRICE_INFO_FIELDS = ["current_price", "market_cap", "market_cap_rank", "total_volume", "high_24h", "low_24h"]
+
+
+def _recent_latest_price(coin_id: str):
+    price = latest_prices.get(coin_id)
+    if price is None or price["time_stamp"] is None:
+        return None
+    age = datetime.now(timezone.utc).replace(tzinfo=None) - price["time_stamp"]
+    return price if age.total_seconds() <= LATEST_PRICE_MAX_AGE else None
+
 @app.get("/crypto/{coin_id}")
-def get_crypto_price(coin_id: str, db: Session = Depends(get_db)):
+async def get_crypto_price(coin_id: str, db: AsyncSession = Depends(get_async_read_db)):
+
+    await latest_prices.refresh_async(db)
+    latest = _recent_latest_price(coin_id)
+    if latest is not None:
+        return {"coin_id": coin_id, **{field: latest[field] for field in PRICE_INFO_FIELDS}}
 
     logger.info(f"Fetching data for coin_id: {coin_id}")
     try:
-        data = fetch_crypto_data(coin_id)
+        data = await market_cache.get(coin_id, lambda: fetch_crypto_data(coin_id))
         logger.info(f"Successfully fetched data for coin_id: {coin_id}")
     except HTTPException as e:
         logger.error(f"Error fetching data for coin_id {coin_id}: {e.detail}")
@@ -105,6 +211,190 @@ def get_crypto_price(coin_id: str, db: Session = Depends(get_db)):
     }
     return price_info
 
+@app.get("/prices/latest")
+async def get_latest_prices(ids: str = None, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Latest ingested price per coin, for a comma-separated list of ids or every coin.
+    """
+    await latest_prices.refresh_async(db)
+    if ids:
+        return latest_prices.get_many(cid.strip() for cid in ids.split(","))
+    return latest_prices.all()
+
+
+@app.websocket("/ws/prices")
+async def stream_prices_websocket(websocket: WebSocket, ids: str = None):
+    """
+    Push latest prices for `ids` (comma-separated, default every coin) as they change.
+    Clients may send {"subscribe": [...]} or {"unsubscribe": [...]} to change the set.
+    """
+    await websocket.accept()
+    try:
+        subscription = price_hub.subscribe(parse_ids(ids))
+    except (OverflowError, ValueError) as e:
+        await websocket.close(code=1013 if isinstance(e, OverflowError) else 1008, reason=str(e))
+        return
+
+    async def receive_updates():
+        try:
+            while True:
+                message = await websocket.receive_json()
+                try:
+                    price_hub.update(
+                        subscription,
+                        subscribe=message.get("subscribe") or (),
+                        unsubscribe=message.get("unsubscribe") or (),
+                    )
+                except (AttributeError, TypeError, ValueError) as e:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            subscription.close()
+
+    receiver = asyncio.create_task(receive_updates())
+    try:
+        while not subscription.closed:
+            message = await subscription.next_message(PRICE_STREAM_KEEPALIVE_SECONDS)
+            if message is not None:
+                await websocket.send_text(message)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        price_hub.unsubscribe(subscription)
+        receiver.cancel()
+
+@app.get("/stream/prices")
+async def stream_prices_sse(request: Request, ids: str = None):
+    """
+    Server-Sent Events version of /ws/prices.
+    """
+    try:
+        subscription = price_hub.subscribe(parse_ids(ids))
+    except OverflowError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                message = await subscription.next_message(PRICE_STREAM_KEEPALIVE_SECONDS)
+                yield f"data: {message}\n\n" if message is not None else ": keepalive\n\n"
+        finally:
+            price_hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/candles/{cid}")
+def get_candles(cid: str, start: datetime, end: datetime = None, max_points: int = 500, db: Session = Depends(get_read_db)):
+    """
+    OHLCV candles for a coin, at the finest stored resolution that fits `max_points`.
+    """
+    end = end or datetime.now(timezone.utc)
+    resolution, candles = rollups.get_candles(db, cid, start, end, max_points=max_points)
+    return {
+        "cid": cid,
+        "resolution": resolution,
+        "candles": [
+            {
+                "time": candle.bucket_start,
+                "open": candle.open,
+                "high": candle.high,
+                "low": candle.low,
+                "close": candle.close,
+                "volume": candle.volume,
+            }
+            for candle in candles
+        ],
+    }
+
+HISTORY_RANGES = {
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+    "1y": timedelta(days=365),
+    "max": None,
+}
+# Read this many candles per requested point so LTTB has shape to choose from
+HISTORY_OVERSAMPLE = 4
+
+
+def _stored_history(db: Session, cid: str, range: str, points: int):
+    end = datetime.now(timezone.utc).replace(tzinfo=None)
+    span = HISTORY_RANGES[range]
+    if span is None:
+        start = db.query(func.min(models.Candle.bucket_start)).filter(models.Candle.cid == cid).scalar()
+        if start is None:
+            return None, []
+    else:
+        start = end - span
+    resolution, candles = rollups.get_candles(db, cid, start, end, max_points=points * HISTORY_OVERSAMPLE)
+    return resolution, [
+        ((candle.bucket_start - datetime(1970, 1, 1)).total_seconds() * 1000, candle.close)
+        for candle in candles
+    ]
+
+@app.get("/history/{cid}")
+async def get_price_history(cid: str, range: str = "30d", points: int = 500, db: Session = Depends(get_read_db)):
+    """
+    Price history for the chart page, downsampled with LTTB to at most `points` points.
+    Served from the local candles, falling back to CoinGecko for coins not ingested yet.
+    """
+    if range not in HISTORY_RANGES:
+        raise HTTPException(status_code=400, detail=f"range must be one of {', '.join(HISTORY_RANGES)}")
+    points = max(3, min(points, 5000))
+    resolution, series = await run_in_threadpool(_stored_history, db, cid, range, points)
+    source = "local"
+    if len(series) < 2:
+        days = "max" if range == "max" else str(HISTORY_RANGES[range].days)
+        data = await market_cache.get(
+            f"market_chart:{cid}:{days}", lambda: market_client.get_market_chart(cid, days=days)
+        )
+        series = data.get("prices", [])
+        resolution, source = None, "coingecko"
+
+    if series:
+        times, prices = lttb([t for t, _ in series], [p for _, p in series], points)
+        series = [[int(t), p] for t, p in zip(times.tolist(), prices.tolist())]
+    return {"cid": cid, "range": range, "resolution": resolution, "source": source, "prices": series}
+
+
+@app.get("/indicators/{cid}")
+def get_indicators(cid: str, start: datetime, end: datetime = None, max_points: int = 500, db: Session = Depends(get_read_db)):
+    """
+    SMA, EMA, RSI, MACD, Bollinger bands and ATR over the coin's candles, aligned with `time`.
+    Extra bars before `start` are read so the first returned values are already warmed up.
+    """
+    end = end or datetime.now(timezone.utc)
+    resolution = rollups.pick_resolution(rollups.utc_naive(start), rollups.utc_naive(end), max_points)
+    warmup = timedelta(seconds=resolution * indicators.warmup_bars())
+    _, candles = rollups.get_candles(db, cid, start - warmup, end, resolution=resolution)
+    values = indicators.compute(
+        [candle.high for candle in candles], [candle.low for candle in candles], [candle.close for candle in candles]
+    )
+    first = rollups.bucket_start(start, resolution)
+    skip = next((i for i, candle in enumerate(candles) if candle.bucket_start >= first), len(candles))
+    return {
+        "cid": cid,
+        "resolution": resolution,
+        "time": [candle.bucket_start for candle in candles[skip:]],
+        **{name: indicators.to_json_list(series[skip:]) for name, series in values.items()},
+    }
+
+@app.get("/indicators/{cid}/latest")
+def get_latest_indicators(cid: str, db: Session = Depends(get_read_db)):
+    """
+    Indicator values including the bar still forming, kept current by in-process
+    ingestion or, when ingestion runs elsewhere, re-read from the stored candles.
+    """
+    if indicators.live_indicators.needs_seed(cid):
+        indicators.live_indicators.seed(db, cid)
+    latest = indicators.live_indicators.latest(cid)
+    if latest is None:
+        raise HTTPException(status_code=404, detail="No recent candles for this coin")
+    bar_start, values = latest
+    return {"cid": cid, "resolution": indicators.live_indicators.resolution, "time": bar_start, **values}
 
 
 # ---- Portfolio Routes ----
@@ -120,15 +410,53 @@ def add_to_portfolio(portfolio: schemas.PortfolioCreate, db: Session = Depends(g
     return crud.create_portfolio_entry(db=db, portfolio=portfolio)
 
 @app.get("/portfolio/{uid}")
-def get_user_portfolio(uid: int, db: Session = Depends(get_db)):
+async def get_user_portfolio(uid: int, request: Request, response: Response, cursor: str = None,
+                             limit: int = DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieve the portfolio for a user.
+    Retrieve the portfolio for a user, a page at a time; the next page's cursor is in `X-Next-Cursor`.
     """
-    portfolio = crud.get_portfolio_by_uid(db, uid=uid)
-    if not portfolio:
+    portfolio, next_cursor = await async_crud.get_portfolio_page(db, uid=uid, cursor=cursor, limit=limit)
+    if not portfolio and not cursor:
         raise HTTPException(status_code=404, detail="Portfolio not found")
+    set_next_page_headers(request, response, next_cursor)
     return portfolio
 
+@app.get("/portfolio/{uid}/valuation")
+def get_portfolio_valuation(uid: int, db: Session = Depends(get_db)):
+    """
+    The user's holdings valued at the latest ingested prices, with allocation weights.
+    """
+    result = valuation.value_portfolios(db, uids=[uid]).for_user(uid)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return result
+
+@app.get("/portfolio/{uid}/nav")
+def get_portfolio_nav(uid: int, start: datetime = None, end: datetime = None, db: Session = Depends(get_read_db)):
+    """
+    Daily portfolio value from the user's transactions priced at daily closes, as
+    materialized when transactions are written and by the ingestion worker.
+    """
+    return {
+        "uid": uid,
+        "nav": [{"day": row.day, "value": row.value} for row in nav.get_nav(db, uid, start=start, end=end)],
+    }
+
+@app.get("/positions/{uid}")
+def get_user_positions(uid: int, db: Session = Depends(get_db)):
+    """
+    Quantity, average cost and realized / unrealized PnL per coin, from the positions ledger.
+    """
+    return ledger.get_positions(db, uid)
+
+@app.get("/admin/valuation")
+def revalue_all_portfolios(top: int = 10, db: Session = Depends(get_read_db),
+                           current_user: schemas.UserOut = Depends(auth.get_current_admin_user)):
+    """
+    Revalue every user's portfolio in one pass and return the totals.
+    """
+    return valuation.value_portfolios(db).summary(top=top)
+
 # ---- Price Alert Routes ----
 
 #TODO: Fix the following routes
@@ -160,13 +488,15 @@ def add_wallet(wallet: schemas.WalletCreate, db: Session = Depends(get_db)):
     return crud.create_wallet(db=db, wallet=wallet)
 
 @app.get("/wallet/{uid}")
-def get_user_wallets(uid: int, db: Session = Depends(get_db)):
+async def get_user_wallets(uid: int, request: Request, response: Response, cursor: str = None,
+                           limit: int = DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieve all wallets for a specific user.
+    Retrieve the wallets for a specific user, a page at a time; the next page's cursor is in `X-Next-Cursor`.
     """
-    wallets = crud.get_wallets_by_uid(db, uid=uid)
-    if not wallets:
+    wallets, next_cursor = await async_crud.get_wallets_page(db, uid=uid, cursor=cursor, limit=limit)
+    if not wallets and not cursor:
         raise HTTPException(status_code=404, detail="No wallets found for this user")
+    set_next_page_headers(request, response, next_cursor)
     return wallets
 
 # ---- Transaction Routes ----
@@ -179,12 +509,48 @@ def create_transaction(transaction: schemas.TransactionCreate, db: Session = Dep
     """
     return crud.create_transaction(db=db, transaction=transaction)
 
+@app.post("/transaction/import/{uid}")
+def import_transactions(uid: int, file: UploadFile = File(...), format: str = None, db: Session = Depends(get_db)):
+    """
+    Bulk-import a CSV or JSONL trade history, skipping rows already imported.
+    """
+    format = format or imports.detect_format(file.filename)
+    if format not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail="format must be csv or jsonl")
+    report = imports.TransactionImporter(db, uid).run(file.file, format)
+    return report.as_dict()
+
+@app.get("/transaction/{uid}/export")
+def export_transactions(uid: int, format: str = "ndjson"):
+    """
+    Stream the user's entire transaction history as NDJSON or CSV.
+    """
+    if format not in exports.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    extension = "jsonl" if format == "ndjson" else "csv"
+    return StreamingResponse(
+        exports.iter_transactions(uid, format, session_factory=ReadSessionLocal),
+        media_type=exports.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="transactions-{uid}.{extension}"'},
+    )
+
 @app.get("/transaction/{uid}")
-def get_user_transactions(uid: int, db: Session = Depends(get_db)):
+async def get_user_transactions(uid: int, request: Request, response: Response, cid: str = None,
+                                start: datetime = None, end: datetime = None, order: str = "asc",
+                                cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                                db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieve all transactions for a user.
+    Retrieve a user's transactions by time, optionally for one coin and a [start, end) range,
+    a page at a time; the next page's cursor is in `X-Next-Cursor`.
     """
-    transactions = crud.get_transactions_by_uid(db, uid=uid)
-    if not transactions:
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    transactions, next_cursor = await async_crud.get_transactions_page(
+        db, uid=uid, cid=cid,
+        start=start and rollups.utc_naive(start), end=end and rollups.utc_naive(end),
+        cursor=cursor, limit=limit, descending=order == "desc",
+    )
+    if not transactions and not cursor:
         raise HTTPException(status_code=404, detail="No transactions found for this user")
+    set_next_page_headers(request, response, next_cursor)
     return transactions
@@ -0,0 +1,144 @@
+# server/market_client.py
+import asyncio
+import logging
+import os
+
+import httpx
+from fastapi import HTTPException
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+from .ratelimit import SharedTokenBucket, upstream_limiter
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_BASE_URL = os.getenv("COINGECKO_BASE_URL", "https://api.coingecko.com/api/v3")
+
+
+def _retry_after(response: httpx.Response) -> float:
+    try:
+        return float(response.headers.get("Retry-After", "60"))
+    except ValueError:
+        return 60.0
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """
+    Retry timeouts, connection errors, rate limiting and upstream 5xx responses only.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+class MarketDataClient:
+    """
+    Async CoinGecko client sharing one keep-alive connection pool per process.
+
+    The client only ever talks to `base_url`, so the pool limits are the per-host
+    connection limits. Point `base_url` at a local stand-in for tests and benchmarks.
+    Every attempt, retries included, first takes a token from `limiter` at the
+    call's priority class.
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        timeout: float = None,
+        connect_timeout: float = None,
+        max_connections: int = None,
+        max_keepalive_connections: int = None,
+        retry_attempts: int = None,
+        limiter: SharedTokenBucket = None,
+    ):
+        self.base_url = (base_url or COINGECKO_BASE_URL).rstrip("/")
+        self.timeout = httpx.Timeout(
+            timeout if timeout is not None else float(os.getenv("MARKET_CLIENT_TIMEOUT", "5")),
+            connect=connect_timeout if connect_timeout is not None else float(os.getenv("MARKET_CLIENT_CONNECT_TIMEOUT", "3")),
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections or int(os.getenv("MARKET_CLIENT_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=max_keepalive_connections or int(os.getenv("MARKET_CLIENT_MAX_KEEPALIVE", "10")),
+        )
+        self.retry_attempts = retry_attempts or int(os.getenv("MARKET_CLIENT_RETRY_ATTEMPTS", "3"))
+        self.limiter = limiter or upstream_limiter
+        self._client = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get_json(self, path: str, params: dict = None, priority: str = "interactive"):
+        """
+        GET `path` relative to the base URL, retrying transient failures with
+        exponential backoff that sleeps on the event loop instead of a worker thread.
+        A 429 empties the shared rate limiter for its Retry-After in every worker.
+        """
+        await self.start()
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(self.retry_attempts),
+                wait=wait_exponential(multiplier=1, min=2, max=10),
+                retry=retry_if_exception(_is_transient),
+                reraise=True,
+            ):
+                with attempt:
+                    await self.limiter.acquire(priority)
+                    response = await self._client.get(path, params=params)
+                    if response.status_code == 429:
+                        await asyncio.to_thread(self.limiter.backoff, _retry_after(response))
+                    response.raise_for_status()
+                    return response.json()
+        except httpx.TimeoutException:
+            raise HTTPException(
+                status_code=504,
+                detail=f"Request to CoinGecko timed out: {path}",
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                raise HTTPException(status_code=404, detail=f"Not found on CoinGecko: {path}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to fetch data from CoinGecko for {path}: {str(e)}",
+            )
+        except httpx.HTTPError as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to fetch data from CoinGecko for {path}: {str(e)}",
+            )
+
+    async def get_coin(self, coin_id: str, priority: str = "interactive"):
+        return await self.get_json(f"/coins/{coin_id}", priority=priority)
+
+    async def get_markets(self, vs_currency: str = "usd", page: int = 1, per_page: int = 250, ids: list = None,
+                          priority: str = "interactive"):
+        params = {"vs_currency": vs_currency, "page": page, "per_page": per_page}
+        if ids:
+            params["ids"] = ",".join(ids)
+        return await self.get_json("/coins/markets", params=params, priority=priority)
+
+    async def get_market_chart(self, coin_id: str, days: str = "14", vs_currency: str = "usd",
+                               priority: str = "interactive"):
+        return await self.get_json(
+            f"/coins/{coin_id}/market_chart", params={"vs_currency": vs_currency, "days": days}, priority=priority
+        )
+
+    async def get_simple_price(self, ids: list, vs_currency: str = "usd", priority: str = "interactive"):
+        return await self.get_json(
+            "/simple/price", params={"ids": ",".join(ids), "vs_currencies": vs_currency}, priority=priority
+        )
+
+
+# Process-wide client, opened and closed by the application lifespan
+market_client = MarketDataClient()
@@ -0,0 +1,138 @@
+# server/migrations.py
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.sql import sqltypes
+
+from .models import Base
+
+logger = logging.getLogger(__name__)
+
+_NUMERIC_TYPES = (sqltypes.Integer, sqltypes.Numeric)  # Float is a Numeric subclass
+
+
+def _string_to_numeric_columns(inspector, table) -> list:
+    """
+    Columns the model declares numeric but the existing database still stores as text.
+    """
+    existing = {col["name"]: col["type"] for col in inspector.get_columns(table.name)}
+    return [
+        column for column in table.columns
+        if column.name in existing
+        and isinstance(column.type, _NUMERIC_TYPES)
+        and isinstance(existing[column.name], sqltypes.String)
+    ]
+
+
+def _rebuild_sqlite_table(conn, table, numeric_columns):
+    """
+    SQLite cannot change a column's type, so recreate the table and copy the rows across.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    old_name = f"{table.name}__old"
+    conn.exec_driver_sql(f"ALTER TABLE {quote(table.name)} RENAME TO {quote(old_name)}")
+    # indexes keep their names when the table is renamed, drop them before recreating
+    index_names = conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (old_name,),
+    ).scalars().all()
+    for index_name in index_names:
+        conn.exec_driver_sql(f"DROP INDEX {quote(index_name)}")
+    table.create(conn)
+
+    old_columns = {col["name"] for col in inspect(conn).get_columns(old_name)}
+    numeric_names = {column.name for column in numeric_columns}
+    names, selects = [], []
+    for column in table.columns:
+        if column.name not in old_columns:
+            continue
+        names.append(quote(column.name))
+        if column.name in numeric_names:
+            target = "INTEGER" if isinstance(column.type, sqltypes.Integer) else "REAL"
+            selects.append(f"CAST(NULLIF(TRIM({quote(column.name)}), '') AS {target})")
+        else:
+            selects.append(quote(column.name))
+    conn.exec_driver_sql(
+        f"INSERT INTO {quote(table.name)} ({', '.join(names)}) "
+        f"SELECT {', '.join(selects)} FROM {quote(old_name)}"
+    )
+    conn.exec_driver_sql(f"DROP TABLE {quote(old_name)}")
+
+
+def _alter_column_types(conn, table, numeric_columns):
+    quote = conn.dialect.identifier_preparer.quote
+    for column in numeric_columns:
+        type_sql = column.type.compile(dialect=conn.dialect)
+        conn.exec_driver_sql(
+            f"ALTER TABLE {quote(table.name)} ALTER COLUMN {quote(column.name)} "
+            f"TYPE {type_sql} USING CAST(NULLIF(TRIM({quote(column.name)}), '') AS {type_sql})"
+        )
+
+
+def add_missing_columns(engine) -> list:
+    """
+    Add columns introduced by newer models to existing tables. Existing rows get NULL.
+    """
+    added = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        quote = conn.dialect.identifier_preparer.quote
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                type_sql = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {type_sql}")
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def create_missing_indexes(engine) -> list:
+    """
+    Create indexes declared on the models but missing from existing tables.
+    """
+    created = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    created.append(index.name)
+    return created
+
+
+def migrate_numeric_columns(engine) -> list:
+    """
+    Convert price, quantity and threshold columns created as text by older
+    versions of the schema to their numeric types, keeping existing rows.
+    """
+    migrated = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            numeric_columns = _string_to_numeric_columns(inspector, table)
+            if not numeric_columns:
+                continue
+            logger.info(f"Migrating {table.name}: {', '.join(c.name for c in numeric_columns)} to numeric")
+            if conn.dialect.name == "sqlite":
+                _rebuild_sqlite_table(conn, table, numeric_columns)
+            else:
+                _alter_column_types(conn, table, numeric_columns)
+            migrated.append(table.name)
+    return migrated
+
+
+def run_migrations(engine) -> list:
+    """
+    Bring an existing database up to date with the models, in place.
+    """
+    return add_missing_columns(engine) + migrate_numeric_columns(engine) + create_missing_indexes(engine)
@@ -17,11 +17,20 @@ Base = declarative_base()
 #     deactivated = Column(Boolean, default=False)
 #     time_registered = Column(TIMESTAMP)
 #     time_last_active = Column(TIMESTAMP)
-from sqlalchemy import Column, Integer, String, Boolean, TIMESTAMP
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Integer, BigInteger, Float, JSON, Numeric, String, Boolean, TIMESTAMP
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# Exact decimal storage for holdings and trade amounts, returned to Python as float
+Quantity = Numeric(38, 18, asdecimal=False)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -45,6 +54,7 @@ class AlertSubscription(Base):
     alert_type = Column(String)
     time_subscribed = Column(TIMESTAMP)
     subscription_active = Column(Boolean, default=False)
+    updated_at = Column(TIMESTAMP, default=_utcnow, onupdate=_utcnow, index=True)  # alert engines sync on it
 
 class Cryptocurrency(Base):
     __tablename__ = "cryptocurrency"
@@ -81,31 +91,72 @@ class Portfolio(Base):
     cid = Column(String, primary_key=True, index=True)
     asid = Column(Integer, index=True)
     time_created = Column(TIMESTAMP, nullable=True)
-    quantity = Column(String, nullable=True)
+    quantity = Column(Quantity, nullable=True)
 
 class Price(Base):
     __tablename__ = "price"
     
     pid = Column(Integer, primary_key=True, index=True)
     cid = Column(String, index=True)
-    current_price = Column(String)
-    market_cap = Column(Integer, nullable=True)
+    current_price = Column(Float)
+    market_cap = Column(BigInteger, nullable=True)
     market_cap_rank = Column(Integer, nullable=True)
-    total_volume = Column(Integer, nullable=True)
-    high_24h = Column(String, nullable=True)
-    low_24h = Column(String, nullable=True)
-    price_change_24h = Column(String, nullable=True)
-    price_change_percentage_24h = Column(String, nullable=True)
-    market_cap_change_24h = Column(Integer, nullable=True)
+    total_volume = Column(BigInteger, nullable=True)
+    high_24h = Column(Float, nullable=True)
+    low_24h = Column(Float, nullable=True)
+    price_change_24h = Column(Float, nullable=True)
+    price_change_percentage_24h = Column(Float, nullable=True)
+    market_cap_change_24h = Column(Float, nullable=True)
     time_stamp = Column(TIMESTAMP)
 
+class LatestPrice(Base):
+    __tablename__ = "latest_price"
+
+    cid = Column(String, primary_key=True)
+    current_price = Column(Float)
+    market_cap = Column(BigInteger, nullable=True)
+    market_cap_rank = Column(Integer, nullable=True)
+    total_volume = Column(BigInteger, nullable=True)
+    high_24h = Column(Float, nullable=True)
+    low_24h = Column(Float, nullable=True)
+    price_change_24h = Column(Float, nullable=True)
+    price_change_percentage_24h = Column(Float, nullable=True)
+    market_cap_change_24h = Column(Float, nullable=True)
+    time_stamp = Column(TIMESTAMP, index=True)
+    write_seq = Column(Integer, index=True)  # ingestion batch that last wrote the row
+
+class Candle(Base):
+    __tablename__ = "candle"
+
+    cid = Column(String, primary_key=True)
+    resolution = Column(Integer, primary_key=True)  # bucket width in seconds
+    bucket_start = Column(TIMESTAMP, primary_key=True)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    close_time = Column(TIMESTAMP, nullable=True)  # time of the tick that set `close`
+    volume = Column(Float, nullable=True)  # last 24h volume reported in the bucket
+    ticks = Column(Integer, default=0)
+
 class PriceAlertSubscription(Base):
     __tablename__ = "price_alert_subscription"
     
     pasid = Column(Integer, primary_key=True, index=True)
     asid = Column(Integer, index=True)
-    threshold = Column(String)  # existing absolute price threshold
-    threshold_percentage = Column(String)  # New field for percentage threshold
+    threshold = Column(Float)  # existing absolute price threshold
+    threshold_percentage = Column(Float)  # New field for percentage threshold
+    window_seconds = Column(Integer, default=3600)  # look-back window for threshold_percentage
+    updated_at = Column(TIMESTAMP, default=_utcnow, onupdate=_utcnow, index=True)
+
+class AlertTriggerState(Base):
+    __tablename__ = "alert_trigger_state"
+
+    asid = Column(Integer, primary_key=True)
+    alert_kind = Column(String, primary_key=True)  # "price" or "percent"
+    armed = Column(Boolean, default=True)
+    last_fired_price = Column(Float, nullable=True)
+    last_fired_at = Column(TIMESTAMP, nullable=True)
 
 class Transaction(Base):
     __tablename__ = "transaction"
@@ -115,12 +166,49 @@ class Transaction(Base):
     wid = Column(Integer, index=True)
     cid = Column(String, index=True)
     cid_target = Column(String, index=True)
-    ex_rate = Column(String)
-    position = Column(String)
+    ex_rate = Column(Quantity)
+    position = Column(Quantity)
     network = Column(String)
-    gas_fee = Column(String)
+    gas_fee = Column(Quantity)
     success = Column(Boolean)
     time_transaction = Column(TIMESTAMP)
+    idempotency_key = Column(String, nullable=True)  # set by bulk imports to skip rows seen before
+
+class Position(Base):
+    __tablename__ = "position"
+
+    uid = Column(Integer, primary_key=True)
+    cid = Column(String, primary_key=True)
+    quantity = Column(Quantity, default=0)  # sum of the open lots
+    cost_basis = Column(Quantity, default=0)  # cost of the open lots, in cid_target units
+    realized_pnl = Column(Quantity, default=0)
+    time_updated = Column(TIMESTAMP)
+
+class PositionLot(Base):
+    __tablename__ = "position_lot"
+
+    lot_id = Column(Integer, primary_key=True)
+    uid = Column(Integer)
+    cid = Column(String)
+    tid = Column(Integer)  # the buy that opened the lot
+    quantity = Column(Quantity)  # still open
+    unit_cost = Column(Quantity)
+    time_opened = Column(TIMESTAMP)
+
+class PortfolioSnapshot(Base):
+    __tablename__ = "portfolio_snapshot"
+
+    uid = Column(Integer, primary_key=True)
+    day = Column(TIMESTAMP, primary_key=True)  # holdings at the end of this UTC day
+    positions = Column(JSON)  # cid -> quantity
+    time_created = Column(TIMESTAMP)
+
+class PortfolioNav(Base):
+    __tablename__ = "portfolio_nav"
+
+    uid = Column(Integer, primary_key=True)
+    day = Column(TIMESTAMP, primary_key=True)
+    value = Column(Float)
 
 class Wallet(Base):
     __tablename__ = "wallet"
@@ -134,7 +222,10 @@ class Wallet(Base):
 
 Index('idx_alert_subscription_uid', AlertSubscription.uid, AlertSubscription.cid, AlertSubscription.alert_type)
 Index('idx_portfolio_uid_cid', Portfolio.uid, Portfolio.cid)
+Index('idx_position_lot_uid_cid', PositionLot.uid, PositionLot.cid, PositionLot.lot_id)
 Index('idx_price_alert_asid', PriceAlertSubscription.asid)
 Index('idx_price_cid_timestamp', Price.cid, Price.time_stamp)
 Index('idx_transaction_uid_cid_time', Transaction.uid, Transaction.cid, Transaction.time_transaction)
+Index('idx_transaction_uid_time', Transaction.uid, Transaction.time_transaction, Transaction.tid)
+Index('idx_transaction_uid_idempotency_key', Transaction.uid, Transaction.idempotency_key, unique=True)
 Index('idx_wallet_uid_address', Wallet.uid, Wallet.address)
\ No newline at end of file
@@ -0,0 +1,154 @@
+# server/nav.py
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from . import models, rollups
+
+# Store a holdings snapshot on every day whose epoch day number is a multiple of this
+NAV_SNAPSHOT_DAYS = int(os.getenv("NAV_SNAPSHOT_DAYS", "7"))
+
+DAY = timedelta(days=1)
+_EPOCH = datetime(1970, 1, 1)
+
+
+def day_start(value: datetime) -> datetime:
+    return rollups.bucket_start(value, 86400)
+
+
+def invalidate(db: Session, uid: int, since: datetime):
+    """
+    Drop the snapshots and NAV rows a transaction at `since` makes stale, without committing.
+    """
+    day = day_start(since)
+    for model in (models.PortfolioSnapshot, models.PortfolioNav):
+        db.query(model).filter(model.uid == uid, model.day >= day).delete(synchronize_session=False)
+
+
+def daily_closes(db: Session, cids: list, first_day: datetime, last_day: datetime) -> np.ndarray:
+    """
+    (days, len(cids)) daily closes, forward-filled from the last close before `first_day`.
+    NaN where a coin has no candle yet.
+    """
+    days = (last_day - first_day).days + 1
+    # row 0 holds the close carried in from before the range
+    closes = np.full((days + 1, len(cids)), np.nan)
+    if not cids:
+        return closes[1:]
+    column = {cid: i for i, cid in enumerate(cids)}
+    daily = models.Candle.resolution == 86400
+
+    carried = db.query(
+        models.Candle.cid, func.max(models.Candle.bucket_start).label("bucket_start")
+    ).filter(daily, models.Candle.cid.in_(cids), models.Candle.bucket_start < first_day).group_by(models.Candle.cid).subquery()
+    rows = db.query(models.Candle.cid, models.Candle.close).join(
+        carried, (models.Candle.cid == carried.c.cid) & (models.Candle.bucket_start == carried.c.bucket_start)
+    ).filter(daily).all()
+    for cid, close in rows:
+        closes[0, column[cid]] = close
+
+    rows = db.query(models.Candle.cid, models.Candle.bucket_start, models.Candle.close).filter(
+        daily, models.Candle.cid.in_(cids), models.Candle.bucket_start >= first_day, models.Candle.bucket_start <= last_day,
+    ).all()
+    for cid, bucket, close in rows:
+        closes[(bucket - first_day).days + 1, column[cid]] = close
+
+    # forward fill: index of the last row with a value, per column
+    filled = np.where(np.isnan(closes), 0, np.arange(days + 1)[:, None])
+    np.maximum.accumulate(filled, axis=0, out=filled)
+    return closes[filled, np.arange(len(cids))][1:]
+
+
+def replay(db: Session, uid: int, now: datetime = None) -> int:
+    """
+    Bring `portfolio_nav` for `uid` up to today by replaying successful transactions
+    from the last snapshot, storing new snapshots as it goes. Does not commit.
+    Returns the number of days replayed.
+    """
+    today = day_start(now or rollups.utcnow())
+    snapshot = db.query(models.PortfolioSnapshot).filter(
+        models.PortfolioSnapshot.uid == uid, models.PortfolioSnapshot.day < today
+    ).order_by(models.PortfolioSnapshot.day.desc()).first()
+
+    query = db.query(models.Transaction.cid, models.Transaction.position, models.Transaction.time_transaction).filter(
+        models.Transaction.uid == uid,
+        models.Transaction.success.is_(True),
+        models.Transaction.position.isnot(None),
+        models.Transaction.time_transaction < today + DAY,
+    )
+    if snapshot is not None:
+        holdings, first_day = dict(snapshot.positions or {}), snapshot.day + DAY
+        query = query.filter(models.Transaction.time_transaction >= first_day)
+    else:
+        holdings, first_day = {}, None
+    transactions = query.order_by(models.Transaction.time_transaction).all()
+    if first_day is None:
+        if not transactions:
+            return 0
+        first_day = day_start(transactions[0].time_transaction)
+
+    days = (today - first_day).days + 1
+    cids = sorted(set(holdings) | {transaction.cid for transaction in transactions})
+    column = {cid: i for i, cid in enumerate(cids)}
+    deltas = np.zeros((days, len(cids)))
+    if transactions:
+        np.add.at(
+            deltas,
+            (
+                np.array([(day_start(t.time_transaction) - first_day).days for t in transactions]),
+                np.array([column[t.cid] for t in transactions]),
+            ),
+            np.array([t.position for t in transactions], dtype=np.float64),
+        )
+    quantities = np.array([holdings.get(cid, 0.0) for cid in cids]) + np.cumsum(deltas, axis=0)
+    values = np.nansum(quantities * daily_closes(db, cids, first_day, today), axis=1)
+
+    day_list = [first_day + DAY * i for i in range(days)]
+    invalidate(db, uid, first_day)
+    db.execute(insert(models.PortfolioNav), [
+        {"uid": uid, "day": day, "value": value} for day, value in zip(day_list, values.tolist())
+    ])
+
+    created = rollups.utcnow()
+    snapshots = [
+        {
+            "uid": uid,
+            "day": day,
+            "positions": {cid: quantity for cid, quantity in zip(cids, quantities[i].tolist()) if quantity},
+            "time_created": created,
+        }
+        for i, day in enumerate(day_list)
+        if day < today and (day - _EPOCH).days % NAV_SNAPSHOT_DAYS == 0
+    ]
+    if snapshots:
+        db.execute(insert(models.PortfolioSnapshot), snapshots)
+    return days
+
+
+def refresh_all(db: Session, now: datetime = None) -> int:
+    """
+    Replay every user with transactions up to today, committing per user, so new days
+    get rows and today's value follows the daily close. Transactions and imports replay
+    their own user as they write; the ingestion worker runs this periodically.
+    Returns the number of users replayed.
+    """
+    uids = [uid for (uid,) in db.query(models.Transaction.uid).distinct()]
+    for uid in uids:
+        replay(db, uid, now=now)
+        db.commit()
+    return len(uids)
+
+
+def get_nav(db: Session, uid: int, start: datetime = None, end: datetime = None) -> list:
+    """
+    Daily portfolio value for `uid` as last materialized by `replay`. Read-only.
+    """
+    query = db.query(models.PortfolioNav).filter(models.PortfolioNav.uid == uid)
+    if start is not None:
+        query = query.filter(models.PortfolioNav.day >= day_start(start))
+    if end is not None:
+        query = query.filter(models.PortfolioNav.day <= rollups.utc_naive(end))
+    return query.order_by(models.PortfolioNav.day).all()
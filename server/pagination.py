@@ -0,0 +1,76 @@
+# server/pagination.py
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values: tuple) -> str:
+    payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: list) -> tuple:
+    """
+    The sort key a cursor points after, with values converted back to the columns' types.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return tuple(
+            datetime.fromisoformat(value) if value is not None and column.type.python_type is datetime else value
+            for column, value in zip(columns, values)
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _keyset(columns: list, cursor: str, descending: bool):
+    after = None
+    if cursor:
+        key = tuple_(*columns)
+        value = tuple_(*decode_cursor(cursor, columns))
+        after = key < value if descending else key > value
+    return after, [column.desc() if descending else column.asc() for column in columns]
+
+
+def _page(rows: list, columns: list, limit: int):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(tuple(getattr(last, column.key) for column in columns))
+
+
+async def keyset_page_async(db: AsyncSession, statement, columns: list, cursor: str = None,
+                            limit: int = DEFAULT_PAGE_SIZE, descending: bool = False):
+    """
+    One page of a `select()` of one entity ordered by `columns`, which must be unique together.
+
+    Returns (rows, next cursor or None). The cursor holds the last row's sort key, so the
+    next page is a range scan on the index that starts with those columns instead of an
+    OFFSET that reads and discards every earlier row.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after, order = _keyset(columns, cursor, descending)
+    if after is not None:
+        statement = statement.where(after)
+    rows = (await db.scalars(statement.order_by(*order).limit(limit + 1))).all()
+    return _page(list(rows), columns, limit)
+
+
+def set_next_page_headers(request: Request, response: Response, next_cursor: str):
+    """
+    Advertise the next page in `X-Next-Cursor` and an RFC 8288 `Link` header,
+    leaving the response body a plain list.
+    """
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
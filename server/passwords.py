@@ -0,0 +1,133 @@
+# server/passwords.py
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# New hashes use PASSWORD_SCHEME; hashes in the other scheme, or made with other
+# parameters, still verify and are replaced on the user's next login
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "bcrypt")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+# "thread" is enough for parallelism since bcrypt and argon2 release the GIL;
+# "process" isolates hashing from the API process entirely
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jobs queued or running before new ones are turned away with a 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+
+def make_context(scheme: str = None, bcrypt_rounds: int = None, argon2_time_cost: int = None,
+                 argon2_memory_cost: int = None, argon2_parallelism: int = None) -> CryptContext:
+    scheme = scheme or PASSWORD_SCHEME
+    return CryptContext(
+        schemes=[scheme] + [other for other in ("argon2", "bcrypt") if other != scheme],
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds or BCRYPT_ROUNDS,
+        argon2__time_cost=argon2_time_cost or ARGON2_TIME_COST,
+        argon2__memory_cost=argon2_memory_cost or ARGON2_MEMORY_COST,
+        argon2__parallelism=argon2_parallelism or ARGON2_PARALLELISM,
+    )
+
+
+pwd_context = make_context()
+
+
+# Module-level so process pool workers can run them against their own pwd_context
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a dedicated, bounded executor.
+
+    Keeps slow key derivation off the event loop and out of the threadpool that
+    sync routes share. At most `max_pending` jobs are queued or running; beyond
+    that callers get a 503 instead of waiting behind a login burst.
+    """
+
+    def __init__(self, executor: str = None, workers: int = None, max_pending: int = None):
+        self.executor_kind = executor or PASSWORD_HASH_EXECUTOR
+        if self.executor_kind not in ("thread", "process"):
+            raise ValueError(f"Unsupported password hash executor {self.executor_kind!r}, expected thread or process")
+        self.workers = workers or PASSWORD_HASH_WORKERS
+        self.max_pending = max_pending or PASSWORD_HASH_MAX_PENDING
+        self._executor = None
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def start(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many concurrent logins, retry shortly",
+                                headers={"Retry-After": "1"})
+        self.start()
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.seconds += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        hashed_password = await self._run(_hash, password)
+        self.hashed += 1
+        return hashed_password
+
+    async def verify_and_update(self, password: str, hashed_password: str):
+        """
+        Returns (valid, new hash or None). A new hash means the stored one used an
+        outdated scheme or work factor and should be replaced.
+        """
+        valid, new_hash = await self._run(_verify_and_update, password, hashed_password)
+        self.verified += 1
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        jobs = self.hashed + self.verified
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "scheme": pwd_context.default_scheme(),
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+            "avg_ms": 1000 * self.seconds / jobs if jobs else 0.0,
+        }
+
+
+# Shared by the async auth routes, one per worker process
+password_hasher = PasswordHasher()
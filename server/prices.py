@@ -0,0 +1,163 @@
+# server/prices.py
+import logging
+import os
+import time
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models, utils
+
+logger = logging.getLogger(__name__)
+
+LATEST_PRICE_REFRESH_SECONDS = float(os.getenv("LATEST_PRICE_REFRESH_SECONDS", "5"))
+
+# Columns served to clients; write_seq is bookkeeping for incremental readers
+LATEST_COLUMNS = [column.name for column in models.LatestPrice.__table__.columns if column.name != "write_seq"]
+
+
+def latest_rows(rows: list) -> list:
+    """
+    Keep only the newest row per cid from a batch of normalized price rows.
+    """
+    newest = {}
+    for row in rows:
+        current = newest.get(row["cid"])
+        if current is None or row["time_stamp"] >= current["time_stamp"]:
+            newest[row["cid"]] = row
+    return [{name: row.get(name) for name in LATEST_COLUMNS} for row in newest.values()]
+
+
+def next_write_seq(db: Session) -> int:
+    """
+    Sequence number for the next batch written to `latest_price`.
+
+    Readers use it as their watermark: unlike the upstream `last_updated`, which
+    differs per coin, it grows with every batch. Call it inside the writing
+    transaction; the single ingestion writer keeps it monotonic.
+    """
+    return (db.execute(select(func.max(models.LatestPrice.write_seq))).scalar() or 0) + 1
+
+
+def upsert_latest_prices(db: Session, rows: list, write_seq: int) -> int:
+    """
+    Write the newest price per coin into `latest_price`, tagged with `write_seq`, without committing.
+    """
+    rows = latest_rows(rows)
+    for row in rows:
+        row["write_seq"] = write_seq
+    return utils.upsert(db, models.LatestPrice, rows, ["cid"])
+
+
+def rebuild_latest_prices(db: Session) -> int:
+    """
+    Fill `latest_price` from the price history, e.g. for a database ingested before it existed.
+    """
+    newest = select(
+        models.Price.cid, func.max(models.Price.time_stamp).label("time_stamp")
+    ).group_by(models.Price.cid).subquery()
+    history_columns = [getattr(models.Price, name) for name in LATEST_COLUMNS]
+    rows = db.execute(
+        select(*history_columns).join(
+            newest, (models.Price.cid == newest.c.cid) & (models.Price.time_stamp == newest.c.time_stamp)
+        )
+    ).mappings().all()
+    db.query(models.LatestPrice).delete()
+    if rows:
+        rows = latest_rows([dict(row) for row in rows])
+        for row in rows:
+            row["write_seq"] = 1
+        db.execute(insert(models.LatestPrice), rows)
+    db.commit()
+    return len(rows)
+
+
+class LatestPriceIndex:
+    """
+    In-memory map of cid -> newest price row, fed directly by ingestion in the same
+    process and otherwise refreshed incrementally from `latest_price` every few seconds.
+
+    Refreshes read the rows whose `write_seq` is at least the highest one seen, and
+    pass them on to listeners, so other per-process consumers of `latest_price` share
+    this one watermark instead of keeping their own.
+    """
+
+    def __init__(self, refresh_seconds: float = LATEST_PRICE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._prices = {}
+        self._write_seq = None
+        self._refreshed_at = 0.0
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """
+        Call `listener(rows)` with the rows each refresh loads from `latest_price`.
+        """
+        self._listeners.append(listener)
+
+    def update(self, rows: list):
+        for row in latest_rows(rows):
+            current = self._prices.get(row["cid"])
+            if current is None or row["time_stamp"] >= current["time_stamp"]:
+                self._prices[row["cid"]] = row
+
+    def refresh(self, db: Session, force: bool = False) -> list:
+        """
+        Load the rows of `latest_price` written since the previous refresh and return them.
+        """
+        if not force and not self._stale():
+            return []
+        return self._load(db.execute(self._changed_rows()))
+
+    async def refresh_async(self, db: AsyncSession, force: bool = False) -> list:
+        """
+        refresh on an AsyncSession; touches the database only when a refresh is due.
+        """
+        if not force and not self._stale():
+            return []
+        return self._load(await db.execute(self._changed_rows()))
+
+    def _stale(self) -> bool:
+        return time.monotonic() - self._refreshed_at >= self.refresh_seconds
+
+    def _changed_rows(self):
+        statement = select(
+            *(getattr(models.LatestPrice, name) for name in LATEST_COLUMNS), models.LatestPrice.write_seq
+        )
+        if self._write_seq is not None:
+            # >= re-reads the newest batch, in case a writer was still committing it
+            statement = statement.where(models.LatestPrice.write_seq >= self._write_seq)
+        return statement
+
+    def _load(self, result) -> list:
+        rows = []
+        for price in result.mappings():
+            row = dict(price)
+            write_seq = row.pop("write_seq")
+            if write_seq is not None and (self._write_seq is None or write_seq > self._write_seq):
+                self._write_seq = write_seq
+            self._prices[row["cid"]] = row
+            rows.append(row)
+        self._refreshed_at = time.monotonic()
+        if rows:
+            for listener in self._listeners:
+                listener(rows)
+        return rows
+
+    def get(self, cid: str):
+        return self._prices.get(cid)
+
+    def get_many(self, cids) -> dict:
+        prices = self._prices
+        return {cid: prices[cid] for cid in cids if cid in prices}
+
+    def all(self) -> dict:
+        return dict(self._prices)
+
+    def __len__(self):
+        return len(self._prices)
+
+
+# Process-wide index used by the price, portfolio and alert paths
+latest_prices = LatestPriceIndex()
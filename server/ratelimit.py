@@ -0,0 +1,172 @@
+# server/ratelimit.py
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Upstream budget shared by every worker process on the host; 0 disables the limiter
+UPSTREAM_RATE_PER_MINUTE = float(os.getenv("UPSTREAM_RATE_PER_MINUTE", "30"))
+UPSTREAM_RATE_BURST = float(os.getenv("UPSTREAM_RATE_BURST", "10"))
+UPSTREAM_RATE_LIMIT_PATH = os.getenv(
+    "UPSTREAM_RATE_LIMIT_PATH", os.path.join(tempfile.gettempdir(), "cryptotracker-upstream-ratelimit.db")
+)
+
+# Priority class -> (share of the burst kept back for higher classes, longest wait in seconds).
+# Interactive calls may empty the bucket but give up quickly; backfill only runs while
+# the bucket is over half full and will wait for that.
+PRIORITIES = {
+    "interactive": (0.0, 2.0),
+    "ingestion": (0.3, 60.0),
+    "backfill": (0.5, 600.0),
+}
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state lives in a small SQLite file, so every worker process on
+    the host draws from one budget without an external service.
+
+    Each acquire refills and takes a token in one `BEGIN IMMEDIATE` transaction.
+    Lower priority classes leave a reserve in the bucket that only higher classes
+    may spend, so interactive requests win when the budget is contended. Counters
+    are per process. `clock` gives the wall-clock seconds the refill is computed from;
+    it must agree across processes sharing the file.
+    """
+
+    def __init__(self, name: str = "coingecko", rate_per_minute: float = None, burst: float = None, path: str = None,
+                 clock=time.time):
+        self.name = name
+        self.rate = (UPSTREAM_RATE_PER_MINUTE if rate_per_minute is None else rate_per_minute) / 60.0
+        self.capacity = max(1.0, UPSTREAM_RATE_BURST if burst is None else burst)
+        self.path = path or UPSTREAM_RATE_LIMIT_PATH
+        self.clock = clock
+        self._conn = None
+        self._lock = threading.Lock()
+        self.waiting = {priority: 0 for priority in PRIORITIES}
+        self.granted = {priority: 0 for priority in PRIORITIES}
+        self.queued = {priority: 0 for priority in PRIORITIES}
+        self.rejected = {priority: 0 for priority in PRIORITIES}
+        self.wait_seconds = {priority: 0.0 for priority in PRIORITIES}
+        self.backoffs = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS token_bucket (name TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            self._conn = conn
+        return self._conn
+
+    def _transact(self, fn):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = self.clock()
+                row = conn.execute("SELECT tokens, updated FROM token_bucket WHERE name = ?", (self.name,)).fetchone()
+                tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.rate)
+                tokens, result = fn(tokens)
+                conn.execute(
+                    "INSERT OR REPLACE INTO token_bucket (name, tokens, updated) VALUES (?, ?, ?)",
+                    (self.name, tokens, now),
+                )
+                conn.execute("COMMIT")
+                return result
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def try_acquire(self, priority: str = "interactive") -> float:
+        """
+        Take a token if the class may. Returns 0.0 on success, otherwise the seconds
+        until enough tokens will have refilled.
+        """
+        reserve = PRIORITIES[priority][0] * self.capacity
+
+        def take(tokens):
+            needed = 1.0 + reserve
+            if tokens >= needed:
+                return tokens - 1.0, 0.0
+            return tokens, (needed - tokens) / self.rate
+
+        return self._transact(take)
+
+    def tokens(self) -> float:
+        return self._transact(lambda tokens: (tokens, tokens))
+
+    def backoff(self, seconds: float):
+        """
+        Empty the bucket for `seconds` in every worker, e.g. after the upstream
+        answered 429 with Retry-After.
+        """
+        if self.enabled:
+            self.backoffs += 1
+            logger.warning(f"Upstream {self.name} asked us to back off for {seconds:.0f} s")
+            self._transact(lambda tokens: (min(tokens, -seconds * self.rate), None))
+
+    async def acquire(self, priority: str = "interactive"):
+        """
+        Wait for a token, up to the class's longest wait. Raises a 503 when the
+        budget stays exhausted for longer than that.
+        """
+        if not self.enabled:
+            return
+        max_wait = PRIORITIES[priority][1]
+        started = time.monotonic()
+        wait = await asyncio.to_thread(self.try_acquire, priority)
+        if wait:
+            self.queued[priority] += 1
+            self.waiting[priority] += 1
+            try:
+                while wait:
+                    remaining = max_wait - (time.monotonic() - started)
+                    if wait > remaining:
+                        self.rejected[priority] += 1
+                        raise HTTPException(status_code=503, detail="Upstream rate limit reached, retry shortly",
+                                            headers={"Retry-After": str(max(1, round(wait)))})
+                    await asyncio.sleep(wait)
+                    wait = await asyncio.to_thread(self.try_acquire, priority)
+            finally:
+                self.waiting[priority] -= 1
+                self.wait_seconds[priority] += time.monotonic() - started
+        self.granted[priority] += 1
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "rate_per_minute": self.rate * 60.0,
+            "burst": self.capacity,
+            "tokens": self.tokens() if self.enabled else None,
+            "backoffs": self.backoffs,
+            "priorities": {
+                priority: {
+                    "granted": self.granted[priority],
+                    "queued": self.queued[priority],
+                    "waiting": self.waiting[priority],
+                    "rejected": self.rejected[priority],
+                    "avg_wait_ms": 1000 * self.wait_seconds[priority] / self.queued[priority] if self.queued[priority] else 0.0,
+                }
+                for priority in PRIORITIES
+            },
+        }
+
+
+# Process-wide limiter in front of CoinGecko
+upstream_limiter = SharedTokenBucket()
@@ -0,0 +1,182 @@
+# server/rollups.py
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Candle widths in seconds and how long each is kept (None keeps forever)
+RESOLUTIONS = {
+    "1m": 60,
+    "5m": 300,
+    "1h": 3600,
+    "1d": 86400,
+}
+RETENTION = {
+    60: timedelta(days=2),
+    300: timedelta(days=14),
+    3600: timedelta(days=365),
+    86400: None,
+}
+
+
+def utcnow() -> datetime:
+    """
+    The current time as naive UTC, matching the TIMESTAMP columns.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def utc_naive(value: datetime) -> datetime:
+    # TIMESTAMP columns hold naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(time_stamp: datetime, resolution: int) -> datetime:
+    time_stamp = utc_naive(time_stamp)
+    epoch = int((time_stamp - datetime(1970, 1, 1)).total_seconds())
+    return datetime(1970, 1, 1) + timedelta(seconds=epoch - epoch % resolution)
+
+
+def aggregate_ticks(rows: list, resolutions=tuple(RESOLUTIONS.values())) -> list:
+    """
+    Fold normalized price rows into one partial candle per (cid, resolution, bucket).
+    """
+    candles = {}
+    for row in sorted(rows, key=lambda row: row["time_stamp"]):
+        price = row.get("current_price")
+        if price is None:
+            continue
+        time_stamp = utc_naive(row["time_stamp"])
+        for resolution in resolutions:
+            key = (row["cid"], resolution, bucket_start(row["time_stamp"], resolution))
+            candle = candles.get(key)
+            if candle is None:
+                candles[key] = {
+                    "cid": key[0],
+                    "resolution": resolution,
+                    "bucket_start": key[2],
+                    "open": price,
+                    "high": price,
+                    "low": price,
+                    "close": price,
+                    "close_time": time_stamp,
+                    "volume": row.get("total_volume"),
+                    "ticks": 1,
+                }
+            else:
+                candle["high"] = max(candle["high"], price)
+                candle["low"] = min(candle["low"], price)
+                candle["close"] = price
+                candle["close_time"] = time_stamp
+                candle["volume"] = row.get("total_volume")
+                candle["ticks"] += 1
+    return list(candles.values())
+
+
+def upsert_candles(db: Session, rows: list) -> int:
+    """
+    Merge a batch of ticks into the open candle of every resolution, without committing.
+    Existing buckets keep their open, widen high/low and take the batch close unless
+    they already hold a later one.
+    """
+    candles = aggregate_ticks(rows)
+    if not candles:
+        return 0
+    dialect = db.get_bind().dialect.name
+    table = models.Candle.__table__
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table)
+        greatest, least = func.greatest, func.least
+    else:
+        stmt = sqlite.insert(table)
+        # SQLite's two-argument max()/min() are scalar functions
+        greatest, least = func.max, func.min
+    # a batch that arrives late must not replace the close of a later tick
+    newer = or_(table.c.close_time.is_(None), stmt.excluded.close_time >= table.c.close_time)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["cid", "resolution", "bucket_start"],
+        set_={
+            "high": greatest(table.c.high, stmt.excluded.high),
+            "low": least(table.c.low, stmt.excluded.low),
+            "close": case((newer, stmt.excluded.close), else_=table.c.close),
+            "close_time": case((newer, stmt.excluded.close_time), else_=table.c.close_time),
+            "volume": case((newer, stmt.excluded.volume), else_=table.c.volume),
+            "ticks": table.c.ticks + stmt.excluded.ticks,
+        },
+    )
+    db.execute(stmt, candles)
+    return len(candles)
+
+
+def prune_candles(db: Session, now: datetime = None) -> int:
+    """
+    Delete candles older than their resolution's retention, without committing.
+    """
+    now = now or utcnow()
+    deleted = 0
+    for resolution, keep in RETENTION.items():
+        if keep is None:
+            continue
+        deleted += db.query(models.Candle).filter(
+            models.Candle.resolution == resolution,
+            models.Candle.bucket_start < now - keep,
+        ).delete(synchronize_session=False)
+    return deleted
+
+
+def pick_resolution(start: datetime, end: datetime, max_points: int, now: datetime = None) -> int:
+    """
+    The finest retained resolution whose bucket count over [start, end] fits `max_points`,
+    falling back to daily candles: a one-year range at 500 points reads ~365 daily rows.
+    """
+    now = now or utcnow()
+    span = (end - start).total_seconds()
+    for resolution in sorted(RETENTION):
+        keep = RETENTION[resolution]
+        if keep is not None and start < now - keep:
+            continue
+        if span / resolution <= max_points:
+            return resolution
+    return max(RETENTION)
+
+
+def get_candles(db: Session, cid: str, start: datetime, end: datetime, max_points: int = 500, resolution: int = None):
+    """
+    Return (resolution, candles) for `cid` between `start` and `end`.
+    """
+    start, end = utc_naive(start), utc_naive(end)
+    resolution = resolution or pick_resolution(start, end, max_points)
+    candles = db.query(models.Candle).filter(
+        models.Candle.cid == cid,
+        models.Candle.resolution == resolution,
+        models.Candle.bucket_start >= bucket_start(start, resolution),
+        models.Candle.bucket_start <= end,
+    ).order_by(models.Candle.bucket_start).all()
+    return resolution, candles
+
+
+def backfill_candles(db: Session, batch_size: int = 10000) -> int:
+    """
+    Build candles for every resolution from the stored price history.
+    """
+    db.query(models.Candle).delete(synchronize_session=False)
+    query = db.query(
+        models.Price.cid, models.Price.current_price, models.Price.total_volume, models.Price.time_stamp
+    ).filter(models.Price.time_stamp.isnot(None)).order_by(models.Price.time_stamp).yield_per(batch_size)
+    batch, total = [], 0
+    for cid, price, volume, time_stamp in query:
+        batch.append({"cid": cid, "current_price": price, "total_volume": volume, "time_stamp": time_stamp})
+        if len(batch) >= batch_size:
+            total += upsert_candles(db, batch)
+            batch = []
+    total += upsert_candles(db, batch)
+    db.commit()
+    return total
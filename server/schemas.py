@@ -44,15 +44,15 @@ class UserOut(BaseModel):
 class PriceOut(BaseModel):
     pid: int
     cid: str
-    current_price: str
+    current_price: float
     market_cap: Optional[int]
     market_cap_rank: Optional[int]
     total_volume: Optional[int]
-    high_24h: Optional[str]
-    low_24h: Optional[str]
-    price_change_24h: Optional[str]
-    price_change_percentage_24h: Optional[str]
-    market_cap_change_24h: Optional[int]
+    high_24h: Optional[float]
+    low_24h: Optional[float]
+    price_change_24h: Optional[float]
+    price_change_percentage_24h: Optional[float]
+    market_cap_change_24h: Optional[float]
     time_stamp: datetime
 
     class Config:
@@ -90,7 +90,8 @@ class AlertCreate(BaseModel):
     uid: int
     cid: str
     price_target: Optional[float] = 0.0
-    threshold_percentage: Optional[float] = 0.0
+    threshold_percentage: Optional[float] = 0.0  # percent move, e.g. 5 for ±5%
+    window_seconds: Optional[int] = 3600
 
 class AlertOut(AlertCreate):    
     aid: int
@@ -130,12 +131,25 @@ class TransactionCreate(BaseModel):
     cid: str
     cid_target: str
     ex_rate: float
-    position: str
+    position: float
     network: str
     gas_fee: Optional[float] = 0.0
     success: bool = False
     time_transaction: datetime
     
+class TransactionImport(BaseModel):
+    # One row of a CSV/JSONL history import; the uid comes from the request
+    wid: Optional[int] = None
+    cid: str
+    cid_target: str
+    ex_rate: float
+    position: float
+    network: Optional[str] = None
+    gas_fee: Optional[float] = 0.0
+    success: bool = True
+    time_transaction: datetime
+    idempotency_key: Optional[str] = None
+
 class TransactionUpdate(BaseModel):
     success: bool
     time_transaction: datetime
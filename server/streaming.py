@@ -0,0 +1,241 @@
+# server/streaming.py
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+
+from .database import AsyncReadSessionLocal
+from .prices import LatestPriceIndex, latest_prices, latest_rows
+
+logger = logging.getLogger(__name__)
+
+PRICE_STREAM_MAX_CLIENTS = int(os.getenv("PRICE_STREAM_MAX_CLIENTS", "10000"))
+PRICE_STREAM_MAX_IDS = int(os.getenv("PRICE_STREAM_MAX_IDS", "500"))
+# How often the hub refreshes the latest price index for ticks written by other processes
+PRICE_STREAM_POLL_SECONDS = float(os.getenv("PRICE_STREAM_POLL_SECONDS", "2"))
+PRICE_STREAM_KEEPALIVE_SECONDS = float(os.getenv("PRICE_STREAM_KEEPALIVE_SECONDS", "15"))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def parse_ids(ids: str):
+    """
+    A set of cids from "bitcoin,ethereum", or None for every coin.
+    """
+    if not ids or ids.strip() == "*":
+        return None
+    cids = {cid.strip() for cid in ids.split(",") if cid.strip()}
+    if len(cids) > PRICE_STREAM_MAX_IDS:
+        raise ValueError(f"At most {PRICE_STREAM_MAX_IDS} ids per subscription")
+    return cids
+
+
+class Subscription:
+    """
+    One connected client's pending ticks, at most one per coin.
+
+    A tick for a coin the client has not been sent yet replaces the older one,
+    so a slow consumer skips stale prices instead of growing a backlog; the
+    queue is bounded by the number of coins subscribed to.
+    """
+
+    def __init__(self, cids: set = None):
+        self.cids = cids
+        self.pending = {}  # cid -> encoded row
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def push(self, cid: str, encoded: str) -> bool:
+        """
+        Queue a tick; True when it replaced one the client had not received yet.
+        """
+        coalesced = cid in self.pending
+        self.pending[cid] = encoded
+        self._ready.set()
+        return coalesced
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def next_message(self, timeout: float = None):
+        """
+        Wait for ticks and return them as one JSON message, or None on timeout or close.
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        if self.closed or not self.pending:
+            return None
+        pending, self.pending = self.pending, {}
+        return '{"type":"prices","prices":{' + ",".join(
+            f"{json.dumps(cid)}:{encoded}" for cid, encoded in pending.items()
+        ) + "}}"
+
+
+class PriceHub:
+    """
+    In-process fan-out of latest prices to streaming clients.
+
+    Ticks arrive from the ingestion listener when ingestion runs in this process,
+    and otherwise from the latest price index, which one poller per process
+    refreshes only while clients are connected, so the cost upstream does not grow
+    with the number of clients. Each tick is JSON-encoded once and shared by every
+    subscriber.
+    """
+
+    def __init__(self, max_clients: int = PRICE_STREAM_MAX_CLIENTS, poll_seconds: float = PRICE_STREAM_POLL_SECONDS,
+                 session_factory=AsyncReadSessionLocal, index: LatestPriceIndex = latest_prices):
+        self.max_clients = max_clients
+        self.poll_seconds = poll_seconds
+        self.session_factory = session_factory
+        self.index = index
+        # rows any refresh of the index loads, including the routes' own, reach subscribers
+        index.add_listener(self.publish)
+        self._latest = {}  # cid -> (time_stamp, encoded row)
+        self._by_cid = {}  # cid -> set of subscriptions
+        self._all = set()  # subscriptions to every coin
+        self._clients = 0
+        self._poller = None
+        self.published = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.polls = 0
+        self.rejected = 0
+
+    @property
+    def clients(self) -> int:
+        return self._clients
+
+    def subscribe(self, cids: set = None) -> Subscription:
+        """
+        Register a client and queue the current price of every coin it asked for.
+        Raises OverflowError when the hub is full.
+        """
+        if self._clients >= self.max_clients:
+            self.rejected += 1
+            raise OverflowError("Too many streaming clients")
+        subscription = Subscription(cids)
+        self._clients += 1
+        self._add(subscription, cids)
+        self._ensure_poller()
+        return subscription
+
+    def update(self, subscription: Subscription, subscribe: set = (), unsubscribe: set = ()):
+        if subscription.cids is None:
+            return
+        unsubscribe = set(unsubscribe) - set(subscribe)
+        if len(subscription.cids | set(subscribe)) > PRICE_STREAM_MAX_IDS:
+            raise ValueError(f"At most {PRICE_STREAM_MAX_IDS} ids per subscription")
+        for cid in unsubscribe & subscription.cids:
+            self._by_cid[cid].discard(subscription)
+            if not self._by_cid[cid]:
+                del self._by_cid[cid]
+            subscription.pending.pop(cid, None)
+        subscription.cids -= unsubscribe
+        added = set(subscribe) - subscription.cids
+        subscription.cids |= added
+        self._add(subscription, added)
+
+    def _add(self, subscription: Subscription, cids):
+        if cids is None:
+            self._all.add(subscription)
+            cids = self._latest
+        else:
+            for cid in cids:
+                self._by_cid.setdefault(cid, set()).add(subscription)
+        for cid in cids:
+            latest = self._latest.get(cid)
+            if latest is not None:
+                subscription.push(cid, latest[1])
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        if subscription in self._all:
+            self._all.discard(subscription)
+        else:
+            for cid in subscription.cids:
+                subscribers = self._by_cid.get(cid)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_cid[cid]
+        self._clients -= 1
+
+    def publish(self, rows: list) -> int:
+        """
+        Fan normalized price rows out to subscribers. Rows no newer than the last
+        published tick for their coin are dropped. Returns the ticks published.
+        """
+        published = 0
+        for row in latest_rows(rows):
+            cid, time_stamp = row["cid"], row["time_stamp"]
+            latest = self._latest.get(cid)
+            if latest is not None and time_stamp is not None and latest[0] is not None and time_stamp <= latest[0]:
+                continue
+            encoded = json.dumps(row, default=_json_default)
+            self._latest[cid] = (time_stamp, encoded)
+            published += 1
+            for subscribers in (self._by_cid.get(cid, ()), self._all):
+                for subscription in subscribers:
+                    self.coalesced += subscription.push(cid, encoded)
+                    self.delivered += 1
+        self.published += published
+        return published
+
+    async def poll_once(self) -> int:
+        """
+        Refresh the index; the rows it loads are published through its listener.
+        """
+        async with self.session_factory() as db:
+            rows = await self.index.refresh_async(db, force=True)
+        self.polls += 1
+        return len(rows)
+
+    async def _poll_forever(self):
+        while self._clients:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Price stream poll failed")
+            await asyncio.sleep(self.poll_seconds)
+        self._poller = None
+
+    def _ensure_poller(self):
+        if self._poller is None and self.poll_seconds > 0:
+            self._poller = asyncio.ensure_future(self._poll_forever())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+
+    def stats(self) -> dict:
+        return {
+            "clients": self._clients,
+            "max_clients": self.max_clients,
+            "coins": len(self._latest),
+            "published": self.published,
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "polls": self.polls,
+            "rejected": self.rejected,
+            "polling": self._poller is not None,
+        }
+
+
+# Process-wide hub behind /ws/prices and /stream/prices
+price_hub = PriceHub()
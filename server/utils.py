@@ -1,10 +1,11 @@
-from passlib.context import CryptContext
+from sqlalchemy.dialects import postgresql, sqlite
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .passwords import pwd_context
 
 def get_password_hash(password: str) -> str:
     """
-    Hash the password using bcrypt.
+    Hash the password with the configured scheme. Blocks; async routes use
+    passwords.password_hasher instead.
     """
     return pwd_context.hash(password)
 
@@ -13,3 +14,26 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Verify a plain password against the hashed password.
     """
     return pwd_context.verify(plain_password, hashed_password)
+
+def upsert(db, model, rows: list, index_elements: list) -> int:
+    """
+    Insert rows, updating the non-key columns of rows whose key already exists.
+    """
+    if not rows:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = dialect_insert(model)
+        update_columns = {
+            name: stmt.excluded[name] for name in rows[0] if name not in index_elements
+        }
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=update_columns)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+        db.execute(stmt, rows)
+    else:
+        for row in rows:
+            db.merge(model(**row))
+    return len(rows)
@@ -0,0 +1,125 @@
+# server/valuation.py
+import argparse
+import logging
+import time
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioValuation:
+    """
+    Every position of the selected users priced at the latest ingested price.
+
+    Position arrays are sorted by uid; `user_ids[i]` owns positions
+    `offsets[i]:offsets[i + 1]` and their total is `totals[i]`. Positions in coins
+    without a latest price count as zero and are reported as unpriced.
+    """
+
+    def __init__(self, uids, cids, quantities, prices):
+        order = np.argsort(uids, kind="stable")
+        self.uids = uids[order]
+        self.cids = cids[order]
+        self.quantities = quantities[order]
+        self.prices = prices[order]
+        self.priced = ~np.isnan(self.prices)
+        self.values = np.where(self.priced, self.quantities * np.nan_to_num(self.prices), 0.0)
+
+        self.user_ids, starts, inverse = np.unique(self.uids, return_index=True, return_inverse=True)
+        self.offsets = np.append(starts, len(self.uids))
+        self.totals = np.bincount(inverse, weights=self.values, minlength=len(self.user_ids))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.weights = np.where(self.totals[inverse] > 0, self.values / self.totals[inverse], 0.0)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def for_user(self, uid: int):
+        """
+        Totals and per-coin allocation for one user, or None if they hold nothing.
+        """
+        i = np.searchsorted(self.user_ids, uid)
+        if i == len(self.user_ids) or self.user_ids[i] != uid:
+            return None
+        rows = slice(self.offsets[i], self.offsets[i + 1])
+        return {
+            "uid": uid,
+            "total_value": float(self.totals[i]),
+            "positions": [
+                {"cid": cid, "quantity": quantity, "price": price if priced else None, "value": value, "weight": weight}
+                for cid, quantity, price, priced, value, weight in zip(
+                    self.cids[rows].tolist(),
+                    self.quantities[rows].tolist(),
+                    self.prices[rows].tolist(),
+                    self.priced[rows].tolist(),
+                    self.values[rows].tolist(),
+                    self.weights[rows].tolist(),
+                )
+            ],
+        }
+
+    def summary(self, top: int = 10) -> dict:
+        leaders = np.argsort(self.totals)[::-1][:top]
+        return {
+            "users": len(self.user_ids),
+            "positions": len(self.uids),
+            "unpriced_positions": int((~self.priced).sum()),
+            "total_value": float(self.totals.sum()),
+            "top_users": [
+                {"uid": int(self.user_ids[i]), "total_value": float(self.totals[i])} for i in leaders
+            ],
+        }
+
+
+def value_portfolios(db: Session, uids=None) -> PortfolioValuation:
+    """
+    Value the portfolios of `uids`, or of every user, at the prices in `latest_price`.
+
+    Positions are read through the Core connection, skipping ORM row loading, and
+    matched to prices with a dict lookup rather than a join per row.
+    """
+    query = select(models.Portfolio.uid, models.Portfolio.cid, models.Portfolio.quantity)
+    prices_query = select(models.LatestPrice.cid, models.LatestPrice.current_price)
+    if uids is not None:
+        query = query.where(models.Portfolio.uid.in_(list(uids)))
+        prices_query = prices_query.where(
+            models.LatestPrice.cid.in_(query.with_only_columns(models.Portfolio.cid).scalar_subquery())
+        )
+    connection = db.connection()
+    prices = dict(connection.execute(prices_query).all())
+    rows = connection.execute(query).all()
+    uid_column, cid_column, quantity_column = zip(*rows) if rows else ((), (), ())
+    count = len(rows)
+    return PortfolioValuation(
+        np.fromiter(uid_column, dtype=np.int64, count=count),
+        np.array(cid_column, dtype=object),
+        np.fromiter((quantity or 0.0 for quantity in quantity_column), dtype=np.float64, count=count),
+        np.fromiter((np.nan if price is None else price for price in map(prices.get, cid_column)), dtype=np.float64, count=count),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Revalue every portfolio at the latest ingested prices.")
+    parser.add_argument("--top", type=int, default=10, help="Largest portfolios to print")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        valuation = value_portfolios(db)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    logger.info(f"Valued {len(valuation)} portfolios in {elapsed:.2f} s")
+    logger.info(valuation.summary(top=args.top))
+
+
+if __name__ == "__main__":
+    main()
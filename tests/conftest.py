@@ -0,0 +1,39 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The repository root holds the server package; plain `pytest` does not put it on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the module-level engines at a scratch database before server is imported
+_scratch = tempfile.mkdtemp(prefix="cryptotracker-tests-")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite:///{os.path.join(_scratch, 'app.db')}")
+os.environ.setdefault("UPSTREAM_RATE_LIMIT_PATH", os.path.join(_scratch, "ratelimit.db"))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from server import models  # noqa: E402
+from server.database import make_engine  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    db = session_factory()
+    yield db
+    db.close()
@@ -0,0 +1,187 @@
+# tests/test_alerts.py
+from datetime import timedelta
+
+from server import crud, models, schemas
+from server.alerts import PercentMoveAlertEngine, PriceAlertEngine, _ThresholdBook
+
+
+def test_threshold_book_stays_sorted_and_removes_the_right_alert():
+    book = _ThresholdBook()
+    for threshold, asid in [(30.0, 1), (10.0, 2), (20.0, 3), (20.0, 4)]:
+        book.insert(threshold, asid)
+
+    assert book.thresholds == [10.0, 20.0, 20.0, 30.0]
+    assert book.asids == [2, 3, 4, 1]
+    assert book.remove(20.0, 4)
+    assert not book.remove(20.0, 4)
+    assert book.thresholds == [10.0, 20.0, 30.0]
+    assert book.asids == [2, 3, 1]
+
+
+def test_only_alerts_whose_band_the_price_entered_fire():
+    engine = PriceAlertEngine(band=0.1, cooldown=0)
+    engine.load([(1, 7, "bitcoin", 100.0), (2, 8, "bitcoin", 200.0), (3, 9, "ethereum", 100.0)])
+
+    assert engine.on_tick("bitcoin", 150.0, 0) == []
+    assert engine.on_tick("bitcoin", 105.0, 1) == [(1, 7)]
+    assert engine.on_tick("bitcoin", 185.0, 2) == [(2, 8)]
+
+
+def test_an_alert_fires_once_per_crossing():
+    engine = PriceAlertEngine(band=0.1, rearm_band=0.5, cooldown=0)
+    engine.add(1, 7, "bitcoin", 100.0)
+    engine.on_tick("bitcoin", 150.0, 0)
+
+    assert engine.on_tick("bitcoin", 100.0, 1) == [(1, 7)]
+    # still in band, and then out of the band but inside the 15% re-arm band: no repeat
+    assert engine.on_tick("bitcoin", 95.0, 2) == []
+    assert engine.on_tick("bitcoin", 112.0, 3) == []
+    assert engine.on_tick("bitcoin", 100.0, 4) == []
+    # past the re-arm band, then back in: fires again
+    assert engine.on_tick("bitcoin", 130.0, 5) == []
+    assert engine.on_tick("bitcoin", 101.0, 6) == [(1, 7)]
+
+
+def test_cooldown_holds_back_a_re_armed_alert():
+    engine = PriceAlertEngine(band=0.1, rearm_band=0.5, cooldown=60)
+    engine.add(1, 7, "bitcoin", 100.0)
+    engine.on_tick("bitcoin", 150.0, 0)
+
+    assert engine.on_tick("bitcoin", 100.0, 10) == [(1, 7)]
+    engine.on_tick("bitcoin", 130.0, 20)
+    assert engine.on_tick("bitcoin", 100.0, 30) == []
+    engine.on_tick("bitcoin", 130.0, 80)
+    assert engine.on_tick("bitcoin", 100.0, 90) == [(1, 7)]
+
+
+def create_alert(db, uid, cid, price_target=0.0, threshold_percentage=0.0):
+    return crud.create_alert_subscription(db, schemas.AlertCreate(
+        uid=uid, cid=cid, price_target=price_target, threshold_percentage=threshold_percentage,
+    ))
+
+
+def test_sync_follows_creation_deactivation_and_reactivation(db):
+    engine = PriceAlertEngine()
+    first = create_alert(db, 1, "bitcoin", price_target=100.0)
+    engine.sync(db)
+    assert len(engine) == 1
+
+    second = create_alert(db, 2, "bitcoin", price_target=200.0)
+    first.subscription_active = False
+    db.commit()
+    engine.sync(db)
+    assert set(engine._alerts) == {second.asid}
+
+    first.subscription_active = True
+    db.commit()
+    engine.sync(db)
+    assert set(engine._alerts) == {first.asid, second.asid}
+
+
+def test_a_reactivated_alert_comes_back_armed_after_a_restart(db):
+    def check(engine, price):
+        return crud.check_price_targets(db, [("bitcoin", price, 0)], engine, PercentMoveAlertEngine(cooldown=0))
+
+    engine = PriceAlertEngine(band=0.1, cooldown=0)
+    alert = create_alert(db, 1, "bitcoin", price_target=100.0)
+    check(engine, 150.0)
+    assert check(engine, 100.0) == 1
+    assert not db.query(models.AlertTriggerState).one().armed
+
+    alert.subscription_active = False
+    db.commit()
+    check(engine, 100.0)
+    assert db.query(models.AlertTriggerState).count() == 0
+
+    alert.subscription_active = True
+    db.commit()
+    restarted = PriceAlertEngine(band=0.1, cooldown=0)
+    assert check(restarted, 100.0) == 1
+
+
+def test_sync_picks_up_a_subscription_committed_after_a_newer_one(db):
+    engine = PriceAlertEngine()
+    newer = create_alert(db, 1, "bitcoin", price_target=100.0)
+    engine.sync(db)
+
+    # committed late by a slower transaction that stamped it before `newer`
+    late = create_alert(db, 2, "bitcoin", price_target=150.0)
+    stamped = newer.updated_at - timedelta(seconds=5)
+    db.query(models.AlertSubscription).filter_by(asid=late.asid).update({"updated_at": stamped})
+    db.query(models.PriceAlertSubscription).filter_by(asid=late.asid).update({"updated_at": stamped})
+    db.commit()
+    engine.sync(db)
+
+    assert set(engine._alerts) == {newer.asid, late.asid}
+
+
+def test_threshold_change_replaces_the_alert(db):
+    engine = PriceAlertEngine()
+    alert = create_alert(db, 1, "bitcoin", price_target=100.0)
+    engine.sync(db)
+
+    detail = db.query(models.PriceAlertSubscription).filter_by(asid=alert.asid).one()
+    detail.threshold = 120.0
+    db.commit()
+    engine.sync(db)
+
+    assert engine._alerts[alert.asid] == ("bitcoin", 120.0, 1)
+    assert engine._books["bitcoin"].thresholds == [120.0]
+
+
+def fired_asids(fired):
+    return [(asid, uid) for asid, uid, _ in fired]
+
+
+def test_percent_alert_fires_once_and_re_arms_below_the_re_arm_margin():
+    engine = PercentMoveAlertEngine(rearm_band=0.05, cooldown=0)
+    engine.add(1, 7, "bitcoin", 5.0, window=60)
+
+    assert engine.on_tick("bitcoin", 100.0, 0) == []
+    assert engine.on_tick("bitcoin", 103.0, 10) == []
+    assert fired_asids(engine.on_tick("bitcoin", 105.5, 20)) == [(1, 7)]
+    assert engine.on_tick("bitcoin", 106.0, 30) == []
+    # 4.9% is still within the 5% re-arm margin of the 5% threshold
+    assert engine.on_tick("bitcoin", 104.9, 40) == []
+    assert engine.on_tick("bitcoin", 105.5, 45) == []
+    assert engine.on_tick("bitcoin", 104.0, 50) == []
+    assert fired_asids(engine.on_tick("bitcoin", 105.5, 55)) == [(1, 7)]
+
+
+def test_percent_alert_window_drops_old_ticks():
+    engine = PercentMoveAlertEngine(rearm_band=0.05, cooldown=0)
+    engine.add(1, 7, "bitcoin", 5.0, window=60)
+    engine.on_tick("bitcoin", 100.0, 0)
+    assert fired_asids(engine.on_tick("bitcoin", 106.0, 30)) == [(1, 7)]
+
+    # the 100 low has left the window, so the move shrinks to nothing and the alert re-arms
+    assert engine.on_tick("bitcoin", 106.0, 200) == []
+    moves = engine.on_tick("bitcoin", 100.0, 220)
+    assert fired_asids(moves) == [(1, 7)]
+    assert moves[0][2] < 0
+
+
+def test_percent_alert_cooldown():
+    engine = PercentMoveAlertEngine(rearm_band=0.05, cooldown=100)
+    engine.add(1, 7, "bitcoin", 5.0, window=60)
+    engine.on_tick("bitcoin", 100.0, 0)
+
+    assert fired_asids(engine.on_tick("bitcoin", 105.5, 20)) == [(1, 7)]
+    engine.on_tick("bitcoin", 104.0, 50)
+    assert engine.on_tick("bitcoin", 105.5, 55) == []
+
+
+def test_percent_sync_loads_only_percentage_alerts_and_follows_window_changes(db):
+    engine = PercentMoveAlertEngine()
+    create_alert(db, 1, "bitcoin", price_target=100.0)
+    alert = create_alert(db, 2, "bitcoin", threshold_percentage=5.0)
+    engine.sync(db)
+    assert set(engine._alerts) == {alert.asid}
+
+    detail = db.query(models.PriceAlertSubscription).filter_by(asid=alert.asid).one()
+    detail.window_seconds = 600
+    db.commit()
+    engine.sync(db)
+
+    assert engine._alerts[alert.asid] == ("bitcoin", 600, 5.0, 2)
+    assert set(engine._windows) == {("bitcoin", 600)}
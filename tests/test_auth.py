@@ -0,0 +1,59 @@
+# tests/test_auth.py
+import pytest
+from fastapi.testclient import TestClient
+
+from server import auth, crud, main, schemas
+from server.database import get_db
+
+
+@pytest.fixture
+def client(session_factory):
+    def db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    auth.user_cache.clear()
+    main.app.dependency_overrides[get_db] = db
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+    auth.user_cache.clear()
+
+
+def register(db, email, role="user"):
+    user = crud.create_user(db, schemas.UserCreate(email=email, password="unused", role=role), hashed_password="x")
+    token = auth.create_access_token({"sub": email})
+    return user, {"Authorization": f"Bearer {token}"}
+
+
+def test_role_change_takes_effect_before_the_cache_ttl(client, db):
+    _, admin = register(db, "admin@example.com", role="admin")
+    user, headers = register(db, "user@example.com")
+    assert client.get("/admin", headers=headers).status_code == 403  # caches the user
+
+    response = client.patch(f"/admin/users/{user.uid}", json={"role": "admin"}, headers=admin)
+
+    assert response.status_code == 200
+    assert client.get("/admin", headers=headers).status_code == 200
+
+
+def test_deactivation_drops_the_cached_user(client, db):
+    _, admin = register(db, "admin@example.com", role="admin")
+    user, headers = register(db, "user@example.com")
+    client.get("/users/me", headers=headers)
+    assert auth.user_cache.get("user@example.com") is not None
+
+    assert client.post(f"/admin/users/{user.uid}/deactivate", headers=admin).status_code == 200
+
+    assert auth.user_cache.get("user@example.com") is None
+    client.get("/users/me", headers=headers)
+    assert auth.user_cache.get("user@example.com").deactivated
+
+
+def test_user_admin_routes_need_an_admin(client, db):
+    _, admin = register(db, "admin@example.com", role="admin")
+    user, headers = register(db, "user@example.com")
+    assert client.post(f"/admin/users/{user.uid}/deactivate", headers=headers).status_code == 403
+    assert client.patch("/admin/users/999", json={"username": "x"}, headers=admin).status_code == 404
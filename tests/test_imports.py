@@ -0,0 +1,55 @@
+# tests/test_imports.py
+import io
+import json
+
+import pytest
+
+from server import imports, models
+
+
+def jsonl(*trades) -> io.BytesIO:
+    return io.BytesIO("".join(json.dumps({
+        "cid": "bitcoin", "cid_target": "usd", "ex_rate": price, "position": position, "time_transaction": day,
+    }) + "\n" for day, position, price in trades).encode())
+
+
+def test_failed_import_still_rebuilds_positions_for_committed_back_dated_chunks(db, monkeypatch):
+    update_portfolio = imports._update_portfolio
+    calls = []
+
+    def fail_third_chunk(*args):
+        calls.append(args)
+        if len(calls) == 3:
+            raise RuntimeError("connection lost")
+        update_portfolio(*args)
+
+    monkeypatch.setattr(imports, "_update_portfolio", fail_third_chunk)
+    stream = jsonl(
+        ("2024-01-10T00:00:00", 1.0, 100.0), ("2024-01-11T00:00:00", 1.0, 110.0),
+        # back-dated: the ledger can no longer be updated in place
+        ("2024-01-01T00:00:00", 5.0, 50.0), ("2024-01-12T00:00:00", 1.0, 120.0),
+        ("2024-01-13T00:00:00", 1.0, 130.0), ("2024-01-14T00:00:00", 1.0, 140.0),
+    )
+    importer = imports.TransactionImporter(db, uid=1, chunk_size=2)
+    with pytest.raises(RuntimeError):
+        importer.run(stream, "jsonl")
+
+    assert importer.report.inserted == 4
+    assert importer.report.positions_rebuilt
+    position = db.query(models.Position).filter_by(uid=1, cid="bitcoin").one()
+    assert position.quantity == 8.0
+    assert position.cost_basis == 5 * 50.0 + 100.0 + 110.0 + 120.0
+    lots = db.query(models.PositionLot).filter_by(uid=1).order_by(models.PositionLot.lot_id).all()
+    assert [lot.unit_cost for lot in lots] == [50.0, 100.0, 110.0, 120.0]
+
+
+def test_in_order_import_updates_the_ledger_in_place(db):
+    report = imports.TransactionImporter(db, uid=1, chunk_size=2).run(jsonl(
+        ("2024-01-01T00:00:00", 1.0, 100.0), ("2024-01-02T00:00:00", 1.0, 110.0), ("2024-01-03T00:00:00", -1.5, 120.0),
+    ), "jsonl")
+
+    assert report.inserted == 3
+    assert not report.positions_rebuilt
+    position = db.query(models.Position).filter_by(uid=1, cid="bitcoin").one()
+    assert position.quantity == 0.5
+    assert position.realized_pnl == pytest.approx(20.0 + 0.5 * 10.0)
@@ -0,0 +1,49 @@
+# tests/test_indicators.py
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server import indicators, ingestion, main, rollups
+from server.database import get_read_db
+
+
+@pytest.fixture
+def client(session_factory, monkeypatch):
+    def read_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    # ingestion runs in another process: nothing feeds the live state but the stored candles
+    assert not main.INGESTION_ENABLED
+    monkeypatch.setattr(indicators, "live_indicators", indicators.LiveIndicators(resolution=60))
+    main.app.dependency_overrides[get_read_db] = read_db
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+
+def write_ticks(session_factory, cid, ticks):
+    ingestion.write_price_rows(
+        [{"cid": cid, "current_price": price, "time_stamp": time_stamp} for time_stamp, price in ticks], session_factory
+    )
+
+
+def test_latest_catches_up_from_stored_candles(client, session_factory):
+    now = rollups.utcnow()
+    write_ticks(session_factory, "bitcoin", [(now - timedelta(minutes=minutes), 100.0 + minutes) for minutes in range(30, 4, -1)])
+
+    first = client.get("/indicators/bitcoin/latest").json()
+    assert first["close"] == 105.0
+
+    write_ticks(session_factory, "bitcoin", [(now, 200.0)])
+    second = client.get("/indicators/bitcoin/latest").json()
+
+    assert second["close"] == 200.0
+    assert second["time"] > first["time"]
+
+
+def test_latest_is_404_without_candles(client):
+    assert client.get("/indicators/unknown/latest").status_code == 404
@@ -0,0 +1,84 @@
+# tests/test_ledger.py
+from datetime import datetime
+
+import pytest
+
+from server import ledger, models
+from server.ledger import Book
+
+
+def test_sell_consumes_the_oldest_lot_partially():
+    book = Book()
+    book.apply(1, 2.0, 100.0, 0.0, datetime(2024, 1, 1))
+    book.apply(2, 1.0, 200.0, 0.0, datetime(2024, 1, 2))
+    book.apply(3, -1.5, 300.0, 0.0, datetime(2024, 1, 3))
+
+    assert [(lot[1], lot[2], lot[3]) for lot in book.lots] == [(1, 0.5, 100.0), (2, 1.0, 200.0)]
+    assert book.quantity == 1.5
+    assert book.cost_basis == pytest.approx(250.0)
+    assert book.realized_pnl == pytest.approx(1.5 * 300.0 - 1.5 * 100.0)
+
+
+def test_gas_fees_go_into_cost_and_come_out_of_proceeds():
+    book = Book()
+    book.apply(1, 2.0, 100.0, 10.0, datetime(2024, 1, 1))
+    book.apply(2, -2.0, 150.0, 4.0, datetime(2024, 1, 2))
+
+    assert book.quantity == 0.0
+    assert book.realized_pnl == pytest.approx(300.0 - 4.0 - 210.0)
+
+
+def test_selling_more_than_the_open_lots_only_closes_what_is_held():
+    book = Book()
+    book.apply(1, 1.0, 100.0, 0.0, datetime(2024, 1, 1))
+    book.apply(2, -3.0, 150.0, 0.0, datetime(2024, 1, 2))
+
+    assert not book.lots
+    assert book.quantity == 0.0
+    assert book.cost_basis == 0.0
+    assert book.realized_pnl == pytest.approx(50.0)
+
+
+def add_transactions(db, *trades):
+    transactions = [
+        models.Transaction(uid=1, cid="bitcoin", cid_target="usd", position=position, ex_rate=price, gas_fee=0.0,
+                           success=True, time_transaction=at)
+        for at, position, price in trades
+    ]
+    db.add_all(transactions)
+    db.flush()
+    return transactions
+
+
+def test_apply_transactions_persists_positions_and_lots(db):
+    ledger.apply_transactions(db, add_transactions(
+        db, (datetime(2024, 1, 1), 2.0, 100.0), (datetime(2024, 1, 2), -0.5, 120.0),
+    ))
+    db.commit()
+    ledger.apply_transactions(db, add_transactions(db, (datetime(2024, 1, 3), -1.0, 130.0)))
+    db.commit()
+
+    position = db.get(models.Position, (1, "bitcoin"))
+    assert position.quantity == pytest.approx(0.5)
+    assert position.realized_pnl == pytest.approx(0.5 * 20.0 + 1.0 * 30.0)
+    assert [lot.quantity for lot in db.query(models.PositionLot)] == [pytest.approx(0.5)]
+
+
+def test_rebuild_positions_after_a_back_dated_insert(db):
+    ledger.apply_transactions(db, add_transactions(
+        db, (datetime(2024, 1, 10), 1.0, 200.0), (datetime(2024, 1, 11), -1.0, 250.0),
+    ))
+    db.commit()
+    assert db.get(models.Position, (1, "bitcoin")).realized_pnl == pytest.approx(50.0)
+
+    # an older, cheaper buy: FIFO now sells it first instead
+    add_transactions(db, (datetime(2024, 1, 1), 1.0, 100.0))
+    db.commit()
+    assert ledger.rebuild_positions(db, uid=1) == 1
+
+    position = db.get(models.Position, (1, "bitcoin"))
+    db.refresh(position)
+    assert position.quantity == pytest.approx(1.0)
+    assert position.realized_pnl == pytest.approx(150.0)
+    assert position.cost_basis == pytest.approx(200.0)
+    assert [(lot.quantity, lot.unit_cost) for lot in db.query(models.PositionLot).filter_by(uid=1)] == [(1.0, 200.0)]
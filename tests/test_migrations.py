@@ -0,0 +1,105 @@
+# tests/test_migrations.py
+from sqlalchemy import inspect, select
+from sqlalchemy.sql import sqltypes
+
+from server import models
+from server.database import make_engine
+from server.migrations import run_migrations
+
+# portfolio and transaction as the first release of the schema created them
+BASELINE_SCHEMA = [
+    """
+    CREATE TABLE portfolio (
+        uid INTEGER NOT NULL,
+        cid VARCHAR NOT NULL,
+        asid INTEGER,
+        time_created TIMESTAMP,
+        quantity VARCHAR,
+        PRIMARY KEY (uid, cid)
+    )
+    """,
+    "CREATE INDEX ix_portfolio_cid ON portfolio (cid)",
+    """
+    CREATE TABLE "transaction" (
+        tid INTEGER NOT NULL PRIMARY KEY,
+        uid INTEGER,
+        wid INTEGER,
+        cid VARCHAR,
+        cid_target VARCHAR,
+        ex_rate VARCHAR,
+        position VARCHAR,
+        network VARCHAR,
+        gas_fee VARCHAR,
+        success BOOLEAN,
+        time_transaction TIMESTAMP
+    )
+    """,
+    """CREATE INDEX ix_transaction_uid ON "transaction" (uid)""",
+]
+
+BASELINE_ROWS = [
+    "INSERT INTO portfolio (uid, cid, quantity) VALUES (1, 'bitcoin', '1.5'), (1, 'ethereum', ''), (2, 'solana', ' 2 ')",
+    """INSERT INTO "transaction" (tid, uid, cid, ex_rate, position, gas_fee, success)
+       VALUES (1, 1, 'bitcoin', '100.25', '1.5', '', 1), (2, 1, 'ethereum', ' 2 ', '', '0.01', 1)""",
+]
+
+
+def _baseline_engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA + BASELINE_ROWS:
+            conn.exec_driver_sql(statement)
+    return engine
+
+
+def test_text_columns_are_converted_to_numbers_in_place(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    try:
+        applied = run_migrations(engine)
+
+        assert "portfolio" in applied and "transaction" in applied
+        assert "transaction.idempotency_key" in applied
+
+        with engine.connect() as conn:
+            portfolio = dict(conn.execute(
+                select(models.Portfolio.cid, models.Portfolio.quantity)
+            ).all())
+            transactions = conn.execute(
+                select(
+                    models.Transaction.tid, models.Transaction.ex_rate,
+                    models.Transaction.position, models.Transaction.gas_fee,
+                ).order_by(models.Transaction.tid)
+            ).all()
+
+        assert portfolio == {"bitcoin": 1.5, "ethereum": None, "solana": 2.0}
+        assert [tuple(row) for row in transactions] == [(1, 100.25, 1.5, None), (2, 2.0, None, 0.01)]
+
+        inspector = inspect(engine)
+        columns = {
+            (table, col["name"]): col["type"]
+            for table in ("portfolio", "transaction")
+            for col in inspector.get_columns(table)
+        }
+        for key in [("portfolio", "quantity"), ("transaction", "ex_rate"),
+                    ("transaction", "position"), ("transaction", "gas_fee")]:
+            assert isinstance(columns[key], sqltypes.Numeric), key
+        # indexes dropped for the rebuild are recreated from the models
+        assert "ix_portfolio_cid" in {index["name"] for index in inspector.get_indexes("portfolio")}
+    finally:
+        engine.dispose()
+
+
+def test_running_migrations_again_changes_nothing(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    try:
+        run_migrations(engine)
+        with engine.connect() as conn:
+            before = conn.exec_driver_sql("SELECT uid, cid, quantity FROM portfolio ORDER BY uid, cid").all()
+
+        assert run_migrations(engine) == []
+
+        with engine.connect() as conn:
+            after = conn.exec_driver_sql("SELECT uid, cid, quantity FROM portfolio ORDER BY uid, cid").all()
+        assert after == before
+    finally:
+        engine.dispose()
@@ -0,0 +1,61 @@
+# tests/test_nav.py
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from server import crud, main, models, nav, rollups, schemas
+from server.database import get_read_db, make_engine
+
+
+def buy(db, uid, cid, position):
+    return crud.create_transaction(db, schemas.TransactionCreate(
+        uid=uid, wid=1, cid=cid, cid_target="usd", ex_rate=100.0, position=position, network="test",
+        success=True, time_transaction=rollups.utcnow(),
+    ))
+
+
+def test_a_transaction_and_its_side_effects_commit_once(db):
+    commits = []
+    event.listen(db, "after_commit", lambda session: commits.append(session))
+
+    transaction = buy(db, 1, "bitcoin", 2.0)
+
+    assert len(commits) == 1
+    assert crud.get_portfolio_by_uid_and_cid(db, 1, "bitcoin").quantity == 2.0
+    message = db.query(models.Message).one()
+    assert (message.uid, message.asid) == (1, transaction.tid)
+
+
+def test_transactions_materialize_nav_and_the_route_only_reads(engine, db):
+    buy(db, 1, "bitcoin", 2.0)
+    assert [row.day for row in nav.get_nav(db, 1)] == [nav.day_start(rollups.utcnow())]
+
+    # query_only connections fail on any write
+    read_engine = make_engine(str(engine.url), read_only=True)
+    read_session = sessionmaker(bind=read_engine)
+
+    def read_db():
+        session = read_session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    main.app.dependency_overrides[get_read_db] = read_db
+    try:
+        response = TestClient(main.app).get("/portfolio/1/nav")
+    finally:
+        main.app.dependency_overrides.clear()
+        read_engine.dispose()
+    assert response.status_code == 200
+    assert len(response.json()["nav"]) == 1
+
+
+def test_refresh_all_extends_every_user(db):
+    buy(db, 1, "bitcoin", 1.0)
+    buy(db, 2, "ethereum", 1.0)
+    db.query(models.PortfolioNav).delete()
+    db.commit()
+
+    assert nav.refresh_all(db) == 2
+    assert {row.uid for row in db.query(models.PortfolioNav)} == {1, 2}
@@ -0,0 +1,98 @@
+# tests/test_pagination.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from server import main, models
+from server.database import get_async_db, make_async_engine
+from server.pagination import encode_cursor
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def client(engine):
+    async_engine = make_async_engine(str(engine.url))
+    sessions = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def async_db():
+        async with sessions() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = async_db
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+    asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture
+def transactions(db):
+    # three transactions share each time stamp, so only tid tells them apart
+    rows = [
+        models.Transaction(tid=tid, uid=1, cid="bitcoin", position=1.0, success=True,
+                           time_transaction=START + timedelta(minutes=(tid - 1) // 3))
+        for tid in range(1, 11)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return [(row.time_transaction, row.tid) for row in rows]
+
+
+def all_pages(client, url, **params):
+    pages, cursor = [], None
+    while True:
+        response = client.get(url, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append([row["tid"] for row in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            assert "Link" not in response.headers
+            return pages
+
+
+def test_pages_cover_every_transaction_once_across_tied_time_stamps(client, transactions):
+    pages = all_pages(client, "/transaction/1", limit=4)
+
+    assert pages == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
+
+
+def test_descending_pages_run_newest_first(client, transactions):
+    pages = all_pages(client, "/transaction/1", limit=4, order="desc")
+
+    assert pages == [[10, 9, 8, 7], [6, 5, 4, 3], [2, 1]]
+
+
+def test_next_page_is_advertised_in_headers(client, transactions):
+    response = client.get("/transaction/1", params={"limit": 4, "order": "desc"})
+
+    cursor = response.headers["X-Next-Cursor"]
+    assert cursor == encode_cursor(transactions[6])
+    link = response.headers["Link"]
+    assert link.endswith('>; rel="next"')
+    assert f"cursor={cursor}" in link and "order=desc" in link and "limit=4" in link
+
+    # the Link target is the next page
+    next_url = link[1:link.index(">")]
+    assert [row["tid"] for row in client.get(next_url).json()] == [6, 5, 4, 3]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(("2024-01-01T00:00:00",)), "e30"])
+def test_a_garbage_cursor_is_a_400(client, transactions, cursor):
+    response = client.get("/transaction/1", params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_wallet_pages_follow_the_address_order(client, db):
+    db.add_all(models.Wallet(wid=wid, uid=1, address=f"0x{wid:02d}") for wid in range(5, 0, -1))
+    db.commit()
+
+    response = client.get("/wallet/1", params={"limit": 3})
+    assert [row["address"] for row in response.json()] == ["0x01", "0x02", "0x03"]
+    response = client.get("/wallet/1", params={"limit": 3, "cursor": response.headers["X-Next-Cursor"]})
+    assert [row["address"] for row in response.json()] == ["0x04", "0x05"]
+    assert "X-Next-Cursor" not in response.headers
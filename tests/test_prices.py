@@ -0,0 +1,57 @@
+# tests/test_prices.py
+from datetime import datetime
+
+from server import ingestion, models
+from server.prices import LatestPriceIndex
+
+
+def tick(cid, price, time_stamp):
+    return {"cid": cid, "current_price": price, "time_stamp": time_stamp}
+
+
+def test_refresh_picks_up_coins_updated_behind_the_newest_time_stamp(db, session_factory):
+    ingestion.write_price_rows(
+        [tick("a", 1.0, datetime(2024, 1, 1, 12, 5)), tick("b", 1.0, datetime(2024, 1, 1, 12, 0))], session_factory
+    )
+    index = LatestPriceIndex()
+    index.refresh(db, force=True)
+
+    # b's new upstream last_updated is still older than a's
+    ingestion.write_price_rows([tick("b", 2.0, datetime(2024, 1, 1, 12, 1))], session_factory)
+    changed = index.refresh(db, force=True)
+
+    assert index.get("b")["current_price"] == 2.0
+    assert "b" in {row["cid"] for row in changed}
+    assert "write_seq" not in index.get("b")
+
+
+def test_refresh_notifies_listeners(db, session_factory):
+    index = LatestPriceIndex()
+    seen = []
+    index.add_listener(seen.append)
+    ingestion.write_price_rows([tick("a", 1.0, datetime(2024, 1, 1))], session_factory)
+    index.refresh(db, force=True)
+    index.refresh(db, force=False)  # not due yet, no reload
+
+    assert [[row["cid"] for row in rows] for rows in seen] == [["a"]]
+
+
+def test_a_tick_polled_twice_is_stored_once(db, session_factory):
+    assert ingestion.write_price_rows([tick("a", 1.0, datetime(2024, 1, 1, 12, 0))], session_factory) == 1
+    # upstream last_updated has not moved since the previous poll
+    assert ingestion.write_price_rows([tick("a", 1.0, datetime(2024, 1, 1, 12, 0))], session_factory) == 0
+
+    assert db.query(models.Price).count() == 1
+    candle = db.query(models.Candle).filter_by(resolution=60).one()
+    assert candle.ticks == 1
+
+
+def test_a_late_batch_does_not_replace_the_candle_close(db, session_factory):
+    ingestion.write_price_rows([tick("a", 1.0, datetime(2024, 1, 1, 12, 0, 10))], session_factory)
+    ingestion.write_price_rows([tick("a", 3.0, datetime(2024, 1, 1, 12, 0, 50))], session_factory)
+    ingestion.write_price_rows([tick("a", 2.0, datetime(2024, 1, 1, 12, 0, 30))], session_factory)
+
+    candle = db.query(models.Candle).filter_by(resolution=60).one()
+    assert (candle.open, candle.high, candle.low, candle.close) == (1.0, 3.0, 1.0, 3.0)
+    assert candle.close_time == datetime(2024, 1, 1, 12, 0, 50)
+    assert candle.ticks == 3
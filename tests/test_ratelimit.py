@@ -0,0 +1,90 @@
+# tests/test_ratelimit.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from server.ratelimit import SharedTokenBucket
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def bucket(tmp_path, clock):
+    # one token a second, ten in the burst
+    bucket = SharedTokenBucket("test", rate_per_minute=60, burst=10, path=str(tmp_path / "bucket.db"), clock=clock)
+    yield bucket
+    bucket.close()
+
+
+def drain(bucket, priority):
+    taken = 0
+    while bucket.try_acquire(priority) == 0.0:
+        taken += 1
+    return taken
+
+
+@pytest.mark.parametrize("priority, taken", [("interactive", 10), ("ingestion", 7), ("backfill", 5)])
+def test_each_class_leaves_its_reserve(bucket, priority, taken):
+    assert drain(bucket, priority) == taken
+    assert bucket.tokens() == pytest.approx(10 - taken)
+
+
+def test_higher_classes_spend_the_reserve_lower_ones_left(bucket, clock):
+    assert drain(bucket, "backfill") == 5
+    # backfill needs six tokens in the bucket, so one more second of refill
+    assert bucket.try_acquire("backfill") == pytest.approx(1.0)
+    assert drain(bucket, "ingestion") == 2
+    assert drain(bucket, "interactive") == 3
+
+    clock.now += 4
+    assert bucket.tokens() == pytest.approx(4.0)
+    assert bucket.try_acquire("interactive") == 0.0
+
+
+def test_a_shared_file_is_one_budget(bucket, clock):
+    other = SharedTokenBucket("test", rate_per_minute=60, burst=10, path=bucket.path, clock=clock)
+    try:
+        assert drain(bucket, "interactive") == 10
+        assert other.try_acquire("interactive") == pytest.approx(1.0)
+    finally:
+        other.close()
+
+
+def test_acquire_gives_up_with_a_503_after_the_longest_wait(tmp_path, clock):
+    bucket = SharedTokenBucket("slow", rate_per_minute=6, burst=1, path=str(tmp_path / "slow.db"), clock=clock)
+    try:
+        asyncio.run(bucket.acquire("interactive"))
+        # the next token is ten seconds out, past interactive's two-second wait
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(bucket.acquire("interactive"))
+    finally:
+        bucket.close()
+
+    assert raised.value.status_code == 503
+    assert raised.value.headers["Retry-After"] == "10"
+    assert bucket.granted["interactive"] == 1
+    assert bucket.rejected["interactive"] == 1
+
+
+def test_backoff_empties_the_bucket_for_every_class(bucket, clock):
+    bucket.backoff(30)
+
+    assert bucket.backoffs == 1
+    assert bucket.try_acquire("interactive") == pytest.approx(31.0)
+    clock.now += 30
+    assert bucket.try_acquire("interactive") == pytest.approx(1.0)
+    clock.now += 1
+    assert bucket.try_acquire("interactive") == 0.0
+    assert bucket.try_acquire("ingestion") > 0
@@ -0,0 +1,38 @@
+# tests/test_streaming.py
+import asyncio
+import json
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from server import ingestion
+from server.database import make_async_engine
+from server.prices import LatestPriceIndex
+from server.streaming import PriceHub
+
+
+def tick(cid, price, time_stamp):
+    return {"cid": cid, "current_price": price, "time_stamp": time_stamp}
+
+
+def test_poll_delivers_coins_updated_behind_the_newest_time_stamp(engine, session_factory):
+    ingestion.write_price_rows(
+        [tick("a", 1.0, datetime(2024, 1, 1, 12, 5)), tick("b", 1.0, datetime(2024, 1, 1, 12, 0))], session_factory
+    )
+
+    async def scenario():
+        async_engine = make_async_engine(str(engine.url))
+        try:
+            hub = PriceHub(poll_seconds=0, session_factory=async_sessionmaker(async_engine), index=LatestPriceIndex())
+            subscription = hub.subscribe({"b"})
+            await hub.poll_once()
+            subscription.pending.clear()
+
+            ingestion.write_price_rows([tick("b", 3.0, datetime(2024, 1, 1, 12, 1))], session_factory)
+            await hub.poll_once()
+            return json.loads(await subscription.next_message(1.0))
+        finally:
+            await async_engine.dispose()
+
+    message = asyncio.run(scenario())
+    assert message["prices"]["b"]["current_price"] == 3.0
@@ -0,0 +1,137 @@
+# web/snapshot_cache.py
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def sizeof(value) -> int:
+    """
+    Approximate bytes held by a cached value.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        memory = value.memory_usage(deep=True)
+        return int(memory.sum() if isinstance(memory, pd.Series) else memory)
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class SnapshotCache:
+    """
+    One copy of upstream snapshots shared by every browser session of the web process.
+
+    Entries are fresh for their TTL and may then be served stale for up to
+    `stale_ttl` more seconds while a single background refresh replaces them.
+    Concurrent misses for the same key wait for one load. Least recently used
+    entries are dropped once the cached values exceed `max_bytes`. Cached values
+    are shared, so callers must not modify them in place.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20, stale_ttl: float = 600.0, refresh_workers: int = 2):
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # key -> (value, fresh_until, stale_until, size)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="snapshot-refresh")
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    def get(self, key, loader, ttl: float):
+        """
+        The cached value for `key`, calling `loader()` when it is missing and in the
+        background when it is stale.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, fresh_until, stale_until, _ = entry
+                if now < fresh_until:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if now < stale_until:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._executor.submit(self._refresh, key, loader, ttl)
+                    return value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # another session may have loaded it while this one waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() < entry[1]:
+                    self.coalesced += 1
+                    return entry[0]
+                self.misses += 1
+            value = loader()
+            self._store(key, value, ttl)
+            return value
+
+    def _refresh(self, key, loader, ttl: float):
+        try:
+            self._store(key, loader(), ttl)
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning(f"Refresh failed for {key}, serving stale value: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, value, ttl: float):
+        size = sizeof(value)
+        now = time.monotonic()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[3]
+            self._entries[key] = (value, now + ttl, now + ttl + self.stale_ttl, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._key_locks.pop(evicted_key, None)
+                self.bytes -= evicted[3]
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[3]
+
+    def stats(self) -> dict:
+        with self._lock:
+            served = self.hits + self.stale_hits + self.coalesced
+            lookups = served + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "evictions": self.evictions,
+                "hit_rate": served / lookups if lookups else 0.0,
+            }
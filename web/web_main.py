@@ -1,8 +1,44 @@
+import os
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
+from snapshot_cache import SnapshotCache
+
+COINGECKO_BASE_URL = os.getenv("COINGECKO_BASE_URL", "https://api.coingecko.com/api/v3").rstrip("/")
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+# Seconds a shared snapshot is served before a background refresh
+MARKETS_TTL = float(os.getenv("WEB_MARKETS_TTL", "60"))
+DETAILS_TTL = float(os.getenv("WEB_DETAILS_TTL", "60"))
+HISTORY_TTLS = {"7d": 300, "30d": 900, "1y": 3600, "max": 3600}
+
+
+@st.cache_resource
+def http_session():
+    """
+    One keep-alive connection pool shared by every page and browser session.
+    """
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(os.getenv("HTTP_POOL_MAXSIZE", "10")), max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@st.cache_resource
+def snapshot_cache():
+    """
+    Market snapshots shared by every browser session, refreshed in the background.
+    """
+    return SnapshotCache(
+        max_bytes=int(os.getenv("WEB_CACHE_MAX_MB", "64")) * 2**20,
+        stale_ttl=float(os.getenv("WEB_CACHE_STALE_TTL", "600")),
+    )
 
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
@@ -10,9 +46,6 @@ if "logged_in" not in st.session_state:
 if "token" not in st.session_state:
     st.session_state.token = None
 
-if "crypto_prices" not in st.session_state:
-    st.session_state.crypto_prices = None
-
 st.sidebar.title("Navigation")
 st.sidebar.button("Index", key="dashboard", on_click=lambda: st.experimental_set_query_params(page="dashboard"))
 st.sidebar.button("Portfolio", key="portfolio", on_click=lambda: st.experimental_set_query_params(page="portfolio"))
@@ -27,6 +60,13 @@ else:
     st.sidebar.button("Register", key="register", on_click=lambda: st.experimental_set_query_params(page="register"))
 st.sidebar.markdown("</div>", unsafe_allow_html=True)
 
+def cache_readout():
+    stats = snapshot_cache().stats()
+    st.sidebar.caption(
+        f"Market cache: {stats['hit_rate']:.0%} hit rate, {stats['misses']} upstream fetches, "
+        f"{stats['entries']} snapshots, {stats['bytes'] / 2**20:.1f} of {stats['max_bytes'] / 2**20:.0f} MB"
+    )
+
 def logout():
     st.session_state.logged_in = False
     st.session_state.token = None
@@ -62,18 +102,20 @@ def dashboard_page():
         order_direction = st.selectbox("Order direction", ["Ascending", "Descending"])
         num_columns = st.selectbox("Number of columns", [1, 2, 3, 4, 5])
 
-    def get_crypto_prices():
-        response = requests.get("https://api.coingecko.com/api/v3/coins/markets", params={"vs_currency": "usd"})
-        data = response.json()
-        df = pd.DataFrame(data)
-        return df
-
-    if st.session_state.crypto_prices is None:
-        st.session_state.crypto_prices = get_crypto_prices()
+    session = http_session()
 
-    crypto_prices = st.session_state.crypto_prices
+    def get_crypto_prices():
+        response = session.get(f"{COINGECKO_BASE_URL}/coins/markets", params={"vs_currency": "usd"}, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        df = pd.DataFrame(response.json())
+        # gains/losses are computed once here, the shared frame is never modified afterwards
+        return calculate_gains_losses(df)
 
-    crypto_prices = calculate_gains_losses(crypto_prices)
+    try:
+        crypto_prices = snapshot_cache().get("markets", get_crypto_prices, MARKETS_TTL)
+    except Exception as e:
+        st.error(f"An error occurred while fetching crypto prices: {str(e)}")
+        return
 
     if search_term:
         crypto_prices = crypto_prices[
@@ -140,14 +182,21 @@ def crypto_chart_page():
 
     st.markdown(f"<div class='crypto-header'>Historical Prices for {crypto_id.capitalize()}</div>", unsafe_allow_html=True)
 
+    session = http_session()
+
+    def get_details():
+        response = session.get(
+            f"{COINGECKO_BASE_URL}/coins/markets",
+            params={"vs_currency": "usd", "ids": crypto_id},
+            timeout=HTTP_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()[0]  # Extract the first element
+
     # Fetch current details of the cryptocurrency
     try:
-        details_response = requests.get(
-            f"https://api.coingecko.com/api/v3/coins/markets",
-            params={"vs_currency": "usd", "ids": crypto_id}
-        )
-        if details_response.status_code == 200:
-            details_data = details_response.json()[0]  # Extract the first element
+        details_data = snapshot_cache().get(f"details:{crypto_id}", get_details, DETAILS_TTL)
+        if details_data:
 
             # Display current cryptocurrency details in a professional box layout
             st.markdown(
@@ -173,33 +222,37 @@ def crypto_chart_page():
 
     # Fetch historical data for the chart
 # 绘制图表部分
-    try:
-        history_response = requests.get(
-            f"https://api.coingecko.com/api/v3/coins/{crypto_id}/market_chart",
-            params={"vs_currency": "usd", "days": "14"}
+    ranges = {"7d": "Last 7 Days", "30d": "Last 30 Days", "1y": "Last Year", "max": "All Time"}
+    chart_range = st.radio("Range", list(ranges), index=1, format_func=ranges.get, horizontal=True)
+
+    def get_history():
+        # The server downsamples the series, so the browser only receives what it can draw
+        response = session.get(
+            f"http://localhost:8000/history/{crypto_id}",
+            params={"range": chart_range, "points": 500},
+            timeout=HTTP_TIMEOUT,
         )
-        if history_response.status_code == 200:
-            data = history_response.json()
-            prices = data.get("prices", [])
-
-            # 数据处理
-            df = pd.DataFrame(prices, columns=["timestamp", "price"])
-            df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+        response.raise_for_status()
+        df = pd.DataFrame(response.json().get("prices", []), columns=["timestamp", "price"])
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+        df["SMA"] = df["price"].rolling(window=5).mean()
+        return df
 
+    try:
+        df = snapshot_cache().get(f"history:{crypto_id}:{chart_range}", get_history, HISTORY_TTLS[chart_range])
+        if not df.empty:
             # 使用 Plotly 绘制图表
             fig = go.Figure()
             fig.add_trace(go.Scatter(
                 x=df["timestamp"],
                 y=df["price"],
-                mode="lines+markers",
+                mode="lines",
                 name="Price (USD)",
                 line=dict(color="blue", width=2),
-                marker=dict(size=6),
                 hovertemplate="<b>Date:</b> %{x}<br><b>Price:</b> $%{y:.2f}<extra></extra>"
             ))
 
             # 添加5日均线
-            df["SMA"] = df["price"].rolling(window=5).mean()
             fig.add_trace(go.Scatter(
                 x=df["timestamp"],
                 y=df["SMA"],
@@ -211,7 +264,7 @@ def crypto_chart_page():
 
             # 更新图表布局
             fig.update_layout(
-                title=f"{crypto_id.capitalize()} Price Trend (Last 14 Days)",
+                title=f"{crypto_id.capitalize()} Price Trend ({ranges[chart_range]})",
                 xaxis=dict(title="Date", showgrid=True, gridcolor="#eeeeee"),
                 yaxis=dict(title="Price (USD)", showgrid=True, gridcolor="#eeeeee"),
                 template="plotly_white",
@@ -272,87 +325,54 @@ def portfolio_page():
 
     st.markdown('<div class="main-title">Your Portfolio</div>', unsafe_allow_html=True)
 
-    # Simulated user portfolio with updated column names
-    if "user_portfolio" not in st.session_state:
-        st.session_state.user_portfolio = pd.DataFrame({
-            "Asset Name": ["Bitcoin", "Ethereum", "Cardano"],
-            "Position (Units)": [0, 0, 0],
-            "Current Price (USD)": [0, 0, 0],
-        })
-        st.session_state.user_portfolio["Total Value (USD)"] = (
-            st.session_state.user_portfolio["Position (Units)"] * st.session_state.user_portfolio["Current Price (USD)"]
+    # One request for the whole portfolio, valued server-side at the latest ingested prices
+    try:
+        headers = {"Authorization": f"Bearer {st.session_state.token}"}
+        uid = 1  # Replace with dynamic UID if available
+        response = http_session().get(
+            f"http://localhost:8000/portfolio/{uid}/valuation", headers=headers, timeout=HTTP_TIMEOUT
         )
+        if response.status_code == 404:
+            st.info("Your portfolio is empty.")
+            return
+        if response.status_code != 200:
+            st.error("Failed to fetch portfolio valuation.")
+            return
+        valuation = response.json()
+    except Exception as e:
+        st.error(f"Error fetching portfolio valuation: {e}")
+        return
 
-    def get_crypto_price(asset_name):
-        try:
-            response = requests.get(
-                "https://api.coingecko.com/api/v3/simple/price",
-                params={"ids": asset_name.lower(), "vs_currencies": "usd"},
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data[asset_name.lower()]["usd"]
-            else:
-                st.error("Failed to fetch crypto price. Please check the name.")
-                return 0
-        except Exception as e:
-            st.error(f"Error fetching price: {e}")
-            return 0
+    st.metric("Total Value (USD)", f"${valuation['total_value']:,.2f}")
+
+    portfolio = pd.DataFrame([
+        {
+            "Asset Name": position["cid"].capitalize(),
+            "Position (Units)": position["quantity"],
+            "Current Price (USD)": position["price"],
+            "Total Value (USD)": position["value"],
+            "Weight": position["weight"],
+        }
+        for position in valuation["positions"]
+    ])
 
     # Display user portfolio
     st.markdown('<div class="sub-title">Your Current Portfolio</div>', unsafe_allow_html=True)
-    st.dataframe(st.session_state.user_portfolio.style.format({
+    st.dataframe(portfolio.style.format({
         "Position (Units)": "{:.2f}",
         "Current Price (USD)": "${:,.2f}",
-        "Total Value (USD)": "${:,.2f}"
-    }))
-
-    # Add cryptocurrency to portfolio
-    st.markdown('<div class="sub-title">Add Cryptocurrency to Portfolio</div>', unsafe_allow_html=True)
-    new_asset = st.text_input("Asset Name (e.g., Bitcoin, Ethereum)", key="asset_name")
-    new_position = st.number_input("Units to Add", min_value=0.0, step=0.01, key="asset_position")
-
-    if st.button("Add to Portfolio"):
-        if new_asset.strip() and new_position > 0:
-            # Fetch current price
-            current_price = get_crypto_price(new_asset)
-            if current_price > 0:
-                portfolio = st.session_state.user_portfolio
-                if new_asset.capitalize() in portfolio["Asset Name"].values:
-                    # Update existing entry
-                    index = portfolio[portfolio["Asset Name"] == new_asset.capitalize()].index[0]
-                    portfolio.loc[index, "Position (Units)"] += new_position
-                    portfolio.loc[index, "Current Price (USD)"] = current_price
-                    portfolio.loc[index, "Total Value (USD)"] = (
-                        portfolio.loc[index, "Position (Units)"] * portfolio.loc[index, "Current Price (USD)"]
-                    )
-                    st.success(f"Updated {new_asset.capitalize()} in your portfolio!")
-                else:
-                    # Add new entry
-                    new_entry = {
-                        "Asset Name": new_asset.capitalize(),
-                        "Position (Units)": new_position,
-                        "Current Price (USD)": current_price,
-                        "Total Value (USD)": new_position * current_price,
-                    }
-                    st.session_state.user_portfolio = pd.concat(
-                        [portfolio, pd.DataFrame([new_entry])], ignore_index=True
-                    )
-                    st.success(f"Added {new_asset.capitalize()} to your portfolio!")
-            else:
-                st.error(f"Could not fetch price for {new_asset}.")
-        else:
-            st.warning("Please provide valid asset name and position.")
+        "Total Value (USD)": "${:,.2f}",
+        "Weight": "{:.1%}",
+    }, na_rep="-"))
 
     # Asset Allocation Chart
     st.markdown('<div class="sub-title">Portfolio Asset Allocation</div>', unsafe_allow_html=True)
-    portfolio = st.session_state.user_portfolio
     if not portfolio.empty:
         fig = go.Figure(data=[go.Pie(
             labels=portfolio["Asset Name"],
-            values=portfolio["Total Value (USD)"],
+            values=portfolio["Weight"],
             hole=0.4,
-            hoverinfo="label+percent+value",
+            hoverinfo="label+percent",
             textinfo="label+percent",
             textfont_size=14,
             marker=dict(colors=px.colors.sequential.Viridis, line=dict(color="#000000", width=2)),
@@ -421,7 +441,7 @@ def wallet_page():
     try:
         headers = {"Authorization": f"Bearer {st.session_state.token}"}
         uid = 1  # Replace with dynamic UID if available
-        response = requests.get(f"http://localhost:8000/wallet/{uid}", headers=headers)
+        response = http_session().get(f"http://localhost:8000/wallet/{uid}", headers=headers)
 
         if response.status_code == 200:
             wallet_data = response.json()
@@ -454,7 +474,7 @@ def wallet_page():
                 "wname": new_wallet_name,
                 "address": new_wallet_address,
             }
-            add_response = requests.post(
+            add_response = http_session().post(
                 "http://localhost:8000/wallet/",
                 headers=headers,
                 json=payload
@@ -473,7 +493,7 @@ def wallet_page():
     delete_wallet_name = st.text_input("Enter Wallet Name to Delete", placeholder="e.g., My Crypto Wallet")
     if st.button("Delete Wallet"):
         try:
-            delete_response = requests.delete(
+            delete_response = http_session().delete(
                 f"http://localhost:8000/wallet/{uid}/{delete_wallet_name}",
                 headers=headers
             )
@@ -493,7 +513,7 @@ def profile_page():
 
     try:
         headers = {"Authorization": f"Bearer {st.session_state.token}"}
-        response = requests.get("http://localhost:8000/users/me", headers=headers)
+        response = http_session().get("http://localhost:8000/users/me", headers=headers)
         if response.status_code == 200:
             user_info = response.json()
         else:
@@ -506,7 +526,7 @@ def profile_page():
 
 def login(email, password):
     try:
-        response = requests.post(
+        response = http_session().post(
             "http://localhost:8000/token",
             data={"username": email, "password": password},
         )
@@ -528,7 +548,7 @@ def login_page():
 
 def register(email, username, password):
     try:
-        response = requests.post(
+        response = http_session().post(
             "http://localhost:8000/users/",
             json={"username": username, "email": email, "password": password},
         )
@@ -566,4 +586,6 @@ elif page == "chart":
 elif page == "profile":
     profile_page()
 else:
-    dashboard_page()
\ No newline at end of file
+    dashboard_page()
+
+cache_readout()
\ No newline at end of file